@@ -101,9 +101,10 @@ class BatchForm(forms.ModelForm):
             if available > received:
                 raise ValidationError("Available quantity cannot exceed received quantity.")
 
-        # Check lot_no uniqueness only if provided
+        # Check lot_no uniqueness only if provided; soft-deleted batches still hold
+        # their lot under uniq_item_lot, so look through all_objects
         if lot_no and item:
-            existing = Batch.objects.filter(item=item, lot_no=lot_no)
+            existing = Batch.all_objects.filter(item=item, lot_no=lot_no)
             if self.instance and self.instance.pk:
                 existing = existing.exclude(pk=self.instance.pk)
             if existing.exists():
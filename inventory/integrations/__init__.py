@@ -1,6 +1,8 @@
 """
 External integrations for SMS and webhooks.
 """
+import hashlib
+import hmac
 import logging
 import requests
 from django.conf import settings
@@ -218,9 +220,6 @@ def validate_webhook_signature(request, secret_key=None):
     Returns:
         Boolean indicating valid signature
     """
-    import hmac
-    import hashlib
-    
     if not secret_key:
         secret_key = getattr(settings, "WEBHOOK_SECRET_KEY", None)
     
@@ -243,8 +242,11 @@ def validate_webhook_signature(request, secret_key=None):
         hashlib.sha256
     ).hexdigest()
     
-    # Compare signatures
-    is_valid = hmac.compare_digest(signature_header, expected_signature)
+    # Compare signatures in constant time; as bytes, so a non-ASCII header is just a mismatch
+    is_valid = hmac.compare_digest(
+        signature_header.encode("utf-8"),
+        expected_signature.encode("ascii"),
+    )
     
     if not is_valid:
         logger.warning("Invalid webhook signature")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_add_packed_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
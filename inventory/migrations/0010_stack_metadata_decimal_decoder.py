@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:26
+
+import django.core.serializers.json
+import inventory.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_batch_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='redostack',
+            name='metadata',
+            field=models.JSONField(blank=True, decoder=inventory.models.DecimalJSONDecoder, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AlterField(
+            model_name='undostack',
+            name='metadata',
+            field=models.JSONField(blank=True, decoder=inventory.models.DecimalJSONDecoder, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_stack_metadata_decimal_decoder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(condition=models.Q(('available_qty__gt', 0), ('status', 'available')), fields=['status', 'expiry_date', 'available_qty'], name='batch_expiry_scan_idx'),
+        ),
+    ]
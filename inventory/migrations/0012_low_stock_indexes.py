@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_batch_expiry_scan_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['item', 'available_qty'], name='batch_item_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['reorder_threshold'], name='item_reorder_threshold_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+# icontains compiles to UPPER(col::text) LIKE UPPER(%s) on PostgreSQL, so the trigram
+# indexes are built on that same expression for the planner to use them.
+TRIGRAM_INDEXES = [
+    ("item_sku_trgm_idx", "inventory_item", "sku"),
+    ("item_name_trgm_idx", "inventory_item", "name"),
+    ("batch_lot_no_trgm_idx", "inventory_batch", "lot_no"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _table, _column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_low_stock_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at'], name='order_recent_idx'),
+        ),
+    ]
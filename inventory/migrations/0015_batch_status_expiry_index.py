@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_order_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['status', 'expiry_date'], name='batch_status_expiry_idx'),
+        ),
+    ]
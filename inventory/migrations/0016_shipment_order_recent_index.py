@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_batch_status_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['order', '-created_at'], name='shipment_order_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_shipment_order_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='redostack',
+            index=models.Index(fields=['-created_at', '-id'], name='redostack_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='undostack',
+            index=models.Index(fields=['-created_at', '-id'], name='undostack_recent_idx'),
+        ),
+    ]
@@ -8,12 +8,15 @@ Run after changes:
 """
 from __future__ import annotations
 
+import json
 import uuid
 from decimal import Decimal
 from typing import Optional, Dict, Any
 
 from django.conf import settings
-from django.db import models, transaction
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
 from django.db.models import F, Sum
 from django.utils import timezone
 
@@ -58,6 +61,10 @@ class Item(models.Model):
 
 	class Meta:
 		ordering = ["sku"]
+		indexes = [
+			# Narrows the dashboard low-stock scan to items with a threshold set
+			models.Index(fields=["reorder_threshold"], name="item_reorder_threshold_idx"),
+		]
 
 	def __str__(self) -> str:  # pragma: no cover - trivial
 		return f"{self.sku} - {self.name}"
@@ -98,6 +105,23 @@ class Item(models.Model):
 		return total["total"] or Decimal("0")
 
 
+class BatchQuerySet(models.QuerySet):
+	"""Custom queryset for Batch to separate live rows from soft-deleted ones."""
+
+	def live(self):
+		return self.filter(deleted_at__isnull=True)
+
+	def soft_deleted(self):
+		return self.filter(deleted_at__isnull=False)
+
+
+class BatchManager(models.Manager.from_queryset(BatchQuerySet)):
+	"""Default Batch manager; hides batches soft-deleted by an undone receive."""
+
+	def get_queryset(self):
+		return super().get_queryset().live()
+
+
 class Batch(models.Model):
 	"""A stock batch/lot for an Item.
 
@@ -108,6 +132,8 @@ class Batch(models.Model):
 	  - available_qty: Quantity currently available for allocation.
 	  - expiry_date: Optional expiry/best-before date.
 	  - status: State of the batch (AVAILABLE, RESERVED, HOLD, EXPIRED).
+	  - deleted_at: Set when the receive that created the batch is undone. Soft-deleted
+		batches are hidden from `Batch.objects`; use `Batch.all_objects` to reach them.
 
 	Concurrency notes for reserve():
 	  - Uses SELECT ... FOR UPDATE row locking to ensure the available_qty cannot
@@ -142,6 +168,10 @@ class Batch(models.Model):
 	available_qty = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0"))
 	expiry_date = models.DateField(null=True, blank=True)
 	status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_AVAILABLE)
+	deleted_at = models.DateTimeField(null=True, blank=True)
+
+	objects = BatchManager()
+	all_objects = BatchQuerySet.as_manager()
 
 	class Meta:
 		ordering = ["item__sku", "lot_no"]
@@ -149,6 +179,18 @@ class Batch(models.Model):
 			models.CheckConstraint(check=models.Q(available_qty__gte=0), name="batch_available_nonneg"),
 			models.UniqueConstraint(fields=["item", "lot_no"], name="uniq_item_lot"),
 		]
+		indexes = [
+			# Serves the daily expiry scan over available, non-empty batches
+			models.Index(
+				fields=["status", "expiry_date", "available_qty"],
+				name="batch_expiry_scan_idx",
+				condition=models.Q(status="available", available_qty__gt=0),
+			),
+			# Lets per-item stock totals be summed from the index alone
+			models.Index(fields=["item", "available_qty"], name="batch_item_available_idx"),
+			# Range scan for the dashboard's "expiring in the next 30 days" list
+			models.Index(fields=["status", "expiry_date"], name="batch_status_expiry_idx"),
+		]
 
 	def __str__(self) -> str:  # pragma: no cover - trivial
 		return f"Batch({self.item.sku} #{self.lot_no})"
@@ -166,7 +208,7 @@ class Batch(models.Model):
 			# Ensure uniqueness for this item
 			counter = 1
 			original_lot = self.lot_no
-			while Batch.objects.filter(item=self.item, lot_no=self.lot_no).exists():
+			while Batch.all_objects.filter(item=self.item, lot_no=self.lot_no).exists():
 				self.lot_no = f"{original_lot}-{counter}"
 				counter += 1
 		
@@ -185,7 +227,11 @@ class Batch(models.Model):
 			raise ValueError("Reserve quantity must be > 0")
 
 		with transaction.atomic():
-			locked = Batch.objects.select_for_update().get(pk=self.pk)
+			# Lock only the batch row; FOR NO KEY UPDATE (PostgreSQL) still lets
+			# inserts that reference this batch check their foreign key
+			locked = Batch.objects.select_for_update(
+				of=("self",), no_key=connection.features.has_select_for_no_key_update
+			).get(pk=self.pk)
 			if locked.status != Batch.STATUS_AVAILABLE:
 				raise ValueError("Batch is not in AVAILABLE status")
 			if locked.available_qty < qty:
@@ -233,6 +279,10 @@ class Order(models.Model):
 
 	class Meta:
 		ordering = ["-created_at"]
+		indexes = [
+			# Matches the default ordering, so "latest N orders" reads the index head
+			models.Index(fields=["-created_at"], name="order_recent_idx"),
+		]
 
 	def __str__(self) -> str:  # pragma: no cover - trivial
 		return f"Order {self.order_no}"
@@ -371,6 +421,10 @@ class Shipment(models.Model):
 
 	class Meta:
 		ordering = ["-created_at"]
+		indexes = [
+			# order.shipments.first() is the latest shipment of one order
+			models.Index(fields=["order", "-created_at"], name="shipment_order_recent_idx"),
+		]
 
 	def __str__(self) -> str:  # pragma: no cover - trivial
 		return f"Shipment {self.shipment_no} for {self.order.order_no}"
@@ -436,6 +490,14 @@ class Return(models.Model):
 # Auditing, notifications, stacks
 # =============================
 
+class DecimalJSONDecoder(json.JSONDecoder):
+	"""JSON decoder that parses floats as Decimal so stored quantities load exactly."""
+
+	def __init__(self, *args, **kwargs):
+		kwargs.setdefault("parse_float", Decimal)
+		super().__init__(*args, **kwargs)
+
+
 class TransactionLog(models.Model):
 	"""Immutable ledger of stock-affecting operations.
 
@@ -524,6 +586,16 @@ class Notification(models.Model):
 		prefix = self.level.upper()
 		return f"{prefix}: {self.message[:40]}..."
 
+	@staticmethod
+	def summary_cache_key(user_id) -> str:
+		"""Cache key of the per-user unread count and recent list shown in the header."""
+		return f"notifications:summary:{user_id}"
+
+	def save(self, *args, **kwargs):
+		super().save(*args, **kwargs)
+		if self.user_id is not None:
+			cache.delete(self.summary_cache_key(self.user_id))
+
 	def mark_read(self):
 		self.is_read = True
 		self.save(update_fields=["is_read"])
@@ -533,15 +605,18 @@ class UndoStack(models.Model):
 	"""DB-backed LIFO stack for reversible operations (undo).
 
 	Provides push()/pop() helpers that operate under a DB transaction and select_for_update()
-	to coordinate concurrent access.
+	to coordinate concurrent access. Metadata floats load as Decimal (DecimalJSONDecoder).
 	"""
 
 	op_name = models.CharField(max_length=128)
-	metadata = models.JSONField(default=dict, blank=True)
+	metadata = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, decoder=DecimalJSONDecoder)
 	created_at = models.DateTimeField(auto_now_add=True)
 
 	class Meta:
 		ordering = ["-created_at", "-id"]
+		indexes = [
+			models.Index(fields=["-created_at", "-id"], name="undostack_recent_idx"),
+		]
 
 	def __str__(self) -> str:  # pragma: no cover - trivial
 		return f"Undo({self.op_name}) at {self.created_at:%H:%M:%S}"
@@ -563,16 +638,28 @@ class UndoStack(models.Model):
 			inst.created_at = data["created_at"]
 			return inst
 
+	@classmethod
+	def lock_top(cls) -> Optional["UndoStack"]:
+		"""Lock and return the top entry without removing it.
+
+		Call inside a transaction. Rows already locked by a concurrent caller are
+		skipped (SKIP LOCKED); the caller deletes the entry once it has been applied.
+		"""
+		return cls.objects.select_for_update(skip_locked=True).order_by("-id").first()
+
 
 class RedoStack(models.Model):
 	"""DB-backed LIFO stack for redo operations complementary to UndoStack."""
 
 	op_name = models.CharField(max_length=128)
-	metadata = models.JSONField(default=dict, blank=True)
+	metadata = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, decoder=DecimalJSONDecoder)
 	created_at = models.DateTimeField(auto_now_add=True)
 
 	class Meta:
 		ordering = ["-created_at", "-id"]
+		indexes = [
+			models.Index(fields=["-created_at", "-id"], name="redostack_recent_idx"),
+		]
 
 	def __str__(self) -> str:  # pragma: no cover - trivial
 		return f"Redo({self.op_name}) at {self.created_at:%H:%M:%S}"
@@ -593,6 +680,15 @@ class RedoStack(models.Model):
 			inst.created_at = data["created_at"]
 			return inst
 
+	@classmethod
+	def lock_top(cls) -> Optional["RedoStack"]:
+		"""Lock and return the top entry without removing it.
+
+		Call inside a transaction. Rows already locked by a concurrent caller are
+		skipped (SKIP LOCKED); the caller deletes the entry once it has been applied.
+		"""
+		return cls.objects.select_for_update(skip_locked=True).order_by("-id").first()
+
 
 # =============================
 # Graph models for network view
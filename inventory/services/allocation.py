@@ -89,7 +89,7 @@ def allocate_order(order_id: int, user=None) -> Dict[str, Any]:
             Notification.objects.create(
                 user=user,
                 message=f"Order {order.order_no} fully allocated - ready for picking",
-                level=Notification.LEVEL_SUCCESS,
+                level=Notification.LEVEL_INFO,
             )
         elif items_failed == len(order_items):
             Notification.objects.create(
@@ -150,7 +150,8 @@ def _allocate_item_with_stack(order_item: OrderItem, user=None) -> Dict[str, Any
             available_qty__gt=Decimal("0"),
         )
         .filter(Q(expiry_date__isnull=True) | Q(expiry_date__gt=today))
-        .order_by("expiry_date", "pk")
+        # Batches without an expiry go last; SQLite would otherwise sort NULL first
+        .order_by(F("expiry_date").asc(nulls_last=True), "pk")
         .values("id")
     )
 
@@ -160,6 +161,7 @@ def _allocate_item_with_stack(order_item: OrderItem, user=None) -> Dict[str, Any
         stack.push(row["id"])  # store batch ids
 
     allocations_made = []
+    new_allocations: List[Allocation] = []
     qty_remaining = qty_needed
 
     while (qty_remaining > 0) and (not stack.is_empty()):
@@ -174,26 +176,11 @@ def _allocate_item_with_stack(order_item: OrderItem, user=None) -> Dict[str, Any
             available_qty=F("available_qty") - qty_to_allocate
         )
 
-        allocation = Allocation.objects.create(
+        new_allocations.append(Allocation(
             order_item=order_item,
             batch=batch,
             qty_allocated=qty_to_allocate,
-        )
-
-        TransactionLog.objects.create(
-            user=user,
-            type=TransactionLog.TYPE_RESERVE,
-            qty=qty_to_allocate,
-            item=item,
-            batch=batch,
-            order=order_item.order,
-            meta={
-                "order_no": order_item.order.order_no,
-                "order_item_id": order_item.pk,
-                "allocation_id": allocation.pk,
-                "algo": "queue+stack",
-            },
-        )
+        ))
 
         allocations_made.append({
             "batch_lot": batch.lot_no,
@@ -201,6 +188,27 @@ def _allocate_item_with_stack(order_item: OrderItem, user=None) -> Dict[str, Any
         })
         qty_remaining -= qty_to_allocate
 
+    # Insert the allocations in one statement; the logs need their ids, so they follow
+    if new_allocations:
+        Allocation.objects.bulk_create(new_allocations)
+        TransactionLog.objects.bulk_create([
+            TransactionLog(
+                user=user,
+                type=TransactionLog.TYPE_RESERVE,
+                qty=allocation.qty_allocated,
+                item=item,
+                batch=allocation.batch,
+                order=order_item.order,
+                meta={
+                    "order_no": order_item.order.order_no,
+                    "order_item_id": order_item.pk,
+                    "allocation_id": allocation.pk,
+                    "algo": "queue+stack",
+                },
+            )
+            for allocation in new_allocations
+        ])
+
     total_allocated = qty_needed - qty_remaining
     OrderItem.objects.filter(pk=order_item.pk).update(
         qty_allocated=F("qty_allocated") + total_allocated
@@ -0,0 +1,29 @@
+"""
+Cell parsing shared by the bulk import views and the background import tasks.
+"""
+from decimal import Decimal, InvalidOperation
+
+import pandas as pd
+
+
+def decimal_field_limit(field):
+    """Smallest magnitude that no longer fits the integer digits of a DecimalField."""
+    return Decimal(10) ** (field.max_digits - field.decimal_places)
+
+
+def to_decimal(value, limit=None):
+    """
+    Decimal for one import cell, or None if it is blank, unparseable or not finite.
+
+    With `limit` (see decimal_field_limit), values whose magnitude reaches it are
+    rejected as well.
+    """
+    if pd.isna(value):
+        return None
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    if not number.is_finite() or (limit is not None and abs(number) >= limit):
+        return None
+    return number
@@ -3,12 +3,56 @@ Notification helpers and utilities.
 """
 import logging
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.cache import cache
+from django.core.mail import send_mail, send_mass_mail
 
 from ..models import Notification
 
 logger = logging.getLogger(__name__)
 
+# The header polls the notification partial twice per tick (badge and dropdown),
+# so a per-user summary is kept just long enough to serve both from one lookup.
+SUMMARY_CACHE_TIMEOUT = 5
+
+
+def _summary_cache_key(user):
+    return Notification.summary_cache_key(user.pk)
+
+
+def _forget_summary(user):
+    """Drop the cached summary so the next poll reflects a change right away."""
+    if user is not None:
+        cache.delete(_summary_cache_key(user))
+
+
+def _db_level(level):
+    """Map a level string to the Notification level constants."""
+    level_map = {
+        "info": Notification.LEVEL_INFO,
+        "warning": Notification.LEVEL_WARNING,
+        "error": Notification.LEVEL_ERROR,
+        "success": Notification.LEVEL_INFO,  # Map success to info
+    }
+    return level_map.get(level, Notification.LEVEL_INFO)
+
+
+def _email_content(user, message, level):
+    """Subject and body of the notification email for a user."""
+    subject = f"[{level.upper()}] Notification from WMS"
+    
+    email_body = f"""
+Hello {user.get_full_name() or user.username},
+
+You have a new notification:
+
+{message}
+
+---
+This is an automated message from the Warehouse Management System.
+    """.strip()
+    
+    return subject, email_body
+
 
 def notify(user, message, level="info", notification_type="system"):
     """
@@ -23,38 +67,17 @@ def notify(user, message, level="info", notification_type="system"):
     Returns:
         Notification instance
     """
-    # Map level string to Notification constants
-    level_map = {
-        "info": Notification.LEVEL_INFO,
-        "warning": Notification.LEVEL_WARNING,
-        "error": Notification.LEVEL_ERROR,
-        "success": Notification.LEVEL_INFO,  # Map success to info
-    }
-    db_level = level_map.get(level, Notification.LEVEL_INFO)
-    
     # Create database notification
     notification = Notification.objects.create(
         user=user,
         message=message,
-        level=db_level,
+        level=_db_level(level),
     )
     
     # Send email if enabled
     if getattr(settings, "NOTIFICATIONS_SEND_EMAIL", True):
         try:
-            subject = f"[{level.upper()}] Notification from WMS"
-            
-            # Prepare email content
-            email_body = f"""
-Hello {user.get_full_name() or user.username},
-
-You have a new notification:
-
-{message}
-
----
-This is an automated message from the Warehouse Management System.
-            """.strip()
+            subject, email_body = _email_content(user, message, level)
             
             send_mail(
                 subject=subject,
@@ -76,6 +99,9 @@ def notify_multiple(users, message, level="info", notification_type="system"):
     """
     Create notifications for multiple users.
     
+    The notifications are inserted with one bulk INSERT and the emails go out
+    over a single mail connection.
+    
     Args:
         users: QuerySet or list of User instances
         message: Notification message text
@@ -85,10 +111,26 @@ def notify_multiple(users, message, level="info", notification_type="system"):
     Returns:
         List of Notification instances
     """
-    notifications = []
-    for user in users:
-        notification = notify(user, message, level, notification_type)
-        notifications.append(notification)
+    users = list(users)
+    db_level = _db_level(level)
+    notifications = Notification.objects.bulk_create(
+        [Notification(user=user, message=message, level=db_level) for user in users],
+        batch_size=500,
+    )
+    cache.delete_many([_summary_cache_key(user) for user in users])
+    
+    # Send emails if enabled
+    if getattr(settings, "NOTIFICATIONS_SEND_EMAIL", True):
+        try:
+            emails = [
+                (*_email_content(user, message, level), settings.DEFAULT_FROM_EMAIL, [user.email])
+                for user in users
+                if user.email
+            ]
+            sent = send_mass_mail(emails, fail_silently=True) if emails else 0
+            logger.info(f"Notification emails sent to {sent} user(s): {message[:50]}...")
+        except Exception as e:
+            logger.error(f"Failed to send notification emails: {e}")
     
     return notifications
 
@@ -124,6 +166,7 @@ def mark_all_as_read(user):
         Number of notifications marked as read
     """
     count = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    _forget_summary(user)
     return count
 
 
@@ -152,3 +195,25 @@ def get_recent_notifications(user, limit=10):
         QuerySet of Notification instances
     """
     return Notification.objects.filter(user=user).order_by("-created_at")[:limit]
+
+
+def get_notification_summary(user, limit=10):
+    """
+    Get the unread count and recent notifications for a user, cached briefly.
+    
+    Args:
+        user: User instance
+        limit: Maximum number of notifications to retrieve
+    
+    Returns:
+        Dict with "unread_count" and "notifications" (a list)
+    """
+    summary = cache.get(_summary_cache_key(user))
+    if summary is None or summary["limit"] != limit:
+        summary = {
+            "limit": limit,
+            "unread_count": get_unread_count(user),
+            "notifications": list(get_recent_notifications(user, limit=limit)),
+        }
+        cache.set(_summary_cache_key(user), summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
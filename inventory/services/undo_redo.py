@@ -5,9 +5,11 @@ import json
 import logging
 from decimal import Decimal
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
-from ..models import UndoStack, RedoStack, Batch, Order, OrderItem, Allocation, TransactionLog, Return
+from ..models import UndoStack, RedoStack, Batch, Order, OrderItem, Allocation, TransactionLog, Return, Shipment
+from .allocation import allocate_order
 
 logger = logging.getLogger(__name__)
 
@@ -17,87 +19,113 @@ class UndoRedoError(Exception):
     pass
 
 
+class UnsupportedOperationError(UndoRedoError):
+    """Raised when no handler is registered for an operation type."""
+    pass
+
+
 # =============================
 # Push Operations to Stack
 # =============================
 
-def push_undo_operation(operation_type, data, user, description):
+def push_undo_operation(op_name, metadata):
     """
     Push a reversible operation to the undo stack.
     
     Args:
-        operation_type: Type of operation (allocation, receive, ship, restock, etc.)
-        data: JSON-serializable dict containing operation details
-        user: User who performed the operation
-        description: Human-readable description
+        op_name: Type of operation (allocation, receive, ship, restock, etc.)
+        metadata: JSON-serializable dict the matching undo handler receives
     """
-    UndoStack.push(
-        operation_type=operation_type,
-        data=data,
-        user=user,
-        description=description,
-    )
-    logger.info(f"Pushed undo operation: {operation_type} - {description}")
+    UndoStack.push(op_name, metadata)
+    logger.info(f"Pushed undo operation: {op_name}")
 
 
-def push_redo_operation(operation_type, data, user, description):
+def push_redo_operation(op_name, metadata):
     """
     Push a reversible operation to the redo stack.
     
     Args:
-        operation_type: Type of operation
-        data: JSON-serializable dict containing operation details
-        user: User who performed the operation
-        description: Human-readable description
+        op_name: Type of operation
+        metadata: JSON-serializable dict the matching redo handler receives
     """
-    RedoStack.push(
-        operation_type=operation_type,
-        data=data,
-        user=user,
-        description=description,
-    )
-    logger.info(f"Pushed redo operation: {operation_type} - {description}")
+    RedoStack.push(op_name, metadata)
+    logger.info(f"Pushed redo operation: {op_name}")
 
 
 # =============================
 # Undo Operations
 # =============================
 
+def _require_batches(batches, batch_ids, operation):
+    """Raise UndoRedoError if any batch to restore is missing or soft-deleted."""
+    missing = set(batch_ids) - set(batches)
+    if missing:
+        raise UndoRedoError(
+            f"Cannot undo {operation}: batch(es) {sorted(missing)} no longer exist"
+        )
+
+
+def allocation_undo_data(order_id):
+    """Undo payload covering the current allocations of an order."""
+    return {
+        "order_id": order_id,
+        "allocations": list(
+            Allocation.objects.filter(order_item__order_id=order_id)
+            .order_by("pk")
+            .values("batch_id", "qty_allocated", allocation_id=F("pk"))
+        ),
+    }
+
+
 def undo_allocation(data, user):
     """
     Undo an allocation operation.
     
-    Reverses allocation by deleting Allocation records and restoring batch availability.
+    Reverses allocation by deleting Allocation records, giving the quantity back to
+    the order lines and restoring batch availability. Allocations that are already
+    gone (e.g. deallocated since) are skipped so their stock is not restored twice.
     """
     order_id = data.get("order_id")
-    allocations = data.get("allocations", [])
+    allocation_ids = [a.get("allocation_id") for a in data.get("allocations", [])]
     
     with transaction.atomic():
-        for alloc_data in allocations:
-            allocation_id = alloc_data.get("allocation_id")
-            batch_id = alloc_data.get("batch_id")
-            qty_allocated = Decimal(str(alloc_data.get("qty_allocated")))
-            
-            # Delete allocation record
-            Allocation.objects.filter(pk=allocation_id).delete()
+        allocations = list(
+            Allocation.objects.select_for_update().filter(pk__in=allocation_ids).order_by("pk")
+        )
+        
+        # Lock all affected batches in one query, ordered by pk to avoid deadlocks
+        batch_ids = [a.batch_id for a in allocations]
+        batches = {
+            b.pk: b for b in Batch.objects.select_for_update().filter(pk__in=batch_ids).order_by("pk")
+        }
+        _require_batches(batches, batch_ids, "allocation")
+        
+        for allocation in allocations:
+            OrderItem.objects.filter(pk=allocation.order_item_id).update(
+                qty_allocated=F("qty_allocated") - allocation.qty_allocated
+            )
             
             # Restore batch availability
-            batch = Batch.objects.select_for_update().get(pk=batch_id)
-            batch.available_qty += qty_allocated
+            batch = batches[allocation.batch_id]
+            batch.available_qty += allocation.qty_allocated
             batch.save()
             
             # Log undo transaction
             TransactionLog.objects.create(
-                batch=batch,
-                qty_change=qty_allocated,
-                transaction_type="undo_allocation",
                 user=user,
-                notes=f"Undid allocation for order {order_id}",
+                type=TransactionLog.TYPE_DEALLOCATE,
+                qty=allocation.qty_allocated,
+                item_id=batch.item_id,
+                batch=batch,
+                order_id=order_id,
+                meta={"reason": "undo_allocation", "allocation_id": allocation.pk},
             )
         
-        # Update order status back to pending
+        Allocation.objects.filter(pk__in=[a.pk for a in allocations]).delete()
+        
+        # Update order status back to new
         order = Order.objects.get(pk=order_id)
-        order.status = Order.STATUS_PENDING
+        order.status = Order.STATUS_NEW
         order.save()
     
     return f"Undid allocation for order {order_id}: {len(allocations)} allocation(s) reversed"
@@ -107,33 +135,41 @@ def undo_receive(data, user):
     """
     Undo a receive operation.
     
-    Deletes batch records created during receive.
+    Soft-deletes the batch records created during receive so that redo can
+    replay them from the same rows instead of a copied payload.
     """
     batch_ids = data.get("batch_ids", [])
     
     with transaction.atomic():
-        for batch_id in batch_ids:
-            batch = Batch.objects.select_for_update().get(pk=batch_id)
-            
-            # Check if batch has been used in allocations
-            if batch.allocations.exists():
-                raise UndoRedoError(
-                    f"Cannot undo receive: Batch {batch.lot_no} has active allocations"
-                )
-            
-            # Log undo transaction
-            TransactionLog.objects.create(
-                batch=batch,
-                qty_change=-batch.received_qty,
-                transaction_type="undo_receive",
+        batches = list(Batch.objects.select_for_update().filter(pk__in=batch_ids).order_by("pk"))
+        
+        # Check if any batch has been used in allocations
+        in_use = Allocation.objects.filter(batch_id__in=batch_ids).select_related("batch").first()
+        if in_use:
+            raise UndoRedoError(
+                f"Cannot undo receive: Batch {in_use.batch.lot_no} has active allocations"
+            )
+        
+        # Log undo transactions
+        TransactionLog.objects.bulk_create([
+            TransactionLog(
                 user=user,
-                notes=f"Undid receive of batch {batch.lot_no}",
+                type=TransactionLog.TYPE_ADJUST,
+                qty=-batch.received_qty,
+                item_id=batch.item_id,
+                batch=batch,
+                meta={"reason": "undo_receive", "lot_no": batch.lot_no},
             )
-            
-            # Delete batch
-            batch.delete()
+            for batch in batches
+        ])
+        
+        # Soft-delete batches in a single UPDATE
+        Batch.objects.filter(pk__in=batch_ids).update(
+            deleted_at=timezone.now(),
+            available_qty=Decimal("0"),
+        )
     
-    return f"Undid receive operation: {len(batch_ids)} batch(es) deleted"
+    return f"Undid receive operation: {len(batches)} batch(es) deleted"
 
 
 def undo_ship(data, user):
@@ -147,22 +183,31 @@ def undo_ship(data, user):
     consumptions = data.get("consumptions", [])
     
     with transaction.atomic():
+        # Lock all affected batches in one query, ordered by pk to avoid deadlocks
+        batch_ids = [c.get("batch_id") for c in consumptions]
+        batches = {
+            b.pk: b for b in Batch.objects.select_for_update().filter(pk__in=batch_ids).order_by("pk")
+        }
+        _require_batches(batches, batch_ids, "ship")
+        
         # Restore batch quantities
         for consumption in consumptions:
             batch_id = consumption.get("batch_id")
-            qty_consumed = Decimal(str(consumption.get("qty_consumed")))
+            qty_consumed = Decimal(consumption.get("qty_consumed"))
             
-            batch = Batch.objects.select_for_update().get(pk=batch_id)
+            batch = batches[batch_id]
             batch.available_qty += qty_consumed
             batch.save()
             
             # Log undo transaction
             TransactionLog.objects.create(
-                batch=batch,
-                qty_change=qty_consumed,
-                transaction_type="undo_ship",
                 user=user,
-                notes=f"Undid shipment {shipment_id}",
+                type=TransactionLog.TYPE_ADJUST,
+                qty=qty_consumed,
+                item_id=batch.item_id,
+                batch=batch,
+                order_id=order_id,
+                meta={"reason": "undo_ship", "shipment_id": shipment_id},
             )
         
         # Revert order status
@@ -171,7 +216,6 @@ def undo_ship(data, user):
         order.save()
         
         # Delete shipment record
-        from ..models import Shipment
         Shipment.objects.filter(pk=shipment_id).delete()
     
     return f"Undid shipment {shipment_id}: {len(consumptions)} batch(es) restored"
@@ -185,7 +229,7 @@ def undo_restock(data, user):
     """
     return_id = data.get("return_id")
     batch_id = data.get("batch_id")
-    qty_restocked = Decimal(str(data.get("qty_restocked")))
+    qty_restocked = Decimal(data.get("qty_restocked"))
     
     with transaction.atomic():
         batch = Batch.objects.select_for_update().get(pk=batch_id)
@@ -194,11 +238,12 @@ def undo_restock(data, user):
         
         # Log undo transaction
         TransactionLog.objects.create(
-            batch=batch,
-            qty_change=-qty_restocked,
-            transaction_type="undo_restock",
             user=user,
-            notes=f"Undid restock from return {return_id}",
+            type=TransactionLog.TYPE_ADJUST,
+            qty=-qty_restocked,
+            item_id=batch.item_id,
+            batch=batch,
+            meta={"reason": "undo_restock", "return_id": return_id},
         )
         
         # Update return status back to pending
@@ -214,48 +259,68 @@ def undo_restock(data, user):
 # =============================
 
 def redo_allocation(data, user):
-    """Redo an allocation operation."""
-    # This would re-run the allocation logic
-    # For simplicity, we can call the allocation service again
-    from ..services.allocation import allocate_order
+    """
+    Redo an allocation operation.
     
+    Re-runs the allocation service, then points the payload at the new
+    allocations so the entry pushed back to the undo stack reverses them.
+    """
     order_id = data.get("order_id")
-    result = allocate_order(order_id, user=user)
+    allocate_order(order_id, user=user)
+    data.update(allocation_undo_data(order_id))
     
     return f"Redid allocation for order {order_id}"
 
 
-def redo_receive(data, user):
-    """Redo a receive operation."""
-    # Recreate batches from saved data
-    batch_data_list = data.get("batches", [])
+def replay_receive(batch_ids, user):
+    """
+    Replay a receive by restoring its soft-deleted batches.
     
+    The batch rows kept by undo_receive are the source of truth, so only the
+    batch ids need to travel on the stacks. Returns the number of batches restored.
+    """
     with transaction.atomic():
-        for batch_data in batch_data_list:
-            batch = Batch.objects.create(
-                item_id=batch_data["item_id"],
-                lot_no=batch_data["lot_no"],
-                received_qty=Decimal(str(batch_data["received_qty"])),
-                available_qty=Decimal(str(batch_data["available_qty"])),
-                expiry_date=batch_data.get("expiry_date"),
-                status=batch_data.get("status", Batch.STATUS_AVAILABLE),
-            )
-            
-            TransactionLog.objects.create(
-                batch=batch,
-                qty_change=batch.received_qty,
-                transaction_type="redo_receive",
+        batches = list(
+            Batch.all_objects.soft_deleted().select_for_update().filter(pk__in=batch_ids).order_by("pk")
+        )
+        
+        # Restore batches in a single UPDATE
+        Batch.all_objects.filter(pk__in=[b.pk for b in batches]).update(
+            deleted_at=None,
+            available_qty=F("received_qty"),
+        )
+        
+        TransactionLog.objects.bulk_create([
+            TransactionLog(
                 user=user,
-                notes=f"Redid receive of batch {batch.lot_no}",
+                type=TransactionLog.TYPE_RECEIPT,
+                qty=batch.received_qty,
+                item_id=batch.item_id,
+                batch=batch,
+                meta={"reason": "redo_receive", "lot_no": batch.lot_no},
             )
+            for batch in batches
+        ])
+    
+    return len(batches)
+
+
+def redo_receive(data, user):
+    """Redo a receive operation."""
+    restored = replay_receive(data.get("batch_ids", []), user)
     
-    return f"Redid receive operation: {len(batch_data_list)} batch(es) created"
+    return f"Redid receive operation: {restored} batch(es) restored"
 
 
 # =============================
 # Main Undo/Redo Entry Points
 # =============================
 
+def _unknown_handler(data, user):
+    """Fallback for operation types missing from the handler tables."""
+    raise UnsupportedOperationError
+
+
 UNDO_HANDLERS = {
     "allocation": undo_allocation,
     "receive": undo_receive,
@@ -269,6 +334,46 @@ REDO_HANDLERS = {
 }
 
 
+def _apply_from_stack(stack, handlers, push_reverse, action, user, count):
+    """
+    Apply up to `count` entries from the top of `stack`, newest first.
+    
+    Each entry stays locked on the stack while its handler runs and is deleted
+    only once the handler has succeeded, in the same transaction, so a failure
+    leaves it in place. Entries without a handler are dropped. Processing stops at
+    the first failure, since older entries may depend on the one that failed.
+    """
+    results = []
+    
+    for _ in range(count):
+        with transaction.atomic():
+            entry = stack.lock_top()
+            if entry is None:
+                results.append(f"No more operations to {action}")
+                break
+            
+            handler = handlers.get(entry.op_name, _unknown_handler)
+            try:
+                with transaction.atomic():
+                    result_msg = handler(entry.metadata, user)
+            except UnsupportedOperationError:
+                # Nothing to reverse; drop the entry instead of keeping it
+                logger.warning(f"No {action} handler for operation type: {entry.op_name}")
+                results.append(f"Cannot {action} operation: {entry.op_name}")
+                entry.delete()
+                continue
+            except Exception as e:
+                logger.error(f"{action.capitalize()} failed for {entry.op_name}: {e}")
+                results.append(f"{action.capitalize()} failed: {str(e)}")
+                break
+            
+            entry.delete()
+            push_reverse(entry.op_name, entry.metadata)
+            results.append(result_msg)
+    
+    return results
+
+
 def perform_undo(user, count=1):
     """
     Perform undo operation(s).
@@ -280,46 +385,7 @@ def perform_undo(user, count=1):
     Returns:
         List of result messages
     """
-    results = []
-    
-    for _ in range(count):
-        undo_op = UndoStack.pop()
-        
-        if not undo_op:
-            results.append("No more operations to undo")
-            break
-        
-        handler = UNDO_HANDLERS.get(undo_op.operation_type)
-        
-        if not handler:
-            logger.warning(f"No undo handler for operation type: {undo_op.operation_type}")
-            results.append(f"Cannot undo operation: {undo_op.operation_type}")
-            continue
-        
-        try:
-            result_msg = handler(undo_op.data, user)
-            results.append(result_msg)
-            
-            # Push to redo stack
-            push_redo_operation(
-                operation_type=undo_op.operation_type,
-                data=undo_op.data,
-                user=user,
-                description=f"Redo: {undo_op.description}",
-            )
-            
-        except Exception as e:
-            logger.error(f"Undo failed for {undo_op.operation_type}: {e}")
-            results.append(f"Undo failed: {str(e)}")
-            # Re-push to undo stack if failed
-            UndoStack.push(
-                operation_type=undo_op.operation_type,
-                data=undo_op.data,
-                user=undo_op.user,
-                description=undo_op.description,
-            )
-    
-    return results
+    return _apply_from_stack(UndoStack, UNDO_HANDLERS, push_redo_operation, "undo", user, count)
 
 
 def perform_redo(user, count=1):
@@ -333,43 +399,4 @@ def perform_redo(user, count=1):
     Returns:
         List of result messages
     """
-    results = []
-    
-    for _ in range(count):
-        redo_op = RedoStack.pop()
-        
-        if not redo_op:
-            results.append("No more operations to redo")
-            break
-        
-        handler = REDO_HANDLERS.get(redo_op.operation_type)
-        
-        if not handler:
-            logger.warning(f"No redo handler for operation type: {redo_op.operation_type}")
-            results.append(f"Cannot redo operation: {redo_op.operation_type}")
-            continue
-        
-        try:
-            result_msg = handler(redo_op.data, user)
-            results.append(result_msg)
-            
-            # Push back to undo stack
-            push_undo_operation(
-                operation_type=redo_op.operation_type,
-                data=redo_op.data,
-                user=user,
-                description=redo_op.description,
-            )
-            
-        except Exception as e:
-            logger.error(f"Redo failed for {redo_op.operation_type}: {e}")
-            results.append(f"Redo failed: {str(e)}")
-            # Re-push to redo stack if failed
-            RedoStack.push(
-                operation_type=redo_op.operation_type,
-                data=redo_op.data,
-                user=redo_op.user,
-                description=redo_op.description,
-            )
-    
-    return results
+    return _apply_from_stack(RedoStack, REDO_HANDLERS, push_undo_operation, "redo", user, count)
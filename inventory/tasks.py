@@ -2,12 +2,103 @@
 Django-Q tasks for background processing.
 """
 import logging
+import os
+import time
+from datetime import timedelta
 from decimal import Decimal
-from django.utils import timezone
+
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from inventory.models import Item, Batch, Order, OrderItem, Shipment, TransactionLog, Notification
+from inventory.services.notifications import (
+    send_low_stock_alert,
+    send_shipment_notification,
+    webhook_order_fulfilled,
+    webhook_shipment_created,
+)
+from inventory.services.imports import decimal_field_limit, to_decimal
+from inventory.services.notifications_helper import notify
 
 logger = logging.getLogger(__name__)
 
+# Parsed bulk import previews are removed once they are this old, committed or not
+IMPORT_PREVIEW_MAX_AGE = timedelta(hours=24)
+
+
+def import_preview_dir():
+    """Directory holding the parsed uploads of pending bulk import previews."""
+    return os.path.join(settings.MEDIA_ROOT, "imports", "previews")
+
+
+def purge_import_previews():
+    """
+    Remove parsed import previews older than IMPORT_PREVIEW_MAX_AGE.
+    
+    Previews that are never committed (abandoned uploads, expired sessions) would
+    otherwise stay on disk. Runs after every new preview and can also be scheduled:
+        Schedule.objects.create(
+            func='inventory.tasks.purge_import_previews',
+            schedule_type='H',  # Hourly
+            name='Purge Import Previews',
+        )
+    
+    Returns:
+        Number of files removed
+    """
+    cutoff = time.time() - IMPORT_PREVIEW_MAX_AGE.total_seconds()
+    removed = 0
+    try:
+        entries = list(os.scandir(import_preview_dir()))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Committed or replaced meanwhile
+            continue
+    return removed
+
+
+def _decimal_column(df, column, field, default=0):
+    """
+    Convert a numeric import column to Decimals for `field` in one pass, ahead of the row loop.
+    
+    Cells that cannot be parsed, or whose integer part does not fit the field, become
+    missing values so the row loop can reject just that row. Values are parsed from
+    their text rather than through floats; the field quantizes them on save.
+    """
+    if column not in df.columns:
+        return pd.Series(Decimal(default), index=df.index, dtype=object)
+    
+    limit = decimal_field_limit(field)
+    return df[column].map(lambda value: to_decimal(value, limit))
+
+
+def _items_by_sku(df):
+    """Items named in the item_sku column, keyed by SKU, fetched in one query."""
+    if "item_sku" not in df.columns:
+        return {}
+    skus = df["item_sku"].dropna().astype(str).str.strip().str.upper().unique().tolist()
+    return Item.objects.in_bulk(skus, field_name="sku")
+
+
+def _lookup_item(items_by_sku, sku):
+    """Item for sku from _items_by_sku(); raises Item.DoesNotExist like a get() would."""
+    try:
+        return items_by_sku[sku]
+    except KeyError:
+        raise Item.DoesNotExist(f"Item {sku} not found") from None
+
 
 def process_bulk_import(file_path, model_type, user_id):
     """
@@ -21,11 +112,6 @@ def process_bulk_import(file_path, model_type, user_id):
     Returns:
         Dict with import results
     """
-    import pandas as pd
-    from django.contrib.auth import get_user_model
-    from inventory.models import Item, Batch, Order, OrderItem
-    from inventory.services.notifications_helper import notify
-    
     User = get_user_model()
     user = User.objects.get(pk=user_id)
     
@@ -77,114 +163,152 @@ def process_bulk_import(file_path, model_type, user_id):
 
 def _process_item_import(df):
     """Process Item import."""
-    from inventory.models import Item
-    from django.db import transaction
-    
     results = {"success": 0, "failed": 0, "errors": []}
-    
-    for idx, row in df.iterrows():
-        try:
-            with transaction.atomic():
-                sku = str(row.get("sku", "")).strip().upper()
-                name = str(row.get("name", "")).strip()
+    df["reorder_threshold"] = _decimal_column(df, "reorder_threshold", Item._meta.get_field("reorder_threshold"))
+    
+    # One outer transaction; validation runs before any write, so only rows
+    # that reach the database need a savepoint to isolate a failure.
+    with transaction.atomic():
+        for row in df.itertuples():
+            try:
+                sku = str(getattr(row, "sku", "")).strip().upper()
+                name = str(getattr(row, "name", "")).strip()
                 
                 if not sku or not name:
                     raise ValueError("SKU and name are required")
+                if pd.isna(row.reorder_threshold):
+                    raise ValueError("Invalid reorder_threshold")
                 
-                Item.objects.update_or_create(
-                    sku=sku,
-                    defaults={
-                        "name": name,
-                        "description": str(row.get("description", "")),
-                        "unit": str(row.get("unit", "pcs")),
-                        "reorder_threshold": Decimal(str(row.get("reorder_threshold", 0))),
-                    }
-                )
+                with transaction.atomic():
+                    Item.objects.update_or_create(
+                        sku=sku,
+                        defaults={
+                            "name": name,
+                            "description": str(getattr(row, "description", "")),
+                            "unit": str(getattr(row, "unit", "pcs")),
+                            "reorder_threshold": row.reorder_threshold,
+                        }
+                    )
                 results["success"] += 1
-        except Exception as e:
-            results["failed"] += 1
-            results["errors"].append(f"Row {idx+2}: {str(e)}")
+            except Exception as e:
+                results["failed"] += 1
+                results["errors"].append(f"Row {row.Index + 2}: {str(e)}")
     
     return results
 
 
 def _process_batch_import(df):
     """Process Batch import."""
-    import pandas as pd
-    from inventory.models import Batch, Item
-    from django.db import transaction
-    
     results = {"success": 0, "failed": 0, "errors": []}
-    
-    for idx, row in df.iterrows():
-        try:
-            with transaction.atomic():
-                item_sku = str(row.get("item_sku", "")).strip().upper()
-                lot_no = str(row.get("lot_no", "")).strip()
+    df["received_qty"] = _decimal_column(df, "received_qty", Batch._meta.get_field("received_qty"))
+    items_by_sku = _items_by_sku(df)
+    
+    with transaction.atomic():
+        for row in df.itertuples():
+            try:
+                item_sku = str(getattr(row, "item_sku", "")).strip().upper()
+                lot_no = str(getattr(row, "lot_no", "")).strip()
                 
                 if not item_sku or not lot_no:
                     raise ValueError("item_sku and lot_no are required")
                 
-                item = Item.objects.get(sku=item_sku)
-                received_qty = Decimal(str(row.get("received_qty", 0)))
+                received_qty = row.received_qty
+                if pd.isna(received_qty):
+                    raise ValueError("Invalid received_qty")
+                
+                item = _lookup_item(items_by_sku, item_sku)
+                expiry = getattr(row, "expiry_date", None)
                 
-                Batch.objects.create(
-                    item=item,
-                    lot_no=lot_no,
-                    received_qty=received_qty,
-                    available_qty=received_qty,
-                    expiry_date=pd.to_datetime(row.get("expiry_date")).date() if pd.notna(row.get("expiry_date")) else None,
-                    status=Batch.STATUS_AVAILABLE,
-                )
+                with transaction.atomic():
+                    Batch.objects.create(
+                        item=item,
+                        lot_no=lot_no,
+                        received_qty=received_qty,
+                        available_qty=received_qty,
+                        expiry_date=pd.to_datetime(expiry).date() if pd.notna(expiry) else None,
+                        status=Batch.STATUS_AVAILABLE,
+                    )
                 results["success"] += 1
-        except Exception as e:
-            results["failed"] += 1
-            results["errors"].append(f"Row {idx+2}: {str(e)}")
+            except Exception as e:
+                results["failed"] += 1
+                results["errors"].append(f"Row {row.Index + 2}: {str(e)}")
     
     return results
 
 
 def _process_order_import(df):
     """Process Order import."""
-    from inventory.models import Order, OrderItem, Item
-    from django.db import transaction
-    
     results = {"success": 0, "failed": 0, "errors": []}
-    
-    # Group by order_no
-    for order_no in df['order_no'].unique():
-        try:
-            with transaction.atomic():
-                order_rows = df[df['order_no'] == order_no]
-                first_row = order_rows.iloc[0]
+    df["qty_requested"] = _decimal_column(df, "qty_requested", OrderItem._meta.get_field("qty_requested"))
+    items_by_sku = _items_by_sku(df)
+    
+    # Rows without an order_no cannot be grouped into an order
+    missing_order_no = df['order_no'].isna()
+    if missing_order_no.any():
+        results["failed"] += 1
+        results["errors"].append(f"{int(missing_order_no.sum())} row(s) missing order_no")
+    
+    # Group by order_no in a single pass
+    with transaction.atomic():
+        for order_no, order_rows in df.groupby('order_no', sort=False):
+            try:
+                # Resolve and validate the order's lines before writing anything
+                lines = []
+                for row in order_rows.itertuples(index=False):
+                    item_sku = str(getattr(row, "item_sku", "")).strip().upper()
+                    if pd.isna(row.qty_requested):
+                        raise ValueError(f"Invalid qty_requested for {item_sku}")
+                    lines.append((_lookup_item(items_by_sku, item_sku), row.qty_requested))
                 
-                # Create order
-                order = Order.objects.create(
-                    order_no=str(first_row.get("order_no", "")).strip(),
-                    customer_name=str(first_row.get("customer_name", "")).strip(),
-                    status=Order.STATUS_PENDING,
-                )
+                first_row = order_rows.iloc[0]
                 
-                # Create order items
-                for _, row in order_rows.iterrows():
-                    item_sku = str(row.get("item_sku", "")).strip().upper()
-                    item = Item.objects.get(sku=item_sku)
-                    
-                    OrderItem.objects.create(
-                        order=order,
-                        item=item,
-                        qty_requested=Decimal(str(row.get("qty_requested", 0))),
-                        status=OrderItem.STATUS_PENDING,
+                with transaction.atomic():
+                    # Create order
+                    order = Order.objects.create(
+                        order_no=str(first_row.get("order_no", "")).strip(),
+                        customer_name=str(first_row.get("customer_name", "")).strip(),
+                        status=Order.STATUS_PENDING,
                     )
+                    
+                    # Create order items
+                    for item, qty_requested in lines:
+                        OrderItem.objects.create(
+                            order=order,
+                            item=item,
+                            qty_requested=qty_requested,
+                            status=OrderItem.STATUS_PENDING,
+                        )
                 
                 results["success"] += 1
-        except Exception as e:
-            results["failed"] += 1
-            results["errors"].append(f"Order {order_no}: {str(e)}")
+            except Exception as e:
+                results["failed"] += 1
+                results["errors"].append(f"Order {order_no}: {str(e)}")
     
     return results
 
 
+def notify_shipment_created(shipment_id):
+    """
+    Email the shipment confirmation and fire the shipment webhook.
+    
+    Queued by ShipView once the shipment has committed, so SMTP and webhook
+    round-trips stay out of the request and its transaction.
+    """
+    shipment = Shipment.objects.select_related("order").get(pk=shipment_id)
+    send_shipment_notification(shipment)
+    webhook_shipment_created(shipment)
+
+
+def notify_order_fulfilled(order_id):
+    """Fire the order fulfilled webhook for a shipped order."""
+    webhook_order_fulfilled(Order.objects.get(pk=order_id))
+
+
+def low_stock_alert(item_id, current_qty):
+    """Email the low stock alert for an item, with the total seen when it was queued."""
+    send_low_stock_alert(Item.objects.get(pk=item_id), current_qty)
+
+
 def scheduled_expiry_scan():
     """
     Daily scheduled task to scan for near-expiry and expired batches.
@@ -198,10 +322,6 @@ def scheduled_expiry_scan():
             name='Daily Expiry Scan',
         )
     """
-    from datetime import timedelta
-    from django.contrib.auth import get_user_model
-    from inventory.models import Batch, Notification
-    
     User = get_user_model()
     today = timezone.now().date()
     warning_threshold = today + timedelta(days=7)
@@ -211,7 +331,7 @@ def scheduled_expiry_scan():
         expiry_date__lt=today,
         status=Batch.STATUS_AVAILABLE,
         available_qty__gt=0
-    ).select_related('item')
+    )
     
     # Find near-expiry batches
     near_expiry = Batch.objects.filter(
@@ -219,40 +339,46 @@ def scheduled_expiry_scan():
         expiry_date__lte=warning_threshold,
         status=Batch.STATUS_AVAILABLE,
         available_qty__gt=0
-    ).select_related('item')
+    )
     
-    # Mark expired batches
-    expired_count = 0
-    for batch in expired:
-        batch.status = Batch.STATUS_EXPIRED
-        batch.save(update_fields=['status'])
-        expired_count += 1
+    # Mark expired batches in a single UPDATE
+    expired_count = expired.update(status=Batch.STATUS_EXPIRED)
+    near_count = near_expiry.count()
     
     # Create notifications for managers
-    managers = User.objects.filter(is_staff=True)
+    managers = list(User.objects.filter(is_staff=True).only('id'))
+    notifications = []
     
     if expired_count > 0:
-        for manager in managers:
-            Notification.objects.create(
+        notifications += [
+            Notification(
                 user=manager,
                 message=f"Expiry Scan: {expired_count} batch(es) have expired and been marked EXPIRED.",
                 level=Notification.LEVEL_ERROR,
             )
+            for manager in managers
+        ]
     
-    if near_expiry.exists():
-        near_count = near_expiry.count()
-        for manager in managers:
-            Notification.objects.create(
+    if near_count > 0:
+        notifications += [
+            Notification(
                 user=manager,
                 message=f"Expiry Warning: {near_count} batch(es) will expire within 7 days.",
                 level=Notification.LEVEL_WARNING,
             )
+            for manager in managers
+        ]
+    
+    Notification.objects.bulk_create(notifications)
+    # bulk_create skips Notification.save(), so drop the cached summaries here
+    if notifications:
+        cache.delete_many([Notification.summary_cache_key(manager.pk) for manager in managers])
     
-    logger.info(f"Expiry scan complete: {expired_count} expired, {near_expiry.count()} near expiry")
+    logger.info(f"Expiry scan complete: {expired_count} expired, {near_count} near expiry")
     
     return {
         "expired_count": expired_count,
-        "near_expiry_count": near_expiry.count(),
+        "near_expiry_count": near_count,
     }
 
 
@@ -265,13 +391,8 @@ def generate_scheduled_report(report_type="inventory_snapshot"):
     
     Should be scheduled via Django-Q for daily/weekly reports.
     """
-    from datetime import timedelta
-    from django.contrib.auth import get_user_model
-    from inventory.models import Item, Batch, TransactionLog, Notification
-    from django.db.models import Sum
-    
     User = get_user_model()
-    managers = User.objects.filter(is_staff=True)
+    managers = list(User.objects.filter(is_staff=True).only('id'))
     
     if report_type == "inventory_snapshot":
         # Count total items and batches
@@ -317,13 +438,16 @@ def generate_scheduled_report(report_type="inventory_snapshot"):
         message = f"Unknown report type: {report_type}"
     
     # Create notifications for managers
-    for manager in managers:
-        Notification.objects.create(
+    Notification.objects.bulk_create([
+        Notification(
             user=manager,
             message=message,
             level=Notification.LEVEL_INFO,
         )
+        for manager in managers
+    ])
+    cache.delete_many([Notification.summary_cache_key(manager.pk) for manager in managers])
     
     logger.info(f"Scheduled report generated: {report_type}")
     
-    return {"report_type": report_type, "recipient_count": managers.count()}
+    return {"report_type": report_type, "recipient_count": len(managers)}
@@ -0,0 +1,75 @@
+"""
+Shared helpers for import validation tests.
+"""
+import csv
+import io
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from inventory.models import Item
+
+
+def read_import_csv(content):
+    """Parse CSV text into a list of row dicts; every cell is a string."""
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+def is_missing(row, column):
+    """True when column is absent or blank in row."""
+    return not (row.get(column) or "").strip()
+
+
+def parse_decimal(value):
+    """Decimal for value, or None when it is not a number."""
+    try:
+        return Decimal(value.strip())
+    except (InvalidOperation, AttributeError):
+        return None
+
+
+def parse_date(value):
+    """date for an ISO YYYY-MM-DD value, or None when it does not parse."""
+    try:
+        return date.fromisoformat(value.strip())
+    except (ValueError, AttributeError):
+        return None
+
+
+def row_errors(rows, predicate, message):
+    """
+    Format "Row N: message" for each row matching predicate (the header is row 1).
+
+    rows may also be a list of per-row values parsed once, such as a column of
+    Decimals, so that several checks can share the same parse.
+    """
+    return [f"Row {number}: {message}" for number, row in enumerate(rows, start=2) if predicate(row)]
+
+
+def validate_rows(rows, required_cols, sku_col=None):
+    """
+    Validate import rows and return error strings in row order.
+
+    required_cols maps column name to the label used in "Missing <label>"; only
+    the first failing check is reported per row. When sku_col is given, rows with
+    a SKU not found in Item are rejected using a single lookup query, which is
+    skipped when no row gets that far.
+    """
+    errors = []
+    pending = []
+    for number, row in enumerate(rows, start=2):
+        missing = next((label for column, label in required_cols.items() if is_missing(row, column)), None)
+        if missing:
+            errors.append((number, f"Row {number}: Missing {missing}"))
+        elif sku_col is not None:
+            pending.append((number, (row.get(sku_col) or "").strip().upper()))
+
+    # Only rows that passed the column checks need a lookup; skip the query if none did
+    if pending:
+        known = set(Item.objects.filter(sku__in={sku for _, sku in pending}).values_list("sku", flat=True))
+        errors += [
+            (number, f"Row {number}: Item with SKU '{sku}' does not exist")
+            for number, sku in pending
+            if sku not in known
+        ]
+
+    return [message for _, message in sorted(errors)]
@@ -0,0 +1,62 @@
+"""
+Unit tests for BatchForm validation.
+
+Tests verify that:
+- A lot number held by a soft-deleted batch is rejected, not left to the database constraint
+- The batch being edited does not clash with its own lot number
+"""
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.forms import BatchForm
+from inventory.models import Item, Batch
+
+
+class BatchFormLotUniquenessTestCase(TestCase):
+    """Test lot number uniqueness in BatchForm."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create an item with one live and one soft-deleted batch."""
+        cls.item = Item.objects.create(sku="FORM-001", name="Form Item", unit="pcs")
+        cls.live_batch, cls.deleted_batch = Batch.objects.bulk_create([
+            Batch(item=cls.item, lot_no="LIVE-LOT", received_qty=Decimal("5"), available_qty=Decimal("5")),
+            Batch(
+                item=cls.item,
+                lot_no="GONE-LOT",
+                received_qty=Decimal("5"),
+                available_qty=Decimal("5"),
+                deleted_at=timezone.now(),
+            ),
+        ])
+
+    def _form(self, lot_no, instance=None):
+        return BatchForm(
+            data={
+                "item": self.item.pk,
+                "lot_no": lot_no,
+                "received_qty": "5",
+                "available_qty": "5",
+                "status": Batch.STATUS_AVAILABLE,
+            },
+            instance=instance,
+        )
+
+    def test_soft_deleted_lot_number_is_rejected(self):
+        """Test that reusing the lot of a soft-deleted batch fails validation."""
+        form = self._form("GONE-LOT")
+
+        self.assertFalse(form.is_valid())
+        self.assertIn("already exists", str(form.errors))
+
+    def test_live_lot_number_is_rejected(self):
+        """Test that reusing the lot of a live batch fails validation."""
+        self.assertFalse(self._form("LIVE-LOT").is_valid())
+
+    def test_editing_batch_keeps_its_own_lot_number(self):
+        """Test that an edited batch may keep its lot number."""
+        form = self._form("LIVE-LOT", instance=self.live_batch)
+
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
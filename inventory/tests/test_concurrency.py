@@ -7,40 +7,76 @@ Tests verify that:
 - Batch.reserve() uses SELECT FOR UPDATE to ensure safety
 """
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from decimal import Decimal
 from datetime import timedelta
+from unittest import mock, skipUnless
 from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.db import transaction, connection
+from django.db.utils import OperationalError
+from django.db.models import F, Sum
 from django.utils import timezone
 
 from inventory.models import Item, Batch, Order, OrderItem, Allocation
-from inventory.services.allocation import allocate_order
+from inventory.services.allocation import (
+    AllocationError,
+    InsufficientStockError,
+    _allocate_item_with_stack,
+    allocate_order,
+)
 
 
-class ConcurrentAllocationTestCase(TransactionTestCase):
+def _u(qty):
+    """Quantity as an integer count of thousandths (DecimalField scale), for asserts."""
+    return int(qty * 1000)
+
+
+class ConcurrentAllocationTransactionTests(TransactionTestCase):
     """
     Test concurrent allocation scenarios.
     
     Note: Uses TransactionTestCase instead of TestCase to ensure proper
-    transaction isolation for concurrency tests.
+    transaction isolation for concurrency tests. Each worker thread gets its
+    own connection, so the data must be committed to be visible.
     """
 
+    # Only flush this app's tables between tests
+    available_apps = ["inventory"]
+
+    # Aggregate expressions are copied when resolved, so one instance can be shared
+    _TOTAL_ALLOCATED = Sum("qty_allocated")
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Worker threads are shared by every test in the class
+        cls._executor = ThreadPoolExecutor(max_workers=10)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._executor.shutdown(wait=True)
+        super().tearDownClass()
+
     def setUp(self):
         """Set up test data for concurrency tests."""
-        self.item = Item.objects.create(
-            sku="CONC-001",
-            name="Concurrent Test Item",
-            unit="pcs",
-        )
+        # Tables are flushed after every test, so the fixture is rebuilt here;
+        # one transaction commits both rows together
+        with transaction.atomic():
+            self.item = Item.objects.create(
+                sku="CONC-001",
+                name="Concurrent Test Item",
+                unit="pcs",
+            )
 
-        self.batch = Batch.objects.create(
-            item=self.item,
-            lot_no="CONC-LOT-A",
-            received_qty=Decimal("100"),
-            available_qty=Decimal("100"),
-            expiry_date=timezone.now().date() + timedelta(days=30),
-            status=Batch.STATUS_AVAILABLE,
-        )
+            self.batch = Batch.objects.create(
+                item=self.item,
+                lot_no="CONC-LOT-A",
+                received_qty=Decimal("100"),
+                available_qty=Decimal("100"),
+                expiry_date=timezone.now().date() + timedelta(days=30),
+                status=Batch.STATUS_AVAILABLE,
+            )
 
     def test_concurrent_reserve_prevents_overselling(self):
         """Test that concurrent reserve operations don't oversell batch."""
@@ -56,24 +92,20 @@ class ConcurrentAllocationTestCase(TransactionTestCase):
                 result_list.append({"success": True, "remaining": float(remaining)})
             except Exception as e:
                 error_list.append({"success": False, "error": str(e)})
+            finally:
+                # Release this thread's connection so it isn't left open
+                connection.close()
 
-        # Create 5 threads each trying to reserve 30 units
+        # Submit 5 workers each trying to reserve 30 units
         # Total: 150 units requested, but only 100 available
-        threads = []
-        for i in range(5):
-            t = threading.Thread(
-                target=reserve_operation,
-                args=(Decimal("30"), results, errors)
-            )
-            threads.append(t)
-
-        # Start all threads
-        for t in threads:
-            t.start()
+        qty = Decimal("30")
+        futures = [
+            self._executor.submit(reserve_operation, qty, results, errors)
+            for _ in range(5)
+        ]
 
         # Wait for all to complete
-        for t in threads:
-            t.join()
+        wait(futures)
 
         # Count successes and failures
         success_count = len([r for r in results if r["success"]])
@@ -85,28 +117,72 @@ class ConcurrentAllocationTestCase(TransactionTestCase):
         total_allocated = Decimal("100") - Decimal(str(self.batch.available_qty))
         
         self.batch.refresh_from_db()
-        self.assertLessEqual(total_allocated, Decimal("100"))
-        self.assertGreaterEqual(self.batch.available_qty, Decimal("0"))
+        self.assertLessEqual(_u(total_allocated), 100_000)
+        self.assertGreaterEqual(_u(self.batch.available_qty), 0)
 
         # At least one operation should have failed due to insufficient stock
         self.assertGreater(error_count, 0)
 
+    @skipUnless(connection.vendor == "postgresql", "SERIALIZABLE retry test needs PostgreSQL")
+    def test_concurrent_reserve_under_ssi(self):
+        """Test that serializable transactions with retry don't oversell without row locks."""
+        reserved = []
+        errors = []
+
+        def reserve_serializable(pk, qty):
+            """Read-check-write under SERIALIZABLE, retrying on serialization failures."""
+            try:
+                for attempt in range(5):
+                    try:
+                        with transaction.atomic():
+                            with connection.cursor() as cursor:
+                                cursor.execute("SET TRANSACTION ISOLATION LEVEL SERIALIZABLE")
+                            batch = Batch.objects.get(pk=pk)
+                            if batch.available_qty < qty:
+                                errors.append({"error": "insufficient"})
+                                return
+                            batch.available_qty -= qty
+                            batch.save(update_fields=["available_qty"])
+                        reserved.append(qty)
+                        return
+                    except OperationalError as e:
+                        # serialization_failure / deadlock_detected: retry the transaction
+                        if getattr(e.__cause__, "pgcode", None) not in ("40001", "40P01"):
+                            raise
+                errors.append({"error": "retries_exhausted"})
+            except Exception as e:
+                errors.append({"error": "other", "msg": str(e)})
+            finally:
+                connection.close()
+
+        qty = Decimal("30")
+        futures = [self._executor.submit(reserve_serializable, self.batch.pk, qty) for _ in range(5)]
+        wait(futures)
+
+        self.batch.refresh_from_db()
+        self.assertGreaterEqual(_u(self.batch.available_qty), 0)
+        self.assertEqual(_u(self.batch.available_qty), _u(Decimal("100") - sum(reserved)))
+        self.assertEqual([e for e in errors if e["error"] == "other"], [])
+
     def test_concurrent_allocations_from_same_batch(self):
         """Test multiple orders allocating from same batch concurrently."""
         # Create 3 orders
-        orders = []
-        for i in range(3):
-            order = Order.objects.create(
+        orders = Order.objects.bulk_create([
+            Order(
                 order_no=f"CONC-ORD-{i+1}",
                 customer_name=f"Concurrent Customer {i+1}",
                 status=Order.STATUS_NEW,
             )
-            OrderItem.objects.create(
+            for i in range(3)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 item=self.item,
                 qty_requested=Decimal("40"),  # Each wants 40, total 120 > 100 available
             )
-            orders.append(order)
+            for order in orders
+        ])
 
         results = []
         errors = []
@@ -114,83 +190,78 @@ class ConcurrentAllocationTestCase(TransactionTestCase):
         def allocate_order_operation(order, result_list, error_list):
             """Worker function to allocate order."""
             try:
-                result = allocate_order(order)
+                result = allocate_order(order.pk)
                 result_list.append(result)
-            except Exception as e:
+            except (AllocationError, OperationalError) as e:
+                # No stock left, or lock contention where the backend has no row locks (SQLite)
                 error_list.append({"order": order.order_no, "error": str(e)})
+            except Exception as e:
+                error_list.append({"order": order.order_no, "error": "other", "msg": str(e)})
+            finally:
+                connection.close()
 
-        # Create threads for each order
-        threads = []
-        for order in orders:
-            t = threading.Thread(
-                target=allocate_order_operation,
-                args=(order, results, errors)
-            )
-            threads.append(t)
-
-        # Start all threads
-        for t in threads:
-            t.start()
+        # Submit a worker for each order
+        futures = [
+            self._executor.submit(allocate_order_operation, order, results, errors)
+            for order in orders
+        ]
 
         # Wait for completion
-        for t in threads:
-            t.join()
+        wait(futures)
 
-        # Check results
-        success_count = len([r for r in results if r.get("success")])
+        # Workers must have actually allocated, or the checks below pass vacuously
+        self.assertEqual([e for e in errors if e["error"] == "other"], [])
+        self.assertGreater(len(results), 0)
         
         # Verify batch not oversold
         self.batch.refresh_from_db()
-        self.assertGreaterEqual(self.batch.available_qty, Decimal("0"))
+        self.assertGreaterEqual(_u(self.batch.available_qty), 0)
 
         # Total allocated should not exceed 100
         total_allocated = Allocation.objects.filter(
             order_item__item=self.item
-        ).aggregate(total=models.Sum("qty_allocated"))["total"] or Decimal("0")
+        ).aggregate(total=self._TOTAL_ALLOCATED)["total"] or Decimal("0")
         
-        self.assertLessEqual(total_allocated, Decimal("100"))
+        self.assertLessEqual(_u(total_allocated), 100_000)
 
         # At least one order should fail to fully allocate
         # Since we have 120 requested but only 100 available
-        failed_orders = [o for o in orders if not o.is_fully_allocated]
-        self.assertGreater(len(failed_orders), 0)
+        self.assertTrue(OrderItem.objects.filter(
+            order__in=orders, qty_allocated__lt=F("qty_requested")
+        ).exists())
 
     def test_select_for_update_prevents_race_condition(self):
         """Test that SELECT FOR UPDATE prevents race conditions."""
         results = {"read_values": []}
+        # Release all workers together so they contend for the row lock
+        barrier = threading.Barrier(10)
         
         def read_and_decrement():
             """Read available_qty and then decrement."""
-            with transaction.atomic():
-                # Lock the row
-                batch = Batch.objects.select_for_update().get(pk=self.batch.pk)
-                current_qty = batch.available_qty
-                results["read_values"].append(float(current_qty))
-                
-                # Simulate processing time
-                import time
-                time.sleep(0.01)
-                
-                # Decrement
-                if current_qty >= Decimal("10"):
-                    batch.available_qty -= Decimal("10")
-                    batch.save()
-
-        # Create multiple threads
-        threads = []
-        for i in range(10):
-            t = threading.Thread(target=read_and_decrement)
-            threads.append(t)
-
-        for t in threads:
-            t.start()
-
-        for t in threads:
-            t.join()
+            barrier.wait(timeout=5)
+            try:
+                with transaction.atomic():
+                    # Lock the row
+                    batch = Batch.objects.select_for_update(
+                        of=("self",), no_key=connection.features.has_select_for_no_key_update
+                    ).get(pk=self.batch.pk)
+                    current_qty = batch.available_qty
+                    results["read_values"].append(float(current_qty))
+                    
+                    # Decrement
+                    if current_qty >= Decimal("10"):
+                        batch.available_qty -= Decimal("10")
+                        batch.save()
+            finally:
+                connection.close()
+
+        # Submit one worker per barrier party
+        futures = [self._executor.submit(read_and_decrement) for _ in range(10)]
+        wait(futures)
 
         # Final batch quantity should be 0 (100 - 10*10)
         self.batch.refresh_from_db()
-        self.assertEqual(self.batch.available_qty, Decimal("0"))
+        self.assertEqual(_u(self.batch.available_qty), 0)
 
         # All read values should be different (due to locking)
         # No two threads should see the same value
@@ -204,11 +275,11 @@ class ConcurrentAllocationTestCase(TransactionTestCase):
         results = []
         errors = []
 
-        def attempt_reserve(qty):
+        def attempt_reserve(pk, qty):
             """Attempt to reserve quantity."""
             try:
-                batch = Batch.objects.get(pk=self.batch.pk)
-                batch.reserve(qty)
+                # reserve() locks and re-reads the row itself, so only the pk is needed
+                Batch(pk=pk).reserve(qty)
                 results.append({"success": True})
             except ValueError as e:
                 # Expected error for insufficient stock
@@ -218,18 +289,13 @@ class ConcurrentAllocationTestCase(TransactionTestCase):
                 errors.append({"error": "constraint", "msg": str(e)})
             except Exception as e:
                 errors.append({"error": "other", "msg": str(e)})
+            finally:
+                connection.close()
 
         # Try to reserve more than available
-        threads = []
-        for i in range(3):
-            t = threading.Thread(target=attempt_reserve, args=(Decimal("50"),))
-            threads.append(t)
-
-        for t in threads:
-            t.start()
-
-        for t in threads:
-            t.join()
+        qty = Decimal("50")
+        futures = [self._executor.submit(attempt_reserve, self.batch.pk, qty) for _ in range(3)]
+        wait(futures)
 
         # Should have failures due to insufficient stock
         self.assertGreater(len(errors), 0)
@@ -240,11 +306,49 @@ class ConcurrentAllocationTestCase(TransactionTestCase):
 
         # Batch should never go negative
         self.batch.refresh_from_db()
-        self.assertGreaterEqual(self.batch.available_qty, Decimal("0"))
+        self.assertGreaterEqual(_u(self.batch.available_qty), 0)
+
+
+class ConcurrentAllocationUnitTests(TestCase):
+    """
+    Allocation safety checks that need no threads.
+    
+    These run inside TestCase's per-test savepoint instead of paying for a
+    table flush after each test.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the class."""
+        cls.item = Item.objects.create(
+            sku="CONC-001",
+            name="Concurrent Test Item",
+            unit="pcs",
+        )
+
+        cls.batch = Batch.objects.create(
+            item=cls.item,
+            lot_no="CONC-LOT-A",
+            received_qty=Decimal("100"),
+            available_qty=Decimal("100"),
+            expiry_date=timezone.now().date() + timedelta(days=30),
+            status=Batch.STATUS_AVAILABLE,
+        )
+
+    @skipUnless(connection.features.has_select_for_no_key_update, "FOR NO KEY UPDATE not supported")
+    def test_reserve_locks_only_batch_row(self):
+        """Test that reserve() takes a no-key lock scoped to the batch table."""
+        with CaptureQueriesContext(connection) as ctx:
+            self.batch.reserve(Decimal("10"))
+
+        self.assertTrue(any(
+            'FOR NO KEY UPDATE OF "inventory_batch"' in query["sql"]
+            for query in ctx.captured_queries
+        ))
 
     def test_allocation_atomicity_on_failure(self):
         """Test that failed allocation doesn't leave partial data."""
-        # Create order with multiple items, one invalid
+        # Create order with two lines; the second one fails
         order = Order.objects.create(
             order_no="CONC-ORD-ATOMIC",
             customer_name="Atomic Test",
@@ -258,35 +362,51 @@ class ConcurrentAllocationTestCase(TransactionTestCase):
             qty_requested=Decimal("30"),
         )
 
-        # Invalid item (doesn't exist or insufficient stock)
-        invalid_item = Item.objects.create(
-            sku="INVALID-STOCK",
-            name="No Stock Item",
+        # Second line, on another stocked item
+        other_item = Item.objects.create(
+            sku="CONC-002",
+            name="Second Test Item",
             unit="pcs",
         )
-        
-        # No batches for invalid_item, so allocation should fail
+        other_batch = Batch.objects.create(
+            item=other_item,
+            lot_no="CONC-LOT-B",
+            received_qty=Decimal("50"),
+            available_qty=Decimal("50"),
+            status=Batch.STATUS_AVAILABLE,
+        )
 
         OrderItem.objects.create(
             order=order,
-            item=invalid_item,
+            item=other_item,
             qty_requested=Decimal("20"),
         )
 
-        # Attempt allocation
-        result = allocate_order(order)
+        # A line without stock is reported in the result rather than raised, so make
+        # whichever line is allocated second raise after the first has been written
+        allocated_lines = []
+
+        def allocate_item(order_item, user=None):
+            if allocated_lines:
+                raise InsufficientStockError(f"No stock for {order_item.item.sku}")
+            allocated_lines.append(order_item)
+            return _allocate_item_with_stack(order_item, user)
 
-        # Should fail
-        self.assertFalse(result["success"])
+        with mock.patch(
+            "inventory.services.allocation._allocate_item_with_stack", side_effect=allocate_item
+        ):
+            with self.assertRaises(InsufficientStockError):
+                allocate_order(order.pk)
 
         # No allocations should exist due to rollback
         allocations = Allocation.objects.filter(order_item__order=order)
         self.assertEqual(allocations.count(), 0)
 
-        # First item's batch should not be decremented
+        # Neither batch should be decremented
         self.batch.refresh_from_db()
-        self.assertEqual(self.batch.available_qty, Decimal("100"))
-
+        other_batch.refresh_from_db()
+        self.assertEqual(_u(self.batch.available_qty), 100_000)
+        self.assertEqual(_u(other_batch.available_qty), 50_000)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_NEW)
 
-# Import for aggregate
-from django.db import models
@@ -0,0 +1,96 @@
+"""
+Unit tests for order deallocation.
+
+Tests verify that:
+- Deallocating returns the allocated stock to its batches
+- One deallocate TransactionLog entry is written per allocation
+- The order and its lines are reset to unallocated
+"""
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import (
+    Item,
+    Batch,
+    Order,
+    OrderItem,
+    Allocation,
+    Notification,
+    TransactionLog,
+)
+from inventory.services.allocation import allocate_order
+
+User = get_user_model()
+
+
+class DeallocateOrderViewTestCase(TestCase):
+    """Test DeallocateOrderView.post."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a manager and an order split across two batches."""
+        cls.user = User.objects.create_user(username="manager", password="pass", is_staff=True)
+        cls.item = Item.objects.create(sku="DEAL-001", name="Deallocated Item", unit="pcs")
+
+        today = timezone.now().date()
+        cls.batch1, cls.batch2 = Batch.objects.bulk_create([
+            Batch(
+                item=cls.item,
+                lot_no="DEAL-LOT-A",
+                received_qty=Decimal("50"),
+                available_qty=Decimal("50"),
+                expiry_date=today + timedelta(days=10),
+            ),
+            Batch(
+                item=cls.item,
+                lot_no="DEAL-LOT-B",
+                received_qty=Decimal("50"),
+                available_qty=Decimal("50"),
+                expiry_date=today + timedelta(days=20),
+            ),
+        ])
+
+        cls.order = Order.objects.create(order_no="DEAL-ORD", customer_name="Customer")
+        cls.order_item = OrderItem.objects.create(
+            order=cls.order,
+            item=cls.item,
+            qty_requested=Decimal("70"),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        allocate_order(self.order.pk, user=self.user)
+
+    def test_deallocation_releases_stock(self):
+        """Test that stock, logs and order state are all restored."""
+        response = self.client.post(reverse("inventory:order-deallocate", args=[self.order.pk]))
+
+        self.assertRedirects(
+            response,
+            reverse("inventory:order-detail", args=[self.order.pk]),
+            fetch_redirect_response=False,
+        )
+
+        self.batch1.refresh_from_db()
+        self.batch2.refresh_from_db()
+        self.assertEqual(self.batch1.available_qty, Decimal("50"))
+        self.assertEqual(self.batch2.available_qty, Decimal("50"))
+
+        logs = TransactionLog.objects.filter(order=self.order, type=TransactionLog.TYPE_DEALLOCATE)
+        self.assertEqual(
+            sorted(logs.values_list("batch_id", "qty")),
+            [(self.batch1.pk, Decimal("50")), (self.batch2.pk, Decimal("20"))],
+        )
+
+        self.order.refresh_from_db()
+        self.order_item.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_NEW)
+        self.assertEqual(self.order_item.qty_allocated, Decimal("0"))
+        self.assertFalse(Allocation.objects.filter(order_item__order=self.order).exists())
+        self.assertTrue(
+            Notification.objects.filter(user=self.user, message__startswith="Order DEAL-ORD deallocated").exists()
+        )
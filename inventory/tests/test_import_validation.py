@@ -7,26 +7,95 @@ Tests verify that:
 - Validation errors are reported with row numbers
 """
 import io
+import os
 import tempfile
+import time
 from decimal import Decimal
-from django.test import TestCase
+
+import pandas as pd
+from django.test import TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from inventory.models import Item, Batch, Order
+from inventory.tasks import (
+    IMPORT_PREVIEW_MAX_AGE, _process_batch_import, import_preview_dir, purge_import_previews,
+)
+from inventory.views import BulkImportCommitView, BulkImportView
+from inventory.tests.helpers import (
+    is_missing, parse_date, parse_decimal, read_import_csv, row_errors, validate_rows,
+)
+
+
+CSV_FIXTURES = {
+    "item_missing_sku": """sku,name,description,unit,reorder_threshold
+VALID-003,Item 3,Description 3,pcs,10
+,Item 4,Description 4,pcs,20
+VALID-005,Item 5,Description 5,kg,15
+""",
+    "item_missing_name": """sku,name,description,unit,reorder_threshold
+VALID-006,Item 6,Description 6,pcs,10
+VALID-007,,Description 7,pcs,20
+VALID-008,Item 8,Description 8,kg,15
+""",
+    "batch_missing_item_sku": """item_sku,lot_no,received_qty,expiry_date
+VALID-001,LOT-A,100,2025-12-31
+,LOT-B,50,2025-11-30
+INVALID-SKU,LOT-C,75,2025-10-15
+VALID-002,LOT-D,200,2026-01-31
+""",
+    "batch_missing_lot_no": """item_sku,lot_no,received_qty,expiry_date
+VALID-001,LOT-E,100,2025-12-31
+VALID-002,,50,2025-11-30
+""",
+    "order_missing_order_no": """order_no,customer_name,item_sku,qty_requested
+ORD-001,Customer A,VALID-001,50
+,Customer B,VALID-002,30
+ORD-003,Customer C,VALID-001,40
+""",
+    "order_invalid_item_sku": """order_no,customer_name,item_sku,qty_requested
+ORD-004,Customer D,VALID-001,50
+ORD-005,Customer E,INVALID-999,30
+""",
+    "item_multiple_errors": """sku,name,description,unit,reorder_threshold
+,Item A,Description A,pcs,10
+VALID-009,,Description B,pcs,20
+VALID-010,Item C,Description C,pcs,invalid
+""",
+    "item_valid": """sku,name,description,unit,reorder_threshold
+VALID-011,Item 11,Description 11,pcs,10
+VALID-012,Item 12,Description 12,kg,20
+""",
+    "batch_invalid_expiry": """item_sku,lot_no,received_qty,expiry_date
+VALID-001,LOT-F,100,2025-12-31
+VALID-002,LOT-G,50,invalid-date
+""",
+    "order_negative_qty": """order_no,customer_name,item_sku,qty_requested
+ORD-006,Customer F,VALID-001,50
+ORD-007,Customer G,VALID-002,-10
+""",
+}
 
 
 class ImportValidationTestCase(TestCase):
     """Test bulk import validation logic."""
 
-    def setUp(self):
-        """Create test items for validation."""
-        self.item1 = Item.objects.create(
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Parse each CSV once; the tests only read these rows
+        for name, content in CSV_FIXTURES.items():
+            setattr(cls, f"rows_{name}", read_import_csv(content))
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create test items for validation once per class."""
+        cls.item1 = Item.objects.create(
             sku="VALID-001",
             name="Valid Item 1",
             unit="pcs",
         )
 
-        self.item2 = Item.objects.create(
+        cls.item2 = Item.objects.create(
             sku="VALID-002",
             name="Valid Item 2",
             unit="kg",
@@ -34,26 +103,9 @@ class ImportValidationTestCase(TestCase):
 
     def test_item_import_missing_sku_rejected(self):
         """Test that item import rows without SKU are rejected."""
-        csv_content = """sku,name,description,unit,reorder_threshold
-VALID-003,Item 3,Description 3,pcs,10
-,Item 4,Description 4,pcs,20
-VALID-005,Item 5,Description 5,kg,15
-"""
-        from inventory.views import BulkImportView
-
-        # Parse CSV and validate
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_item_missing_sku
         
-        errors = []
-        for idx, row in df.iterrows():
-            sku = str(row.get("sku", "")).strip().upper()
-            name = str(row.get("name", "")).strip()
-            
-            if not sku or sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing SKU")
-            elif not name or name == "NAN":
-                errors.append(f"Row {idx + 2}: Missing name")
+        errors = validate_rows(rows, {"sku": "SKU", "name": "name"})
 
         # Should have 1 error for missing SKU
         self.assertEqual(len(errors), 1)
@@ -62,23 +114,9 @@ VALID-005,Item 5,Description 5,kg,15
 
     def test_item_import_missing_name_rejected(self):
         """Test that item import rows without name are rejected."""
-        csv_content = """sku,name,description,unit,reorder_threshold
-VALID-006,Item 6,Description 6,pcs,10
-VALID-007,,Description 7,pcs,20
-VALID-008,Item 8,Description 8,kg,15
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_item_missing_name
         
-        errors = []
-        for idx, row in df.iterrows():
-            sku = str(row.get("sku", "")).strip().upper()
-            name = str(row.get("name", "")).strip()
-            
-            if not sku or sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing SKU")
-            elif not name or name == "NAN":
-                errors.append(f"Row {idx + 2}: Missing name")
+        errors = validate_rows(rows, {"sku": "SKU", "name": "name"})
 
         self.assertEqual(len(errors), 1)
         self.assertIn("Row 3", errors[0])
@@ -86,26 +124,9 @@ VALID-008,Item 8,Description 8,kg,15
 
     def test_batch_import_missing_item_sku_rejected(self):
         """Test that batch import rows without valid item_sku are rejected."""
-        csv_content = """item_sku,lot_no,received_qty,expiry_date
-VALID-001,LOT-A,100,2025-12-31
-,LOT-B,50,2025-11-30
-INVALID-SKU,LOT-C,75,2025-10-15
-VALID-002,LOT-D,200,2026-01-31
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_batch_missing_item_sku
         
-        errors = []
-        for idx, row in df.iterrows():
-            item_sku = str(row.get("item_sku", "")).strip().upper()
-            lot_no = str(row.get("lot_no", "")).strip()
-            
-            if not item_sku or item_sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing item_sku")
-            elif not lot_no:
-                errors.append(f"Row {idx + 2}: Missing lot_no")
-            elif not Item.objects.filter(sku=item_sku).exists():
-                errors.append(f"Row {idx + 2}: Item with SKU '{item_sku}' does not exist")
+        errors = validate_rows(rows, {"item_sku": "item_sku", "lot_no": "lot_no"}, sku_col="item_sku")
 
         # Should have 2 errors: missing SKU and invalid SKU
         self.assertEqual(len(errors), 2)
@@ -114,24 +135,9 @@ VALID-002,LOT-D,200,2026-01-31
 
     def test_batch_import_missing_lot_no_rejected(self):
         """Test that batch import rows without lot_no are rejected."""
-        csv_content = """item_sku,lot_no,received_qty,expiry_date
-VALID-001,LOT-E,100,2025-12-31
-VALID-002,,50,2025-11-30
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_batch_missing_lot_no
         
-        errors = []
-        for idx, row in df.iterrows():
-            item_sku = str(row.get("item_sku", "")).strip().upper()
-            lot_no = str(row.get("lot_no", "")).strip()
-            
-            if not item_sku or item_sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing item_sku")
-            elif not lot_no or lot_no == "nan":
-                errors.append(f"Row {idx + 2}: Missing lot_no")
-            elif not Item.objects.filter(sku=item_sku).exists():
-                errors.append(f"Row {idx + 2}: Item does not exist")
+        errors = validate_rows(rows, {"item_sku": "item_sku", "lot_no": "lot_no"}, sku_col="item_sku")
 
         self.assertEqual(len(errors), 1)
         self.assertIn("Row 3", errors[0])
@@ -139,25 +145,9 @@ VALID-002,,50,2025-11-30
 
     def test_order_import_missing_order_no_rejected(self):
         """Test that order import rows without order_no are rejected."""
-        csv_content = """order_no,customer_name,item_sku,qty_requested
-ORD-001,Customer A,VALID-001,50
-,Customer B,VALID-002,30
-ORD-003,Customer C,VALID-001,40
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_order_missing_order_no
         
-        errors = []
-        for idx, row in df.iterrows():
-            order_no = str(row.get("order_no", "")).strip()
-            item_sku = str(row.get("item_sku", "")).strip().upper()
-            
-            if not order_no or order_no == "nan":
-                errors.append(f"Row {idx + 2}: Missing order_no")
-            elif not item_sku or item_sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing item_sku")
-            elif not Item.objects.filter(sku=item_sku).exists():
-                errors.append(f"Row {idx + 2}: Item does not exist")
+        errors = validate_rows(rows, {"order_no": "order_no", "item_sku": "item_sku"}, sku_col="item_sku")
 
         self.assertEqual(len(errors), 1)
         self.assertIn("Row 3", errors[0])
@@ -165,24 +155,9 @@ ORD-003,Customer C,VALID-001,40
 
     def test_order_import_invalid_item_sku_rejected(self):
         """Test that order import rows with invalid item_sku are rejected."""
-        csv_content = """order_no,customer_name,item_sku,qty_requested
-ORD-004,Customer D,VALID-001,50
-ORD-005,Customer E,INVALID-999,30
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_order_invalid_item_sku
         
-        errors = []
-        for idx, row in df.iterrows():
-            order_no = str(row.get("order_no", "")).strip()
-            item_sku = str(row.get("item_sku", "")).strip().upper()
-            
-            if not order_no or order_no == "nan":
-                errors.append(f"Row {idx + 2}: Missing order_no")
-            elif not item_sku or item_sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing item_sku")
-            elif not Item.objects.filter(sku=item_sku).exists():
-                errors.append(f"Row {idx + 2}: Item with SKU '{item_sku}' does not exist")
+        errors = validate_rows(rows, {"order_no": "order_no", "item_sku": "item_sku"}, sku_col="item_sku")
 
         self.assertEqual(len(errors), 1)
         self.assertIn("Row 3", errors[0])
@@ -190,80 +165,41 @@ ORD-005,Customer E,INVALID-999,30
 
     def test_multiple_validation_errors_collected(self):
         """Test that multiple validation errors are collected and reported."""
-        csv_content = """sku,name,description,unit,reorder_threshold
-,Item A,Description A,pcs,10
-VALID-009,,Description B,pcs,20
-VALID-010,Item C,Description C,pcs,invalid
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_item_multiple_errors
+        
+        errors = row_errors(rows, lambda row: is_missing(row, "sku"), "Missing SKU")
+        errors += row_errors(rows, lambda row: is_missing(row, "name"), "Missing name")
         
-        errors = []
-        for idx, row in df.iterrows():
-            sku = str(row.get("sku", "")).strip().upper()
-            name = str(row.get("name", "")).strip()
-            
-            if not sku or sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing SKU")
-            if not name or name == "NAN":
-                errors.append(f"Row {idx + 2}: Missing name")
-            
-            # Validate reorder_threshold is numeric
-            try:
-                threshold = row.get("reorder_threshold")
-                if pd.notna(threshold):
-                    Decimal(str(threshold))
-            except Exception:
-                errors.append(f"Row {idx + 2}: Invalid reorder_threshold")
+        # Validate reorder_threshold is numeric
+        errors += row_errors(
+            rows,
+            lambda row: not is_missing(row, "reorder_threshold") and parse_decimal(row["reorder_threshold"]) is None,
+            "Invalid reorder_threshold",
+        )
 
         # Should have 3 errors
         self.assertEqual(len(errors), 3)
 
     def test_valid_import_passes_validation(self):
         """Test that valid import data passes validation without errors."""
-        csv_content = """sku,name,description,unit,reorder_threshold
-VALID-011,Item 11,Description 11,pcs,10
-VALID-012,Item 12,Description 12,kg,20
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_item_valid
         
-        errors = []
-        for idx, row in df.iterrows():
-            sku = str(row.get("sku", "")).strip().upper()
-            name = str(row.get("name", "")).strip()
-            
-            if not sku or sku == "NAN":
-                errors.append(f"Row {idx + 2}: Missing SKU")
-            elif not name or name == "NAN":
-                errors.append(f"Row {idx + 2}: Missing name")
+        errors = validate_rows(rows, {"sku": "SKU", "name": "name"})
 
         self.assertEqual(len(errors), 0)
 
     def test_batch_import_invalid_expiry_date_format(self):
         """Test that batch import with invalid expiry date format is rejected."""
-        csv_content = """item_sku,lot_no,received_qty,expiry_date
-VALID-001,LOT-F,100,2025-12-31
-VALID-002,LOT-G,50,invalid-date
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_batch_invalid_expiry
+        
+        errors = validate_rows(rows, {}, sku_col="item_sku")
         
-        errors = []
-        for idx, row in df.iterrows():
-            item_sku = str(row.get("item_sku", "")).strip().upper()
-            
-            if not Item.objects.filter(sku=item_sku).exists():
-                errors.append(f"Row {idx + 2}: Item does not exist")
-                continue
-            
-            # Validate expiry_date
-            expiry = row.get("expiry_date")
-            if pd.notna(expiry):
-                try:
-                    pd.to_datetime(expiry)
-                except Exception:
-                    errors.append(f"Row {idx + 2}: Invalid expiry_date format")
+        # Validate expiry_date
+        errors += row_errors(
+            rows,
+            lambda row: not is_missing(row, "expiry_date") and parse_date(row["expiry_date"]) is None,
+            "Invalid expiry_date format",
+        )
 
         self.assertEqual(len(errors), 1)
         self.assertIn("Row 3", errors[0])
@@ -271,23 +207,103 @@ VALID-002,LOT-G,50,invalid-date
 
     def test_order_import_negative_quantity_rejected(self):
         """Test that order import with negative quantity is rejected."""
-        csv_content = """order_no,customer_name,item_sku,qty_requested
-ORD-006,Customer F,VALID-001,50
-ORD-007,Customer G,VALID-002,-10
-"""
-        import pandas as pd
-        df = pd.read_csv(io.StringIO(csv_content))
+        rows = self.rows_order_negative_qty
         
-        errors = []
-        for idx, row in df.iterrows():
-            qty = row.get("qty_requested")
-            try:
-                qty_decimal = Decimal(str(qty))
-                if qty_decimal <= 0:
-                    errors.append(f"Row {idx + 2}: qty_requested must be positive")
-            except Exception:
-                errors.append(f"Row {idx + 2}: Invalid qty_requested")
+        qtys = [parse_decimal(row["qty_requested"]) for row in rows]
+        errors = row_errors(qtys, lambda qty: qty is None, "Invalid qty_requested")
+        errors += row_errors(qtys, lambda qty: qty is not None and qty <= 0, "qty_requested must be positive")
 
         self.assertEqual(len(errors), 1)
         self.assertIn("Row 3", errors[0])
         self.assertIn("must be positive", errors[0])
+
+    def test_bulk_import_view_flags_blank_cells(self):
+        """Test that the upload validator reports blank cells as missing values."""
+        df = pd.read_csv(io.StringIO(CSV_FIXTURES["batch_missing_item_sku"]))
+        result = BulkImportView()._validate_import_data(df, "batch")
+
+        self.assertEqual(
+            [(e["row"], e["errors"]) for e in result["errors"]],
+            [(3, ["Missing item_sku"]), (4, ["Item INVALID-SKU not found"])],
+        )
+        self.assertEqual(result["valid_rows"], 2)
+
+    def test_bulk_import_view_rejects_bad_quantity_and_date(self):
+        """Test that the upload validator separates bad formats from non-positive values."""
+        df = pd.read_csv(io.StringIO(
+            "item_sku,lot_no,received_qty,expiry_date\n"
+            "VALID-001,LOT-1,abc,2099-01-01\n"
+            "valid-002,LOT-2,0,not-a-date\n"
+        ))
+        result = BulkImportView()._validate_import_data(df, "batch")
+
+        self.assertEqual(
+            [(e["row"], e["errors"]) for e in result["errors"]],
+            [
+                (2, ["Invalid received_qty format"]),
+                (3, ["Invalid received_qty", "Invalid expiry_date format"]),
+            ],
+        )
+
+    def test_background_import_rejects_unusable_quantities_per_row(self):
+        """Test that infinite, oversized and blank quantities fail only their own row."""
+        df = pd.read_csv(io.StringIO(
+            "item_sku,lot_no,received_qty\n"
+            "VALID-001,LOT-Q1,5\n"
+            "VALID-001,LOT-Q2,inf\n"
+            "VALID-001,LOT-Q3,1e30\n"
+            "VALID-001,LOT-Q4,\n"
+            "VALID-001,LOT-Q5,1.25\n"
+        ))
+        results = _process_batch_import(df)
+
+        self.assertEqual(results["success"], 2)
+        self.assertEqual(
+            results["errors"],
+            ["Row 3: Invalid received_qty", "Row 4: Invalid received_qty", "Row 5: Invalid received_qty"],
+        )
+        self.assertEqual(
+            sorted(Batch.objects.filter(item=self.item1).values_list("lot_no", "received_qty")),
+            [("LOT-Q1", Decimal("5")), ("LOT-Q5", Decimal("1.25"))],
+        )
+
+    def test_bulk_import_commit_skips_clashing_and_blank_rows(self):
+        """Test that commit skips repeated lots, repeated order lines and blank cells instead of failing."""
+        batches = pd.read_csv(io.StringIO(
+            "item_sku,lot_no,received_qty\n"
+            "VALID-001,LOT-C1,5\n"
+            "VALID-001,LOT-C1,3\n"
+            "VALID-002,LOT-C2,\n"
+        ))
+        orders = pd.read_csv(io.StringIO(
+            "order_no,customer_name,item_sku,qty_requested\n"
+            "ORD-C1,Customer,VALID-001,1\n"
+            "ORD-C1,Customer,VALID-001,2\n"
+            "ORD-C2,Customer,VALID-002,\n"
+        ))
+        items = pd.read_csv(io.StringIO("sku,name\n,Nameless\n"))
+
+        self.assertEqual(BulkImportCommitView()._commit_batches(batches), {"success": 1, "failed": 2})
+        self.assertEqual(BulkImportCommitView()._commit_orders(orders), {"success": 1, "failed": 1})
+        self.assertEqual(BulkImportCommitView()._commit_items(items), {"success": 0, "failed": 1})
+        self.assertEqual(
+            list(Batch.objects.filter(lot_no__startswith="LOT-C").values_list("lot_no", "received_qty")),
+            [("LOT-C1", Decimal("5"))],
+        )
+        self.assertEqual(Order.objects.get(order_no="ORD-C1").items.get().qty_requested, Decimal("1"))
+        self.assertFalse(Order.objects.filter(order_no="ORD-C2").exists())
+        self.assertFalse(Item.objects.filter(sku="NAN").exists())
+
+    def test_stale_import_previews_are_purged(self):
+        """Test that parsed previews past their age limit are removed and fresh ones kept."""
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(import_preview_dir())
+            stale, fresh = (os.path.join(import_preview_dir(), name) for name in ("stale.pkl", "fresh.pkl"))
+            for path in (stale, fresh):
+                open(path, "wb").close()
+            old = time.time() - IMPORT_PREVIEW_MAX_AGE.total_seconds() - 60
+            os.utime(stale, (old, old))
+
+            self.assertEqual(purge_import_previews(), 1)
+            self.assertFalse(os.path.exists(stale))
+            self.assertTrue(os.path.exists(fresh))
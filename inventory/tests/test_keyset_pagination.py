@@ -0,0 +1,118 @@
+"""
+Unit tests for keyset (cursor) pagination of the item and batch lists.
+
+Tests verify that:
+- ?after= and ?before= step through pages in key order
+- The search filter is kept on the page links
+- Multi-column batch keys page correctly when key order differs from pk order
+- Junk or unknown cursors fall back to the first page
+"""
+from decimal import Decimal
+from django.test import TestCase
+from django.urls import reverse
+
+from inventory.models import Item, Batch
+
+
+class ItemListKeysetPaginationTestCase(TestCase):
+    """Test ItemListView paging by SKU."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create 45 items, inserted out of SKU order, half of them tagged Even."""
+        Item.objects.bulk_create([
+            Item(sku=f"KS-{n:03d}", name=f"{'Even' if n % 2 == 0 else 'Odd'} item {n}", unit="pcs")
+            for n in reversed(range(45))
+        ])
+
+    def _page(self, **params):
+        response = self.client.get(reverse("inventory:item-list"), params)
+        self.assertEqual(response.status_code, 200)
+        return response, response.context["page_obj"]
+
+    def _skus(self, page):
+        return [item.sku for item in page]
+
+    def test_first_page(self):
+        """Test that the first page holds the lowest SKUs and only a next link."""
+        _response, page = self._page()
+
+        self.assertEqual(self._skus(page), [f"KS-{n:03d}" for n in range(20)])
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_after_and_before_cursors(self):
+        """Test paging forward to the end and back to page 1."""
+        _response, first = self._page()
+        _response, second = self._page(after=first.next_after)
+        _response, third = self._page(after=second.next_after)
+
+        self.assertEqual(self._skus(second), [f"KS-{n:03d}" for n in range(20, 40)])
+        self.assertTrue(second.has_next())
+        self.assertTrue(second.has_previous())
+        self.assertEqual(self._skus(third), [f"KS-{n:03d}" for n in range(40, 45)])
+        self.assertFalse(third.has_next())
+
+        _response, back = self._page(before=second.previous_before)
+
+        self.assertEqual(self._skus(back), self._skus(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_search_is_carried_across_pages(self):
+        """Test that the next link keeps the search and the next page stays filtered."""
+        response, first = self._page(search="Even")
+
+        self.assertEqual(self._skus(first), [f"KS-{n:03d}" for n in range(0, 40, 2)])
+        self.assertContains(response, f"?after={first.next_after}&search=Even")
+
+        _response, second = self._page(search="Even", after=first.next_after)
+
+        self.assertEqual(self._skus(second), ["KS-040", "KS-042", "KS-044"])
+        self.assertFalse(second.has_next())
+
+    def test_junk_and_unknown_cursors_start_from_first_page(self):
+        """Test that cursors which match no row are ignored."""
+        expected = [f"KS-{n:03d}" for n in range(20)]
+
+        for params in ({"after": "abc"}, {"after": "999999"}, {"before": "abc"}, {"before": "999999"}):
+            with self.subTest(**params):
+                _response, page = self._page(**params)
+                self.assertEqual(self._skus(page), expected)
+                self.assertFalse(page.has_previous())
+
+
+class BatchListKeysetPaginationTestCase(TestCase):
+    """Test BatchListView paging by (item SKU, lot number, pk)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create 15 batches each for two items, the later SKU first."""
+        cls.item_b = Item.objects.create(sku="KB-B", name="Item B", unit="pcs")
+        cls.item_a = Item.objects.create(sku="KB-A", name="Item A", unit="pcs")
+        Batch.objects.bulk_create([
+            Batch(item=item, lot_no=f"LOT-{n:02d}", received_qty=Decimal("1"), available_qty=Decimal("1"))
+            for item in (cls.item_b, cls.item_a)
+            for n in reversed(range(15))
+        ])
+
+    def _keys(self, **params):
+        response = self.client.get(reverse("inventory:batch-list"), params)
+        page = response.context["page_obj"]
+        return page, [(batch.item.sku, batch.lot_no) for batch in page]
+
+    def test_multi_column_keys(self):
+        """Test that pages follow SKU then lot order across both items and back."""
+        expected = [(sku, f"LOT-{n:02d}") for sku in ("KB-A", "KB-B") for n in range(15)]
+
+        first, first_keys = self._keys()
+        second, second_keys = self._keys(after=first.next_after)
+
+        self.assertEqual(first_keys, expected[:20])
+        self.assertEqual(second_keys, expected[20:])
+        self.assertFalse(second.has_next())
+
+        back, back_keys = self._keys(before=second.previous_before)
+
+        self.assertEqual(back_keys, expected[:20])
+        self.assertFalse(back.has_previous())
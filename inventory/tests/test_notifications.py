@@ -0,0 +1,117 @@
+"""
+Unit tests for the cached notification summary.
+
+Tests verify that:
+- get_notification_summary serves repeat polls from the cache
+- Every write path drops the cached summary, so the next poll is current:
+  Notification.save, mark_as_read, mark_all_as_read, notify_multiple and the
+  scheduled tasks' bulk inserts
+"""
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from inventory.models import Item, Batch, Notification
+from inventory.services.notifications_helper import (
+    get_notification_summary,
+    mark_all_as_read,
+    mark_as_read,
+    notify,
+    notify_multiple,
+)
+from inventory.tasks import generate_scheduled_report, scheduled_expiry_scan
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    NOTIFICATIONS_SEND_EMAIL=False,
+)
+class NotificationSummaryCacheTestCase(TestCase):
+    """Test the summary cache and its invalidation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="manager", password="pass", is_staff=True)
+        cls.other = User.objects.create_user(username="clerk", password="pass")
+
+    def setUp(self):
+        cache.clear()
+
+    def _unread(self, user=None):
+        return get_notification_summary(user or self.user)["unread_count"]
+
+    def test_repeat_poll_is_served_from_cache(self):
+        """Test that a write which bypasses invalidation is not seen until expiry."""
+        Notification.objects.create(user=self.user, message="First")
+        self.assertEqual(self._unread(), 1)
+
+        Notification.objects.filter(user=self.user).update(is_read=True)
+
+        self.assertEqual(self._unread(), 1)
+
+    def test_save_invalidates(self):
+        """Test that creating a notification shows up on the next poll."""
+        self.assertEqual(self._unread(), 0)
+
+        notify(self.user, "Order shipped")
+
+        self.assertEqual(self._unread(), 1)
+
+    def test_mark_as_read_invalidates(self):
+        """Test that reading one notification lowers the next poll's count."""
+        notification = Notification.objects.create(user=self.user, message="First")
+        Notification.objects.create(user=self.user, message="Second")
+        self.assertEqual(self._unread(), 2)
+
+        mark_as_read(notification.pk, self.user)
+
+        self.assertEqual(self._unread(), 1)
+
+    def test_mark_all_as_read_invalidates(self):
+        """Test that reading everything clears the next poll's count."""
+        Notification.objects.create(user=self.user, message="First")
+        Notification.objects.create(user=self.user, message="Second")
+        self.assertEqual(self._unread(), 2)
+
+        mark_all_as_read(self.user)
+
+        self.assertEqual(self._unread(), 0)
+
+    def test_notify_multiple_invalidates_every_recipient(self):
+        """Test that a bulk notification reaches each recipient's next poll."""
+        self.assertEqual(self._unread(), 0)
+        self.assertEqual(self._unread(self.other), 0)
+
+        notify_multiple([self.user, self.other], "Stock count tonight")
+
+        self.assertEqual(self._unread(), 1)
+        self.assertEqual(self._unread(self.other), 1)
+
+    def test_scheduled_report_invalidates(self):
+        """Test that the scheduled report's bulk insert reaches staff polls."""
+        self.assertEqual(self._unread(), 0)
+
+        generate_scheduled_report("transaction_summary")
+
+        self.assertEqual(self._unread(), 1)
+
+    def test_expiry_scan_invalidates(self):
+        """Test that the expiry scan's bulk insert reaches staff polls."""
+        item = Item.objects.create(sku="EXP-001", name="Expiring Item", unit="pcs")
+        Batch.objects.create(
+            item=item,
+            lot_no="EXP-LOT",
+            received_qty=Decimal("5"),
+            available_qty=Decimal("5"),
+            expiry_date=timezone.now().date() - timedelta(days=1),
+        )
+        self.assertEqual(self._unread(), 0)
+
+        scheduled_expiry_scan()
+
+        self.assertEqual(self._unread(), 1)
@@ -0,0 +1,61 @@
+"""
+Unit tests for receiving batches.
+
+Tests verify that:
+- Lot numbers are stripped before the duplicate and existing-lot checks
+- Committed batches are saved with the stripped lot number
+"""
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from inventory.models import Item, Batch
+
+User = get_user_model()
+
+
+class ReceiveViewLotNumberTestCase(TestCase):
+    """Test lot number handling in ReceiveView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="receiver", password="pass")
+        cls.item = Item.objects.create(sku="RCV-001", name="Received Item", unit="pcs")
+        Batch.objects.create(
+            item=cls.item,
+            lot_no="OLD",
+            received_qty=Decimal("5"),
+            available_qty=Decimal("5"),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _post(self, action, *lots):
+        data = {"action": action, "item_id": self.item.pk}
+        for row, lot_no in enumerate(lots):
+            data[f"batch_{row}_lot_no"] = lot_no
+            data[f"batch_{row}_qty"] = "1"
+        return self.client.post(reverse("inventory:receive"), data)
+
+    def test_preview_rejects_lots_differing_only_by_whitespace(self):
+        """Test that " L1" and "L1" are reported as the same lot."""
+        response = self._post("preview", " L1", "L1 ")
+
+        self.assertEqual(response.context["errors"], ["Row 2: Lot 'L1' appears more than once"])
+
+    def test_preview_rejects_padded_existing_lot(self):
+        """Test that a padded copy of an existing lot is reported as taken."""
+        response = self._post("preview", "  OLD")
+
+        self.assertEqual(response.context["errors"], ["Row 1: Lot 'OLD' already exists for this item"])
+
+    def test_commit_saves_stripped_lot_once(self):
+        """Test that padded repeats of a lot create a single, stripped batch."""
+        self._post("commit", " L1", "L1", "  OLD ")
+
+        self.assertEqual(
+            sorted(Batch.objects.filter(item=self.item).values_list("lot_no", flat=True)),
+            ["L1", "OLD"],
+        )
@@ -0,0 +1,121 @@
+"""
+Unit tests for return processing.
+
+Tests verify that each disposition:
+- Moves the returned quantity to the right batch (or none, for scrap)
+- Writes one TransactionLog entry tagged with the return
+- Sets the return status and appends the processing note
+"""
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from inventory.forms import ReturnProcessForm
+from inventory.models import (
+    Item,
+    Batch,
+    Order,
+    OrderItem,
+    Allocation,
+    Return,
+    TransactionLog,
+)
+
+User = get_user_model()
+
+
+class ProcessReturnViewTestCase(TestCase):
+    """Test ProcessReturnView disposition handlers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a shipped line allocated from one batch and a return against it."""
+        cls.user = User.objects.create_user(username="manager", password="pass", is_staff=True)
+        cls.item = Item.objects.create(sku="RET-001", name="Returned Item", unit="pcs")
+        cls.batch = Batch.objects.create(
+            item=cls.item,
+            lot_no="RET-LOT",
+            received_qty=Decimal("100"),
+            available_qty=Decimal("90"),
+        )
+        cls.order = Order.objects.create(order_no="RET-ORD", customer_name="Customer")
+        cls.order_item = OrderItem.objects.create(
+            order=cls.order,
+            item=cls.item,
+            qty_requested=Decimal("10"),
+            qty_allocated=Decimal("10"),
+        )
+        Allocation.objects.create(order_item=cls.order_item, batch=cls.batch, qty_allocated=Decimal("10"))
+        cls.return_obj = Return.objects.create(
+            return_no="RET-0001",
+            order_item=cls.order_item,
+            qty_returned=Decimal("4"),
+            reason=Return.REASON_DAMAGED,
+            notes="Box crushed",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _process(self, disposition):
+        response = self.client.post(
+            reverse("inventory:return-process", args=[self.return_obj.pk]),
+            {
+                "return_id": self.return_obj.pk,
+                "disposition": disposition,
+                "qty_accepted": "4",
+                "notes": "Checked",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["success"], response.context.get("error_message"))
+        self.return_obj.refresh_from_db()
+        return TransactionLog.objects.get(meta__return_no=self.return_obj.return_no)
+
+    def _assert_processed(self, status):
+        self.assertEqual(self.return_obj.status, status)
+        self.assertIsNotNone(self.return_obj.processed_at)
+        self.assertEqual(self.return_obj.notes, "Box crushed\n[Processed] Checked")
+
+    def test_restock_original(self):
+        """Test that the quantity goes back to the allocated batch."""
+        log = self._process(ReturnProcessForm.DISPOSITION_RESTOCK_ORIGINAL)
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.available_qty, Decimal("94"))
+        self.assertEqual((log.type, log.qty, log.batch_id), (TransactionLog.TYPE_ADJUST, Decimal("4"), self.batch.pk))
+        self._assert_processed(Return.STATUS_RESTOCKED)
+
+    def test_restock_new(self):
+        """Test that the quantity is received into a new available batch."""
+        log = self._process(ReturnProcessForm.DISPOSITION_RESTOCK_NEW)
+
+        batch = log.batch
+        self.assertTrue(batch.lot_no.startswith("RETURN-"))
+        self.assertEqual(batch.status, Batch.STATUS_AVAILABLE)
+        self.assertEqual(batch.available_qty, Decimal("4"))
+        self.assertEqual((log.type, log.qty), (TransactionLog.TYPE_RECEIPT, Decimal("4")))
+        self._assert_processed(Return.STATUS_RESTOCKED)
+
+    def test_quarantine(self):
+        """Test that the quantity is received into a held batch nothing can allocate from."""
+        log = self._process(ReturnProcessForm.DISPOSITION_QUARANTINE)
+
+        batch = log.batch
+        self.assertTrue(batch.lot_no.startswith("QUARANTINE-"))
+        self.assertEqual(batch.status, Batch.STATUS_HOLD)
+        self.assertEqual(batch.received_qty, Decimal("4"))
+        self.assertEqual(batch.available_qty, Decimal("0"))
+        self.assertEqual((log.type, log.qty), (TransactionLog.TYPE_RECEIPT, Decimal("4")))
+        self._assert_processed(Return.STATUS_QUARANTINED)
+
+    def test_scrap(self):
+        """Test that scrapping logs the loss without touching any batch."""
+        log = self._process(ReturnProcessForm.DISPOSITION_SCRAP)
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.available_qty, Decimal("90"))
+        self.assertIsNone(log.batch_id)
+        self.assertEqual((log.type, log.qty), (TransactionLog.TYPE_ADJUST, Decimal("-4")))
+        self._assert_processed(Return.STATUS_SCRAPPED)
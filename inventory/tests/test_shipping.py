@@ -5,11 +5,16 @@ Tests verify that:
 - Shipping decrements batch available_qty correctly
 - TransactionLog entries are created for ship operations
 - Shipment status transitions work correctly
+- ShipView queues its email/webhook side effects after commit
+- The queued task functions call the notification services
 """
 from decimal import Decimal
 from datetime import timedelta
+from unittest import mock
 from django.test import TestCase
+from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db.models import Sum
 from django.utils import timezone
 
 from inventory.models import (
@@ -22,6 +27,7 @@ from inventory.models import (
     TransactionLog,
 )
 from inventory.services.allocation import allocate_order
+from inventory.tasks import low_stock_alert, notify_order_fulfilled, notify_shipment_created
 
 User = get_user_model()
 
@@ -29,44 +35,57 @@ User = get_user_model()
 class ShippingWorkflowTestCase(TestCase):
     """Test shipping workflow and transaction logging."""
 
-    def setUp(self):
-        """Set up test data."""
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data shared by the class."""
+        cls.user = User.objects.create_user(
             username="testuser",
             password="testpass123",
         )
 
-        self.item = Item.objects.create(
+        cls.item = Item.objects.create(
             sku="SHIP-001",
             name="Shippable Item",
             unit="pcs",
         )
 
-        self.batch = Batch.objects.create(
-            item=self.item,
-            lot_no="SHIP-LOT-A",
-            received_qty=Decimal("100"),
-            available_qty=Decimal("100"),
-            expiry_date=timezone.now().date() + timedelta(days=30),
-            status=Batch.STATUS_AVAILABLE,
-        )
-
-        self.order = Order.objects.create(
+        # SHIP-LOT-B expires later, so FEFO only reaches it once SHIP-LOT-A runs out
+        today = timezone.now().date()
+        cls.batch, cls.batch2 = Batch.objects.bulk_create([
+            Batch(
+                item=cls.item,
+                lot_no="SHIP-LOT-A",
+                received_qty=Decimal("100"),
+                available_qty=Decimal("100"),
+                expiry_date=today + timedelta(days=30),
+                status=Batch.STATUS_AVAILABLE,
+            ),
+            Batch(
+                item=cls.item,
+                lot_no="SHIP-LOT-B",
+                received_qty=Decimal("50"),
+                available_qty=Decimal("50"),
+                expiry_date=today + timedelta(days=60),
+                status=Batch.STATUS_AVAILABLE,
+            ),
+        ], batch_size=100)
+
+        cls.order = Order.objects.create(
             order_no="SHIP-ORD-001",
             customer_name="Shipping Customer",
             status=Order.STATUS_NEW,
         )
 
-        self.order_item = OrderItem.objects.create(
-            order=self.order,
-            item=self.item,
+        cls.order_item = OrderItem.objects.create(
+            order=cls.order,
+            item=cls.item,
             qty_requested=Decimal("30"),
         )
 
     def test_shipping_decrements_batch_quantity(self):
         """Test that shipping operation decrements batch available_qty."""
         # Allocate first
-        allocate_order(self.order)
+        allocate_order(self.order.pk)
         
         self.order.refresh_from_db()
         self.assertEqual(self.order.status, Order.STATUS_ALLOCATED)
@@ -79,23 +98,19 @@ class ShippingWorkflowTestCase(TestCase):
         )
 
         # Simulate shipping: decrement from allocations
-        allocations = Allocation.objects.filter(order_item__order=self.order)
+        # The joined batch row is read after allocate_order, so it already holds the decremented qty
+        allocations = Allocation.objects.filter(order_item__order=self.order).select_related("batch")
         
         for alloc in allocations:
-            batch = alloc.batch
-            qty = alloc.qty_allocated
-            
-            # Decrement (already done by allocation, but verify)
-            batch.refresh_from_db()
-            initial_qty = batch.available_qty
+            initial_qty = alloc.batch.available_qty
             
             # In real workflow, ship doesn't further decrement (allocation did it)
             # But let's verify allocation already decremented
             self.assertEqual(initial_qty, Decimal("70"))  # 100 - 30
 
         # Mark shipment as shipped
-        shipment.status = Shipment.STATUS_IN_TRANSIT
-        shipment.save()
+        Shipment.objects.filter(pk=shipment.pk).update(status=Shipment.STATUS_IN_TRANSIT)
+        shipment.refresh_from_db(fields=["status"])
 
         # Update order status
         self.order.status = Order.STATUS_SHIPPED
@@ -107,7 +122,7 @@ class ShippingWorkflowTestCase(TestCase):
     def test_shipping_creates_transaction_log(self):
         """Test that shipping creates TransactionLog entries."""
         # Allocate
-        allocate_order(self.order)
+        allocate_order(self.order.pk)
 
         # Create shipment
         shipment = Shipment.objects.create(
@@ -117,56 +132,54 @@ class ShippingWorkflowTestCase(TestCase):
         )
 
         # Create transaction log for ship operation
-        allocations = Allocation.objects.filter(order_item__order=self.order)
+        allocations = Allocation.objects.filter(order_item__order=self.order).select_related(
+            "batch", "order_item__item"
+        )
         
-        for alloc in allocations:
-            TransactionLog.objects.create(
+        TransactionLog.objects.bulk_create([
+            TransactionLog(
                 user=self.user,
-                transaction_type=TransactionLog.TYPE_SHIP,
-                qty_change=-alloc.qty_allocated,
+                type=TransactionLog.TYPE_SHIP,
+                qty=-alloc.qty_allocated,
                 item=alloc.order_item.item,
                 batch=alloc.batch,
-                order_item=alloc.order_item,
+                order=alloc.order_item.order,
                 shipment=shipment,
-                notes=f"Shipped {alloc.qty_allocated} units",
+                meta={"notes": f"Shipped {alloc.qty_allocated} units"},
             )
+            for alloc in allocations
+        ])
 
         # Verify transaction logs created
         txn_logs = TransactionLog.objects.filter(
-            transaction_type=TransactionLog.TYPE_SHIP,
+            type=TransactionLog.TYPE_SHIP,
             shipment=shipment,
         )
 
         self.assertEqual(txn_logs.count(), 1)
         
         log = txn_logs.first()
-        self.assertEqual(log.qty_change, Decimal("-30"))
+        self.assertEqual(log.qty, Decimal("-30"))
         self.assertEqual(log.item, self.item)
         self.assertEqual(log.batch, self.batch)
         self.assertEqual(log.user, self.user)
 
     def test_multiple_allocations_shipping(self):
         """Test shipping with split allocations across multiple batches."""
-        # Create second batch
-        batch2 = Batch.objects.create(
-            item=self.item,
-            lot_no="SHIP-LOT-B",
-            received_qty=Decimal("50"),
-            available_qty=Decimal("50"),
-            expiry_date=timezone.now().date() + timedelta(days=60),
-            status=Batch.STATUS_AVAILABLE,
-        )
+        batch2 = self.batch2
 
         # Order more than first batch
         self.order_item.qty_requested = Decimal("120")
         self.order_item.save()
 
         # Allocate (will split across batches)
-        result = allocate_order(self.order)
-        self.assertTrue(result["success"])
+        result = allocate_order(self.order.pk)
+        self.assertEqual(result["status"], Order.STATUS_ALLOCATED)
 
         # Verify allocations
-        allocations = Allocation.objects.filter(order_item=self.order_item).order_by("created_at")
+        allocations = Allocation.objects.filter(order_item=self.order_item).select_related(
+            "batch", "order_item__item"
+        ).order_by("created_at")
         self.assertEqual(allocations.count(), 2)
 
         # Create shipment
@@ -177,34 +190,36 @@ class ShippingWorkflowTestCase(TestCase):
         )
 
         # Create transaction logs for each allocation
-        for alloc in allocations:
-            TransactionLog.objects.create(
+        TransactionLog.objects.bulk_create([
+            TransactionLog(
                 user=self.user,
-                transaction_type=TransactionLog.TYPE_SHIP,
-                qty_change=-alloc.qty_allocated,
+                type=TransactionLog.TYPE_SHIP,
+                qty=-alloc.qty_allocated,
                 item=alloc.order_item.item,
                 batch=alloc.batch,
-                order_item=alloc.order_item,
+                order=alloc.order_item.order,
                 shipment=shipment,
             )
+            for alloc in allocations
+        ])
 
         # Verify transaction logs
         txn_logs = TransactionLog.objects.filter(
-            transaction_type=TransactionLog.TYPE_SHIP,
+            type=TransactionLog.TYPE_SHIP,
             shipment=shipment,
-        ).order_by("timestamp")
+        ).order_by("timestamp", "pk")
 
         self.assertEqual(txn_logs.count(), 2)
 
         # First log: batch1
         log1 = txn_logs[0]
         self.assertEqual(log1.batch, self.batch)
-        self.assertEqual(log1.qty_change, Decimal("-100"))
+        self.assertEqual(log1.qty, Decimal("-100"))
 
         # Second log: batch2
         log2 = txn_logs[1]
         self.assertEqual(log2.batch, batch2)
-        self.assertEqual(log2.qty_change, Decimal("-20"))  # 120 - 100
+        self.assertEqual(log2.qty, Decimal("-20"))  # 120 - 100
 
         # Verify batch quantities after allocation
         self.batch.refresh_from_db()
@@ -215,7 +230,7 @@ class ShippingWorkflowTestCase(TestCase):
 
     def test_shipment_status_transitions(self):
         """Test shipment status transitions."""
-        allocate_order(self.order)
+        allocate_order(self.order.pk)
 
         shipment = Shipment.objects.create(
             shipment_no="SHIP-004",
@@ -224,28 +239,28 @@ class ShippingWorkflowTestCase(TestCase):
         )
 
         # Created -> In Transit
-        shipment.status = Shipment.STATUS_IN_TRANSIT
-        shipment.save()
+        Shipment.objects.filter(pk=shipment.pk).update(status=Shipment.STATUS_IN_TRANSIT)
+        shipment.refresh_from_db(fields=["status"])
         self.assertEqual(shipment.status, Shipment.STATUS_IN_TRANSIT)
 
         # In Transit -> Delivered
-        shipment.status = Shipment.STATUS_DELIVERED
-        shipment.save()
+        Shipment.objects.filter(pk=shipment.pk).update(status=Shipment.STATUS_DELIVERED)
+        shipment.refresh_from_db(fields=["status"])
         self.assertEqual(shipment.status, Shipment.STATUS_DELIVERED)
 
     def test_transaction_log_immutability(self):
         """Test that TransactionLog entries cannot be modified."""
         log = TransactionLog.objects.create(
             user=self.user,
-            transaction_type=TransactionLog.TYPE_SHIP,
-            qty_change=Decimal("-10"),
+            type=TransactionLog.TYPE_SHIP,
+            qty=Decimal("-10"),
             item=self.item,
             batch=self.batch,
         )
 
         # Attempt to modify should raise error
         with self.assertRaises(ValueError):
-            log.qty_change = Decimal("-20")
+            log.qty = Decimal("-20")
             log.save()
 
     def test_shipping_without_allocation_fails(self):
@@ -276,7 +291,7 @@ class ShippingWorkflowTestCase(TestCase):
         self.order_item.qty_requested = Decimal("100")
         self.order_item.save()
 
-        allocate_order(self.order)
+        allocate_order(self.order.pk)
 
         # Create first shipment for partial qty
         shipment1 = Shipment.objects.create(
@@ -285,17 +300,6 @@ class ShippingWorkflowTestCase(TestCase):
             status=Shipment.STATUS_CREATED,
         )
 
-        # Log partial ship (e.g., 60 units)
-        TransactionLog.objects.create(
-            user=self.user,
-            transaction_type=TransactionLog.TYPE_SHIP,
-            qty_change=Decimal("-60"),
-            item=self.item,
-            batch=self.batch,
-            order_item=self.order_item,
-            shipment=shipment1,
-        )
-
         # Create second shipment for remaining
         shipment2 = Shipment.objects.create(
             shipment_no="SHIP-006-B",
@@ -303,15 +307,19 @@ class ShippingWorkflowTestCase(TestCase):
             status=Shipment.STATUS_CREATED,
         )
 
-        TransactionLog.objects.create(
-            user=self.user,
-            transaction_type=TransactionLog.TYPE_SHIP,
-            qty_change=Decimal("-40"),
-            item=self.item,
-            batch=self.batch,
-            order_item=self.order_item,
-            shipment=shipment2,
-        )
+        # Log partial ships (60 units, then the remaining 40)
+        TransactionLog.objects.bulk_create([
+            TransactionLog(
+                user=self.user,
+                type=TransactionLog.TYPE_SHIP,
+                qty=qty,
+                item=self.item,
+                batch=self.batch,
+                order=self.order,
+                shipment=shipment,
+            )
+            for shipment, qty in ((shipment1, Decimal("-60")), (shipment2, Decimal("-40")))
+        ])
 
         # Verify two shipments exist for order
         shipments = Shipment.objects.filter(order=self.order)
@@ -319,12 +327,88 @@ class ShippingWorkflowTestCase(TestCase):
 
         # Verify total shipped quantity in logs
         total_shipped = TransactionLog.objects.filter(
-            transaction_type=TransactionLog.TYPE_SHIP,
-            order_item=self.order_item,
-        ).aggregate(total=models.Sum("qty_change"))["total"]
+            type=TransactionLog.TYPE_SHIP,
+            order=self.order,
+        ).aggregate(total=Sum("qty"))["total"] or Decimal("0")
 
         self.assertEqual(total_shipped, Decimal("-100"))
 
 
-# Import for aggregate
-from django.db import models
+class ShipViewSideEffectsTestCase(TestCase):
+    """Test the tasks ShipView queues once the shipment has committed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a manager and an allocated order that leaves its item below threshold."""
+        cls.user = User.objects.create_user(username="shipper", password="pass", is_staff=True)
+        cls.item = Item.objects.create(
+            sku="SHIP-LOW",
+            name="Low Stock Item",
+            unit="pcs",
+            reorder_threshold=Decimal("25"),
+        )
+        cls.batch = Batch.objects.create(
+            item=cls.item,
+            lot_no="SHIP-LOW-LOT",
+            received_qty=Decimal("50"),
+            available_qty=Decimal("50"),
+        )
+        cls.order = Order.objects.create(order_no="SHIP-ORD-LOW", customer_name="Customer")
+        OrderItem.objects.create(order=cls.order, item=cls.item, qty_requested=Decimal("30"))
+        allocate_order(cls.order.pk)
+
+    def test_ship_queues_tasks_after_commit(self):
+        """Test the low stock, shipment and fulfilment tasks and their arguments."""
+        self.client.force_login(self.user)
+
+        with mock.patch("inventory.views.async_task") as async_task:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.client.post(reverse("inventory:order-ship", args=[self.order.pk]), {"carrier": "UPS"})
+
+                # Nothing is queued before the transaction commits
+                async_task.assert_not_called()
+
+        shipment = Shipment.objects.get(order=self.order)
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(async_task.call_args_list, [
+            mock.call("inventory.tasks.low_stock_alert", self.item.pk, Decimal("20")),
+            mock.call("inventory.tasks.notify_shipment_created", shipment.pk),
+            mock.call("inventory.tasks.notify_order_fulfilled", self.order.pk),
+        ])
+
+
+class ShippingTasksTestCase(TestCase):
+    """Test the task functions queued by ShipView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(sku="TASK-001", name="Task Item", unit="pcs")
+        cls.order = Order.objects.create(
+            order_no="TASK-ORD",
+            customer_name="Customer",
+            status=Order.STATUS_SHIPPED,
+        )
+        cls.shipment = Shipment.objects.create(shipment_no="TASK-SHIP", order=cls.order)
+
+    def test_notify_shipment_created(self):
+        """Test that the shipment email and webhook both receive the shipment."""
+        with mock.patch("inventory.tasks.send_shipment_notification") as send:
+            with mock.patch("inventory.tasks.webhook_shipment_created") as webhook:
+                notify_shipment_created(self.shipment.pk)
+
+        send.assert_called_once_with(self.shipment)
+        webhook.assert_called_once_with(self.shipment)
+
+    def test_notify_order_fulfilled(self):
+        """Test that the fulfilment webhook receives the order."""
+        with mock.patch("inventory.tasks.webhook_order_fulfilled") as webhook:
+            notify_order_fulfilled(self.order.pk)
+
+        webhook.assert_called_once_with(self.order)
+
+    def test_low_stock_alert(self):
+        """Test that the alert is sent for the item with the queued quantity."""
+        with mock.patch("inventory.tasks.send_low_stock_alert") as send:
+            low_stock_alert(self.item.pk, Decimal("3"))
+
+        send.assert_called_once_with(self.item, Decimal("3"))
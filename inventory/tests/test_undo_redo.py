@@ -0,0 +1,235 @@
+"""
+Unit tests for the undo/redo service.
+
+Tests verify that:
+- An allocation can be undone and redone end to end through the stacks
+- A receive can be undone and redone end to end through the stacks
+- Entries dispatch through the handler tables; unknown ones are dropped and
+  failing ones stay on the stack
+- A receive made through ReceiveView can be undone and redone from the views
+- The history page lists stack entries by operation name
+"""
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+from django.urls import reverse
+
+from inventory.models import (
+    Item,
+    Batch,
+    Order,
+    OrderItem,
+    Allocation,
+    UndoStack,
+    RedoStack,
+    TransactionLog,
+)
+from inventory.services.allocation import allocate_order
+from inventory.services.undo_redo import (
+    REDO_HANDLERS,
+    UNDO_HANDLERS,
+    allocation_undo_data,
+    perform_redo,
+    perform_undo,
+    push_undo_operation,
+)
+
+User = get_user_model()
+
+
+class UndoRedoRoundTripTestCase(TestCase):
+    """Test undo then redo of stacked operations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a manager, an item with one batch and an order for it."""
+        cls.user = User.objects.create_user(username="manager", password="pass", is_staff=True)
+        cls.item = Item.objects.create(sku="UNDO-001", name="Undo Item", unit="pcs")
+        cls.batch = Batch.objects.create(
+            item=cls.item,
+            lot_no="UNDO-LOT",
+            received_qty=Decimal("100"),
+            available_qty=Decimal("100"),
+        )
+        cls.order = Order.objects.create(order_no="UNDO-ORD", customer_name="Customer")
+        cls.order_item = OrderItem.objects.create(
+            order=cls.order,
+            item=cls.item,
+            qty_requested=Decimal("30"),
+        )
+
+    def _assert_allocated(self, qty):
+        self.batch.refresh_from_db()
+        self.order_item.refresh_from_db()
+        self.assertEqual(self.batch.available_qty, Decimal("100") - qty)
+        self.assertEqual(self.order_item.qty_allocated, qty)
+        self.assertEqual(
+            sum(a.qty_allocated for a in Allocation.objects.filter(order_item=self.order_item)),
+            qty,
+        )
+
+    def test_undo_and_redo_allocation(self):
+        """Test that an allocation is released by undo and re-applied by redo."""
+        allocate_order(self.order.pk, user=self.user)
+        push_undo_operation("allocation", allocation_undo_data(self.order.pk))
+
+        perform_undo(self.user)
+
+        self._assert_allocated(Decimal("0"))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_NEW)
+        self.assertFalse(UndoStack.objects.exists())
+        self.assertEqual(RedoStack.objects.get().op_name, "allocation")
+
+        perform_redo(self.user)
+
+        self._assert_allocated(Decimal("30"))
+        self.assertFalse(RedoStack.objects.exists())
+
+        # The entry pushed back by redo reverses the new allocations
+        perform_undo(self.user)
+
+        self._assert_allocated(Decimal("0"))
+
+    def test_undo_and_redo_receive(self):
+        """Test that received batches are soft-deleted by undo and restored by redo."""
+        received = Batch.objects.create(
+            item=self.item,
+            lot_no="RECV-LOT",
+            received_qty=Decimal("40"),
+            available_qty=Decimal("40"),
+        )
+        push_undo_operation("receive", {"batch_ids": [received.pk]})
+
+        perform_undo(self.user)
+
+        self.assertFalse(Batch.objects.filter(pk=received.pk).exists())
+        self.assertTrue(Batch.all_objects.filter(pk=received.pk, available_qty=0).exists())
+
+        perform_redo(self.user)
+
+        received.refresh_from_db()
+        self.assertIsNone(received.deleted_at)
+        self.assertEqual(received.available_qty, Decimal("40"))
+        self.assertEqual(UndoStack.objects.get().op_name, "receive")
+
+
+class UndoRedoDispatchTestCase(TestCase):
+    """Test handler-table dispatch in perform_undo/perform_redo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="dispatcher", password="pass", is_staff=True)
+
+    def test_known_operation_runs_its_handler(self):
+        """Test that an entry is passed to the handler registered for its op_name."""
+        handler = mock.Mock(return_value="handled")
+        push_undo_operation("receive", {"batch_ids": [1]})
+
+        with mock.patch.dict(UNDO_HANDLERS, {"receive": handler}):
+            results = perform_undo(self.user)
+
+        handler.assert_called_once_with({"batch_ids": [1]}, self.user)
+        self.assertEqual(results, ["handled"])
+        self.assertFalse(UndoStack.objects.exists())
+        self.assertEqual(RedoStack.objects.get().metadata, {"batch_ids": [1]})
+
+    def test_unknown_operation_is_dropped(self):
+        """Test that an entry without a handler is removed without a redo entry."""
+        UndoStack.push("reserve", {"applied": []})
+        push_undo_operation("receive", {"batch_ids": []})
+
+        with mock.patch.dict(UNDO_HANDLERS, {"receive": mock.Mock(return_value="handled")}):
+            results = perform_undo(self.user, count=2)
+
+        self.assertEqual(results, ["handled", "Cannot undo operation: reserve"])
+        self.assertFalse(UndoStack.objects.exists())
+        self.assertEqual(RedoStack.objects.get().op_name, "receive")
+
+    def test_failing_operation_stays_on_the_stack(self):
+        """Test that a failing handler keeps its entry and stops older ones from running."""
+        older = mock.Mock(return_value="older")
+        RedoStack.push("receive", {"batch_ids": [1]})
+        RedoStack.push("allocation", {"order_id": 1})
+
+        with mock.patch.dict(REDO_HANDLERS, {
+            "allocation": mock.Mock(side_effect=ValueError("boom")),
+            "receive": older,
+        }):
+            results = perform_redo(self.user, count=2)
+
+        self.assertEqual(results, ["Redo failed: boom"])
+        older.assert_not_called()
+        self.assertEqual(
+            list(RedoStack.objects.order_by("pk").values_list("op_name", flat=True)),
+            ["receive", "allocation"],
+        )
+        self.assertFalse(UndoStack.objects.exists())
+
+    def test_empty_stack_reports_no_more_operations(self):
+        """Test the message returned when the stack runs out."""
+        self.assertEqual(perform_redo(self.user), ["No more operations to redo"])
+
+
+class ReceiveUndoRedoViewTestCase(TestCase):
+    """Test receive -> undo -> redo through the views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="receiver", password="pass", is_staff=True)
+        cls.item = Item.objects.create(sku="RECV-001", name="Received Item", unit="pcs")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _stock(self):
+        return Batch.objects.filter(item=self.item).aggregate(total=Sum("available_qty"))["total"] or Decimal("0")
+
+    def _log_count(self, log_type):
+        return TransactionLog.objects.filter(item=self.item, type=log_type).count()
+
+    def test_receive_undo_redo(self):
+        """Test that stock and logs follow a receive through undo and redo."""
+        self.client.post(reverse("inventory:receive"), {
+            "action": "commit",
+            "item_id": self.item.pk,
+            "batch_0_lot_no": "R-1",
+            "batch_0_qty": "10",
+            "batch_1_lot_no": "R-2",
+            "batch_1_qty": "5",
+        })
+
+        self.assertEqual(self._stock(), Decimal("15"))
+        self.assertEqual(self._log_count(TransactionLog.TYPE_RECEIPT), 2)
+        self.assertEqual(UndoStack.objects.get().op_name, "receive")
+
+        self.client.post(reverse("inventory:undo"), {"count": 1})
+
+        self.assertEqual(self._stock(), Decimal("0"))
+        self.assertEqual(Batch.all_objects.soft_deleted().filter(item=self.item).count(), 2)
+        self.assertEqual(self._log_count(TransactionLog.TYPE_ADJUST), 2)
+
+        self.client.post(reverse("inventory:redo"), {"count": 1})
+
+        self.assertEqual(self._stock(), Decimal("15"))
+        self.assertEqual(self._log_count(TransactionLog.TYPE_RECEIPT), 4)
+        self.assertEqual(UndoStack.objects.get().op_name, "receive")
+        self.assertFalse(RedoStack.objects.exists())
+
+
+class UndoRedoHistoryViewTestCase(TestCase):
+    """Test the undo/redo history page."""
+
+    def test_history_lists_operation_names(self):
+        """Test that each stack's entries are listed by op_name."""
+        user = User.objects.create_user(username="historian", password="pass", is_staff=True)
+        UndoStack.push("allocation", {"order_id": 1})
+        RedoStack.push("receive", {"batch_ids": [1]})
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("inventory:undo-redo-history"))
+
+        self.assertContains(response, '<span class="badge bg-secondary">allocation</span>', html=True)
+        self.assertContains(response, '<span class="badge bg-secondary">receive</span>', html=True)
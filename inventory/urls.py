@@ -1,53 +1,61 @@
-from django.urls import path
+from django.urls import include, path
 from . import views
 
 app_name = "inventory"
 
-urlpatterns = [
+# Never mutated after import, so a tuple is enough
+urlpatterns = (
     # Dashboard
     path("", views.DashboardView.as_view(), name="dashboard"),
     
     # Item URLs
-    path("items/", views.ItemListView.as_view(), name="item-list"),
-    path("items/", views.ItemListView.as_view(), name="item-list-alt"),
-    path("items/create/", views.ItemCreateView.as_view(), name="item-create"),
-    path("items/<slug:sku>/", views.ItemDetailView.as_view(), name="item-detail"),
-    path("items/<slug:sku>/update/", views.ItemUpdateView.as_view(), name="item-update"),
-    path("items/<slug:sku>/delete/", views.ItemDeleteView.as_view(), name="item-delete"),
+    path("items/", include([
+        path("", views.ItemListView.as_view(), name="item-list"),
+        path("create/", views.ItemCreateView.as_view(), name="item-create"),
+        path("<slug:sku>/", views.ItemDetailView.as_view(), name="item-detail"),
+        path("<slug:sku>/update/", views.ItemUpdateView.as_view(), name="item-update"),
+        path("<slug:sku>/delete/", views.ItemDeleteView.as_view(), name="item-delete"),
+    ])),
     
     # Batch URLs
-    path("batches/", views.BatchListView.as_view(), name="batch-list"),
-    path("batches/create/", views.BatchCreateView.as_view(), name="batch-create"),
-    path("batches/<int:pk>/", views.BatchDetailView.as_view(), name="batch-detail"),
-    path("batches/<int:pk>/update/", views.BatchUpdateView.as_view(), name="batch-update"),
-    path("batches/<int:pk>/delete/", views.BatchDeleteView.as_view(), name="batch-delete"),
+    path("batches/", include([
+        path("", views.BatchListView.as_view(), name="batch-list"),
+        path("create/", views.BatchCreateView.as_view(), name="batch-create"),
+        path("<int:pk>/", views.BatchDetailView.as_view(), name="batch-detail"),
+        path("<int:pk>/update/", views.BatchUpdateView.as_view(), name="batch-update"),
+        path("<int:pk>/delete/", views.BatchDeleteView.as_view(), name="batch-delete"),
+    ])),
     
     # Receive URL
     path("receive/", views.ReceiveView.as_view(), name="receive"),
     
     # Order URLs
-    path("orders/", views.OrderListView.as_view(), name="order-list"),
-    path("orders/create/", views.OrderCreateView.as_view(), name="order-create"),
-    path("orders/<int:pk>/", views.OrderDetailView.as_view(), name="order-detail"),
-    path("orders/<int:pk>/update/", views.OrderUpdateView.as_view(), name="order-update"),
-    path("orders/<int:pk>/cancel/", views.OrderCancelView.as_view(), name="order-cancel"),
-    path("orders/<int:pk>/delete/", views.OrderDeleteView.as_view(), name="order-delete"),
+    path("orders/", include([
+        path("", views.OrderListView.as_view(), name="order-list"),
+        path("create/", views.OrderCreateView.as_view(), name="order-create"),
+        path("<int:pk>/", views.OrderDetailView.as_view(), name="order-detail"),
+        path("<int:pk>/update/", views.OrderUpdateView.as_view(), name="order-update"),
+        path("<int:pk>/cancel/", views.OrderCancelView.as_view(), name="order-cancel"),
+        path("<int:pk>/delete/", views.OrderDeleteView.as_view(), name="order-delete"),
+    ])),
     
-    # Order allocation
-    path("order/<int:order_id>/allocate/", views.AllocateOrderView.as_view(), name="order-allocate"),
-    path("order/<int:order_id>/deallocate/", views.DeallocateOrderView.as_view(), name="order-deallocate"),
-    
-    # Pick, Pack, Ship URLs
-    path("order/<int:order_id>/pick/", views.PickView.as_view(), name="order-pick"),
-    path("order/<int:order_id>/pack/", views.PackView.as_view(), name="order-pack"),
-    path("order/<int:order_id>/ship/", views.ShipView.as_view(), name="order-ship"),
-    path("order/<int:order_id>/deliver/", views.DeliverView.as_view(), name="order-deliver"),
+    # Order allocation and Pick, Pack, Ship URLs
+    path("order/<int:order_id>/", include([
+        path("allocate/", views.AllocateOrderView.as_view(), name="order-allocate"),
+        path("deallocate/", views.DeallocateOrderView.as_view(), name="order-deallocate"),
+        path("pick/", views.PickView.as_view(), name="order-pick"),
+        path("pack/", views.PackView.as_view(), name="order-pack"),
+        path("ship/", views.ShipView.as_view(), name="order-ship"),
+        path("deliver/", views.DeliverView.as_view(), name="order-deliver"),
+    ])),
     
     # RMA (Return) URLs
-    path("returns/", views.ReturnListView.as_view(), name="return-list"),
-    path("returns/create/", views.CreateReturnView.as_view(), name="return-create"),
-    path("returns/<int:pk>/", views.ReturnDetailView.as_view(), name="return-detail"),
-    path("returns/<int:return_id>/process/", views.ProcessReturnView.as_view(), name="return-process"),
+    path("returns/", include([
+        path("", views.ReturnListView.as_view(), name="return-list"),
+        path("create/", views.CreateReturnView.as_view(), name="return-create"),
+        path("<int:pk>/", views.ReturnDetailView.as_view(), name="return-detail"),
+        path("<int:return_id>/process/", views.ProcessReturnView.as_view(), name="return-process"),
+    ])),
     
     # Undo/Redo URLs
     path("undo/", views.UndoView.as_view(), name="undo"),
@@ -55,9 +63,11 @@ urlpatterns = [
     path("undo-redo-history/", views.UndoRedoHistoryView.as_view(), name="undo-redo-history"),
     
     # Notification URLs
-    path("notifications/unread/", views.UnreadNotificationsView.as_view(), name="notifications-unread"),
-    path("notifications/<int:notification_id>/read/", views.MarkNotificationReadView.as_view(), name="notification-read"),
-    path("notifications/read-all/", views.MarkAllNotificationsReadView.as_view(), name="notifications-read-all"),
+    path("notifications/", include([
+        path("unread/", views.UnreadNotificationsView.as_view(), name="notifications-unread"),
+        path("<int:notification_id>/read/", views.MarkNotificationReadView.as_view(), name="notification-read"),
+        path("read-all/", views.MarkAllNotificationsReadView.as_view(), name="notifications-read-all"),
+    ])),
     
     # Webhook endpoint
     path("webhook/", views.WebhookReceiverView.as_view(), name="webhook-receiver"),
@@ -67,11 +77,19 @@ urlpatterns = [
     path("import/commit/", views.BulkImportCommitView.as_view(), name="bulk_import_commit"),
     
     # Export routes
-    path("export/", views.ExportMenuView.as_view(), name="export_menu"),
-    path("export/inventory-snapshot/", views.ExportInventorySnapshotView.as_view(), name="export_inventory_snapshot"),
-    path("export/batches/", views.ExportBatchesView.as_view(), name="export_batches"),
-    path("export/transaction-log/", views.ExportTransactionLogView.as_view(), name="export_transaction_log"),
-    path("export/orders-allocations/", views.ExportOrdersAllocationsView.as_view(), name="export_orders_allocations"),
+    path("export/", include([
+        path("", views.ExportMenuView.as_view(), name="export_menu"),
+        path("inventory-snapshot/", views.ExportInventorySnapshotView.as_view(), name="export_inventory_snapshot"),
+        path("batches/", views.ExportBatchesView.as_view(), name="export_batches"),
+        path("transaction-log/", views.ExportTransactionLogView.as_view(), name="export_transaction_log"),
+        path("orders-allocations/", views.ExportOrdersAllocationsView.as_view(), name="export_orders_allocations"),
+        path("lot-report/", views.ExportLotReportView.as_view(), name="export-lot-report"),
+        path("lot-report.csv", views.ExportLotReportCSVView.as_view(), name="export-lot-report-csv"),
+        path("item-report/", views.ExportItemReportView.as_view(), name="export-item-report"),
+        path("item-report.csv", views.ExportItemReportCSVView.as_view(), name="export-item-report-csv"),
+        path("customer-report/", views.ExportCustomerReportView.as_view(), name="export-customer-report"),
+        path("customer-report.csv", views.ExportCustomerReportCSVView.as_view(), name="export-customer-report-csv"),
+    ])),
 
     # Graph views
     path("graph/", views.GraphView.as_view(), name="graph"),
@@ -90,12 +108,6 @@ urlpatterns = [
     path("lot-search/", views.LotSearchView.as_view(), name="lot-search"),
     path("item-search/", views.ItemSearchView.as_view(), name="item-search"),
     path("customer-search/", views.CustomerSearchView.as_view(), name="customer-search"),
-    path("export/lot-report/", views.ExportLotReportView.as_view(), name="export-lot-report"),
-    path("export/lot-report.csv", views.ExportLotReportCSVView.as_view(), name="export-lot-report-csv"),
-    path("export/item-report/", views.ExportItemReportView.as_view(), name="export-item-report"),
-    path("export/item-report.csv", views.ExportItemReportCSVView.as_view(), name="export-item-report-csv"),
-    path("export/customer-report/", views.ExportCustomerReportView.as_view(), name="export-customer-report"),
-    path("export/customer-report.csv", views.ExportCustomerReportCSVView.as_view(), name="export-customer-report-csv"),
 
     # Batch Order Processor (Queue + Stack)
     path("batch-processor/", views.BatchProcessorView.as_view(), name="batch-processor"),
@@ -105,4 +117,4 @@ urlpatterns = [
     path("sandbox/stack/", views.SandboxStackView.as_view(), name="sandbox_stack"),
     path("sandbox/queue/", views.SandboxQueueView.as_view(), name="sandbox_queue"),
     path("sandbox/apply/", views.ApplySandboxOperationsView.as_view(), name="sandbox_apply"),
-]
+)
@@ -4,42 +4,53 @@ Class-based views for inventory management.
 import uuid
 import json
 import logging
+import os
+import re
+import secrets
 import traceback
+from collections import defaultdict
+from datetime import timedelta
 from decimal import Decimal
+from functools import partial
+from django.conf import settings
+from django.core.files.move import file_move_safe
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View
+from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import Http404, JsonResponse, HttpResponseBadRequest
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Sum, F, Q
+from django.db.models import Case, Count, Prefetch, Sum, F, Q, TextField, Value, When
+from django.db.models.functions import Coalesce, Concat
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.contrib import messages
+from django_q.tasks import async_task
 
-from .models import Item, Batch, TransactionLog, Order, OrderItem, Allocation, Shipment, Notification, Return
+from .models import Item, Batch, TransactionLog, Order, OrderItem, Allocation, Shipment, Notification, Return, UndoStack, RedoStack
 from .forms import ItemForm, BatchForm, PickForm, PackForm, ShipForm, ReturnForm, ReturnProcessForm, BulkImportForm, OrderForm, OrderItemInlineFormSet
 from .services.allocation import allocate_order, AllocationError, OrderNotFoundError
 from .services.batch_processor import process_order_queue_batch
-from .services.notifications import (
-    send_shipment_notification,
-    send_low_stock_alert,
-    webhook_shipment_created,
-    webhook_order_fulfilled,
-)
-from .services.undo_redo import perform_undo, perform_redo, push_undo_operation
+from .services.imports import decimal_field_limit, to_decimal
+from .services.undo_redo import allocation_undo_data, perform_undo, perform_redo, push_undo_operation
 from .services.notifications_helper import (
     notify,
-    get_unread_count,
-    get_recent_notifications,
+    notify_multiple,
+    get_notification_summary,
     mark_as_read,
     mark_all_as_read,
 )
 from .integrations import validate_webhook_signature
+from .tasks import import_preview_dir, purge_import_previews
 
 logger = logging.getLogger(__name__)
 
+# Receive form fields: batch_<row>_lot_no, batch_<row>_qty, batch_<row>_expiry
+BATCH_FIELD_RE = re.compile(r"^batch_(\d+)_(lot_no|qty|expiry)$")
+
 
 
 
@@ -54,6 +65,103 @@ class HtmxResponseMixin:
         return super().get_template_names()
 
 
+class StaffRequiredMixin(UserPassesTestMixin):
+    """Restrict a view to staff users and superusers (manager-only actions)."""
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_staff or user.is_superuser
+
+
+def _short_code():
+    """Eight random uppercase hex characters for RMA and return lot numbers."""
+    return secrets.token_hex(4).upper()
+
+
+def _order_no_or_404(order_id):
+    """order_no for order_id, fetched as a single column; raises Http404 if there is no such order."""
+    order_no = Order.objects.filter(pk=order_id).values_list("order_no", flat=True).first()
+    if order_no is None:
+        raise Http404("No Order matches the given query.")
+    return order_no
+
+
+class KeysetPage:
+    """One page of a keyset-paginated list, shaped like the bits of Page the templates use."""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_after = object_list[-1].pk if object_list else None
+        self.previous_before = object_list[0].pk if object_list else None
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """
+    Paginate a ListView by cursor (?after=<pk> / ?before=<pk>) instead of OFFSET.
+
+    keyset_fields must order rows uniquely. A page is read with a WHERE on those
+    columns, so deep pages cost the same as the first and no COUNT(*) is run.
+    """
+
+    keyset_fields = ("pk",)
+
+    def _keyset_condition(self, queryset, cursor, forward):
+        """Q selecting rows strictly after (or before) the row with pk=cursor, or None."""
+        try:
+            values = queryset.filter(pk=int(cursor)).values_list(*self.keyset_fields).first()
+        except ValueError:
+            values = None
+        if values is None:
+            return None
+
+        lookup = "gt" if forward else "lt"
+        condition = Q()
+        for i, field in enumerate(self.keyset_fields):
+            condition |= Q(**dict(zip(self.keyset_fields[:i], values[:i])), **{f"{field}__{lookup}": values[i]})
+        return condition
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get("before")
+        forward = cursor is None
+        if forward:
+            cursor = self.request.GET.get("after")
+
+        qs = queryset.order_by(*self.keyset_fields)
+        condition = self._keyset_condition(queryset, cursor, forward) if cursor else None
+        if condition is None:
+            # No cursor, or one that matches no row: start from the first page
+            forward = True
+        else:
+            qs = qs.filter(condition)
+        if not forward:
+            qs = qs.reverse()
+
+        # Read one extra row to learn whether there is another page in this direction
+        rows = list(qs[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if forward:
+            page = KeysetPage(rows, has_next=has_more, has_previous=condition is not None)
+        else:
+            rows.reverse()
+            page = KeysetPage(rows, has_next=condition is not None, has_previous=has_more)
+        return (None, page, rows, page.has_next() or page.has_previous())
+
+
 # =============================
 # Dashboard View
 # =============================
@@ -61,37 +169,52 @@ class HtmxResponseMixin:
 class DashboardView(TemplateView):
     """Main dashboard showing system overview."""
     template_name = "inventory/dashboard.html"
+    # The overview is the same for every user, so it is shared through the cache briefly
+    cache_key = "dashboard:overview:v1"
+    cache_timeout = 30
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(cache.get_or_set(self.cache_key, self._compute_dashboard_context, self.cache_timeout))
+        return context
+
+    def _compute_dashboard_context(self):
+        """Build the dashboard stats; querysets are evaluated so the result can be cached."""
+        context = {}
         
         # Basic stats
         context['total_items'] = Item.objects.count()
         context['total_batches'] = Batch.objects.count()
-        context['total_orders'] = Order.objects.count()
-        context['pending_orders'] = Order.objects.filter(status=Order.STATUS_NEW).count()
-        context['allocated_orders'] = Order.objects.filter(status=Order.STATUS_ALLOCATED).count()
+        order_counts = Order.objects.aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status=Order.STATUS_NEW)),
+            allocated=Count('id', filter=Q(status=Order.STATUS_ALLOCATED)),
+        )
+        context['total_orders'] = order_counts['total']
+        context['pending_orders'] = order_counts['pending']
+        context['allocated_orders'] = order_counts['allocated']
         
         # Recent orders
-        context['recent_orders'] = Order.objects.select_related().all()[:5]
+        context['recent_orders'] = list(
+            Order.objects.order_by("-created_at").only("id", "customer_name", "status", "created_at")[:5]
+        )
         
         # Low stock items
-        context['low_stock_items'] = Item.objects.filter(
+        context['low_stock_items'] = list(Item.objects.filter(
             reorder_threshold__gt=0
         ).annotate(
-            current_qty=Sum('batches__available_qty')
+            current_qty=Coalesce(Sum('batches__available_qty'), Value(Decimal('0')))
         ).filter(
             current_qty__lte=F('reorder_threshold')
-        )[:5]
+        ).only('sku', 'name', 'reorder_threshold')[:5])
         
         # Expiring soon (next 30 days)
-        from datetime import timedelta
-        expiry_threshold = timezone.now().date() + timedelta(days=30)
-        context['expiring_batches'] = Batch.objects.filter(
-            expiry_date__lte=expiry_threshold,
-            expiry_date__gte=timezone.now().date(),
+        today = timezone.now().date()
+        context['expiring_batches'] = list(Batch.objects.filter(
+            expiry_date__lte=today + timedelta(days=30),
+            expiry_date__gte=today,
             status=Batch.STATUS_AVAILABLE
-        ).select_related('item').order_by('expiry_date')[:5]
+        ).select_related('item').order_by('expiry_date')[:5])
         
         return context
 
@@ -100,12 +223,13 @@ class DashboardView(TemplateView):
 # Item Views
 # =============================
 
-class ItemListView(HtmxResponseMixin, ListView):
+class ItemListView(HtmxResponseMixin, KeysetPaginationMixin, ListView):
     model = Item
     template_name = "inventory/item_list.html"
     htmx_template_name = "inventory/partials/item_table.html"
     context_object_name = "items"
     paginate_by = 20
+    keyset_fields = ("sku",)
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -154,12 +278,13 @@ class ItemDeleteView(DeleteView):
 # Batch Views
 # =============================
 
-class BatchListView(HtmxResponseMixin, ListView):
+class BatchListView(HtmxResponseMixin, KeysetPaginationMixin, ListView):
     model = Batch
     template_name = "inventory/batch_list.html"
     htmx_template_name = "inventory/partials/batch_table.html"
     context_object_name = "batches"
     paginate_by = 20
+    keyset_fields = ("item__sku", "lot_no", "pk")
 
     def get_queryset(self):
         qs = super().get_queryset().select_related("item")
@@ -218,6 +343,24 @@ class ReceiveView(TemplateView):
         
         return JsonResponse({"error": "Invalid action"}, status=400)
 
+    @staticmethod
+    def _parse_batch_rows(post):
+        """
+        Group batch_<row>_* fields by row, as (row_index, lot_no, qty_str, expiry_str) in row order.
+        
+        lot_no is stripped here, so the blank, duplicate and existing-lot checks all
+        compare the value that is saved.
+        """
+        rows = defaultdict(dict)
+        for key, value in post.items():
+            match = BATCH_FIELD_RE.match(key)
+            if match:
+                rows[int(match[1])][match[2]] = value
+        return [
+            (row_index, fields.get("lot_no", "").strip(), fields.get("qty", "0"), fields.get("expiry", ""))
+            for row_index, fields in sorted(rows.items())
+        ]
+
     def preview(self, request):
         """Validate batch data and return preview for htmx."""
         item_id = request.POST.get("item_id")
@@ -234,26 +377,27 @@ class ReceiveView(TemplateView):
             })
 
         # Parse batch rows from POST data
+        rows = self._parse_batch_rows(request.POST)
+
+        # Look up every submitted lot at once instead of one EXISTS per row
+        taken = set(
+            Batch.all_objects.filter(item=item, lot_no__in=[row[1] for row in rows])
+            .values_list("lot_no", flat=True)
+        )
+        seen = set()
+
         batches_data = []
         errors = []
-        row_index = 0
-        
-        while True:
-            lot_no = request.POST.get(f"batch_{row_index}_lot_no")
-            if lot_no is None:
-                break
-            
-            qty_str = request.POST.get(f"batch_{row_index}_qty", "0")
-            expiry_str = request.POST.get(f"batch_{row_index}_expiry", "")
-            
+        for row_index, lot_no, qty_str, expiry_str in rows:
             # Validation
             row_errors = []
-            if not lot_no.strip():
+            if not lot_no:
                 row_errors.append(f"Row {row_index + 1}: Lot number is required")
-            else:
-                # Check if lot already exists
-                if Batch.objects.filter(item=item, lot_no=lot_no).exists():
-                    row_errors.append(f"Row {row_index + 1}: Lot '{lot_no}' already exists for this item")
+            elif lot_no in taken:
+                row_errors.append(f"Row {row_index + 1}: Lot '{lot_no}' already exists for this item")
+            elif lot_no in seen:
+                row_errors.append(f"Row {row_index + 1}: Lot '{lot_no}' appears more than once")
+            seen.add(lot_no)
             
             try:
                 qty = Decimal(qty_str)
@@ -271,8 +415,6 @@ class ReceiveView(TemplateView):
                     "qty": qty,
                     "expiry": expiry_str if expiry_str else None,
                 })
-            
-            row_index += 1
 
         if not batches_data and not errors:
             errors.append("At least one batch row is required.")
@@ -298,51 +440,47 @@ class ReceiveView(TemplateView):
             return JsonResponse({"error": "Item not found"}, status=400)
 
         # Parse and validate batch data
-        batches_to_create = []
-        row_index = 0
+        parsed = []
         
-        while True:
-            lot_no = request.POST.get(f"batch_{row_index}_lot_no")
-            if lot_no is None:
-                break
-            
-            qty_str = request.POST.get(f"batch_{row_index}_qty", "0")
-            expiry_str = request.POST.get(f"batch_{row_index}_expiry", "")
-            
-            if not lot_no.strip():
-                row_index += 1
+        for _row_index, lot_no, qty_str, expiry_str in self._parse_batch_rows(request.POST):
+            if not lot_no:
                 continue
             
             try:
                 qty = Decimal(qty_str)
                 if qty <= 0:
-                    row_index += 1
                     continue
             except (ValueError, TypeError):
-                row_index += 1
                 continue
             
-            # Check duplicate
-            if Batch.objects.filter(item=item, lot_no=lot_no).exists():
-                row_index += 1
-                continue
-            
-            batches_to_create.append({
+            parsed.append({
                 "lot_no": lot_no,
                 "qty": qty,
                 "expiry": expiry_str if expiry_str else None,
             })
-            
-            row_index += 1
+
+        # Skip lots that already exist (including soft-deleted ones) with one lookup;
+        # a lot repeated within the request is only created once
+        taken = set(
+            Batch.all_objects.filter(item=item, lot_no__in=[r["lot_no"] for r in parsed])
+            .values_list("lot_no", flat=True)
+        )
+        batches_to_create = []
+        for batch_data in parsed:
+            if batch_data["lot_no"] not in taken:
+                taken.add(batch_data["lot_no"])
+                batches_to_create.append(batch_data)
 
         if not batches_to_create:
             return JsonResponse({"error": "No valid batches to create"}, status=400)
 
-        # Create batches and logs in a transaction
-        created_count = 0
+        # Create batches and logs in a transaction. Each bulk_create is one multi-row
+        # INSERT (... RETURNING ids on PostgreSQL, which the logs need), chunked so a
+        # large submission stays within the backend's parameter limits.
+        user = request.user if request.user.is_authenticated else None
         with transaction.atomic():
-            for batch_data in batches_to_create:
-                batch = Batch.objects.create(
+            batches = Batch.objects.bulk_create([
+                Batch(
                     item=item,
                     lot_no=batch_data["lot_no"],
                     received_qty=batch_data["qty"],
@@ -350,17 +488,25 @@ class ReceiveView(TemplateView):
                     expiry_date=batch_data["expiry"] or None,
                     status=Batch.STATUS_AVAILABLE,
                 )
-                
-                # Create transaction log
-                TransactionLog.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
+                for batch_data in batches_to_create
+            ], batch_size=500)
+            
+            # Create transaction logs
+            TransactionLog.objects.bulk_create([
+                TransactionLog(
+                    user=user,
                     type=TransactionLog.TYPE_RECEIPT,
-                    qty=batch_data["qty"],
+                    qty=batch.received_qty,
                     item=item,
                     batch=batch,
-                    meta={"lot_no": batch_data["lot_no"]},
+                    meta={"lot_no": batch.lot_no},
                 )
-                created_count += 1
+                for batch in batches
+            ], batch_size=500)
+            
+            # undo_receive soft-deletes these rows and redo restores them by id
+            push_undo_operation("receive", {"batch_ids": [batch.pk for batch in batches]})
+        created_count = len(batches)
 
         # Return success response for htmx
         return render(request, "inventory/partials/receive_success.html", {
@@ -373,13 +519,9 @@ class ReceiveView(TemplateView):
 # Order Allocation View
 # =============================
 
-class AllocateOrderView(UserPassesTestMixin, View):
+class AllocateOrderView(StaffRequiredMixin, View):
     """View to trigger allocation for an order (manager-only)."""
 
-    def test_func(self):
-        # Only staff/superusers can allocate
-        return self.request.user.is_staff or self.request.user.is_superuser
-
     def get(self, request, *args, **kwargs):
         """Show allocation confirmation page."""
         order_id = kwargs.get("order_id")
@@ -396,14 +538,12 @@ class AllocateOrderView(UserPassesTestMixin, View):
         
         try:
             result = allocate_order(order_id, user=request.user)
+            push_undo_operation("allocation", allocation_undo_data(order_id))
             
-            # Fetch the order for redirect
-            order = Order.objects.get(pk=order_id)
-            
-            # Add success message
+            # Add success message; the allocation result already carries the order number
             messages.success(
                 request, 
-                f"Successfully allocated stock for order {order.order_no}. "
+                f"Successfully allocated stock for order {result['order_no']}. "
                 f"Allocated {result.get('items_allocated', 0)} items."
             )
             
@@ -427,31 +567,18 @@ class AllocateOrderView(UserPassesTestMixin, View):
 # Deallocate Order View
 # =============================
 
-class DeallocateOrderView(UserPassesTestMixin, View):
+class DeallocateOrderView(StaffRequiredMixin, View):
     """View to deallocate/release stock from an order (manager-only)."""
 
-    def test_func(self):
-        # Only staff/superusers can deallocate
-        return self.request.user.is_staff or self.request.user.is_superuser
-
     def get(self, request, *args, **kwargs):
         """Show deallocation confirmation page."""
         order_id = kwargs.get("order_id")
-        order = get_object_or_404(
-            Order.objects.prefetch_related('items__item', 'items__allocations__batch'), 
-            pk=order_id
-        )
+        order = get_object_or_404(Order, pk=order_id)
         
         # Get all allocations for this order
-        allocations = []
-        for order_item in order.items.all():
-            for allocation in order_item.allocations.all():
-                allocations.append({
-                    'allocation': allocation,
-                    'order_item': order_item,
-                    'item': order_item.item,
-                    'batch': allocation.batch,
-                })
+        allocations = Allocation.objects.filter(order_item__order_id=order_id).select_related(
+            'batch', 'order_item__item'
+        )
         
         context = {
             "order": order,
@@ -462,74 +589,71 @@ class DeallocateOrderView(UserPassesTestMixin, View):
     def post(self, request, *args, **kwargs):
         """Perform deallocation - release stock back to batches."""
         order_id = kwargs.get("order_id")
-        order = get_object_or_404(Order, pk=order_id)
+        order_no = _order_no_or_404(order_id)
         
         try:
             with transaction.atomic():
-                total_deallocated = 0
-                allocation_count = 0
-                
                 # Get all allocations for this order
-                for order_item in order.items.select_for_update().all():
-                    for allocation in order_item.allocations.select_for_update().all():
-                        # Release stock back to batch
-                        batch = allocation.batch
-                        batch.available_qty += allocation.qty_allocated
-                        batch.save()
-                        
-                        # Log the deallocation
-                        TransactionLog.objects.create(
-                            batch=batch,
-                            item=order_item.item,
-                            order=order,
-                            type=TransactionLog.TYPE_DEALLOCATE,
-                            qty=allocation.qty_allocated,
-                            user=request.user,
-                            meta={
-                                "reason": "manual_deallocation",
-                                "allocation_id": allocation.id,
-                                "order_no": order.order_no,
-                            }
-                        )
-                        
-                        total_deallocated += allocation.qty_allocated
-                        allocation_count += 1
-                        
-                        # Delete the allocation
-                        allocation.delete()
-                    
-                    # Reset order item allocated quantity
-                    order_item.qty_allocated = Decimal("0")
-                    order_item.save()
+                allocations = list(
+                    Allocation.objects.select_for_update(of=("self",))
+                    .filter(order_item__order_id=order_id)
+                    .select_related("order_item__item")
+                )
                 
-                # Reset order status to NEW
-                order.status = Order.STATUS_NEW
-                order.save()
+                # Total released per batch, and a log entry per allocation
+                deltas = defaultdict(Decimal)
+                logs = []
+                for allocation in allocations:
+                    deltas[allocation.batch_id] += allocation.qty_allocated
+                    logs.append(TransactionLog(
+                        batch_id=allocation.batch_id,
+                        item=allocation.order_item.item,
+                        order_id=order_id,
+                        type=TransactionLog.TYPE_DEALLOCATE,
+                        qty=allocation.qty_allocated,
+                        user=request.user,
+                        meta={
+                            "reason": "manual_deallocation",
+                            "allocation_id": allocation.id,
+                            "order_no": order_no,
+                        }
+                    ))
+                
+                # Release stock back to batches
+                batches = list(Batch.all_objects.select_for_update().filter(pk__in=deltas))
+                for batch in batches:
+                    batch.available_qty += deltas[batch.pk]
+                Batch.all_objects.bulk_update(batches, ["available_qty"])
+                
+                TransactionLog.objects.bulk_create(logs)
+                Allocation.objects.filter(pk__in=[a.pk for a in allocations]).delete()
+                
+                # Reset allocated quantities and order status to NEW
+                OrderItem.objects.filter(order_id=order_id).update(qty_allocated=Decimal("0"))
+                Order.objects.filter(pk=order_id).update(status=Order.STATUS_NEW)
+                
+                total_deallocated = sum(deltas.values(), Decimal("0"))
+                allocation_count = len(allocations)
                 
                 # Create notification
                 notify(
-                    title=f"Order {order.order_no} deallocated",
-                    message=f"Released {total_deallocated} items from {allocation_count} allocations back to inventory.",
-                    level=Notification.LEVEL_INFO,
                     user=request.user,
+                    message=f"Order {order_no} deallocated: released {total_deallocated} items from {allocation_count} allocations back to inventory.",
+                    level="info",
                 )
                 
                 # Add success message
-                from django.contrib import messages
                 messages.success(
                     request, 
-                    f"Successfully deallocated order {order.order_no}. "
+                    f"Successfully deallocated order {order_no}. "
                     f"Released {total_deallocated} items from {allocation_count} allocations back to inventory."
                 )
                 
                 # Redirect to order detail page
-                from django.shortcuts import redirect
                 return redirect('inventory:order-detail', pk=order_id)
                 
         except Exception as e:
-            from django.contrib import messages
             messages.error(request, f"Deallocation failed: {str(e)}")
-            from django.shortcuts import redirect
             return redirect('inventory:order-detail', pk=order_id)
 
 
@@ -546,10 +670,21 @@ class PickView(UserPassesTestMixin, View):
     def get(self, request, *args, **kwargs):
         """Display pick list for an order."""
         order_id = kwargs.get("order_id")
+        # Load only the columns the pick list shows
         order = get_object_or_404(
-            Order.objects.prefetch_related(
-                "items__allocations__batch__item",
-                "items__item"
+            Order.objects.only("id", "order_no", "customer_name", "status").prefetch_related(
+                Prefetch(
+                    "items",
+                    queryset=OrderItem.objects.only(
+                        "id", "order_id", "item__sku", "item__name", "item__unit"
+                    ).select_related("item"),
+                ),
+                Prefetch(
+                    "items__allocations",
+                    queryset=Allocation.objects.only(
+                        "id", "order_item_id", "qty_allocated", "batch__lot_no"
+                    ).select_related("batch"),
+                ),
             ),
             pk=order_id
         )
@@ -574,58 +709,67 @@ class PickView(UserPassesTestMixin, View):
     def post(self, request, *args, **kwargs):
         """Process picked quantities."""
         order_id = kwargs.get("order_id")
-        order = get_object_or_404(Order, pk=order_id)
+        order_no = _order_no_or_404(order_id)
         
         try:
             with transaction.atomic():
                 pick_results = []
+                logs = []
+                
+                # Picked quantity per allocation id, then lock all those allocations at once
+                posted = {
+                    int(key.split("_")[-1]): Decimal(value)
+                    for key, value in request.POST.items()
+                    if key.startswith("qty_picked_")
+                }
+                allocations = Allocation.objects.select_for_update(of=("self",)).select_related(
+                    "batch", "order_item__item", "order_item__order"
+                ).in_bulk(list(posted))
                 
                 # Process each allocation's picked quantity
-                for key, value in request.POST.items():
-                    if key.startswith("qty_picked_"):
-                        allocation_id = int(key.split("_")[-1])
-                        qty_picked = Decimal(value)
-                        
-                        allocation = Allocation.objects.select_for_update().get(pk=allocation_id)
-                        
-                        # Update allocation with picked quantity
-                        if qty_picked != allocation.qty_allocated:
-                            # Log discrepancy
-                            TransactionLog.objects.create(
-                                batch=allocation.batch,
-                                item=allocation.order_item.item,
-                                order=allocation.order_item.order,
-                                qty=-qty_picked,
-                                type=TransactionLog.TYPE_ADJUST,
-                                user=request.user,
-                                meta={
-                                    "reason": "pick_adjust",
-                                    "order_item_id": allocation.order_item.id,
-                                    "allocated": str(allocation.qty_allocated),
-                                    "picked": str(qty_picked),
-                                },
-                            )
-                        
-                        pick_results.append({
-                            "allocation": allocation,
-                            "qty_picked": qty_picked,
-                            "qty_allocated": allocation.qty_allocated,
-                            "item_sku": allocation.order_item.item.sku,
-                        })
+                for allocation_id, qty_picked in posted.items():
+                    allocation = allocations.get(allocation_id)
+                    if allocation is None:
+                        raise Allocation.DoesNotExist(f"Allocation {allocation_id} not found")
+                    
+                    # Update allocation with picked quantity
+                    if qty_picked != allocation.qty_allocated:
+                        # Log discrepancy
+                        logs.append(TransactionLog(
+                            batch=allocation.batch,
+                            item=allocation.order_item.item,
+                            order=allocation.order_item.order,
+                            qty=-qty_picked,
+                            type=TransactionLog.TYPE_ADJUST,
+                            user=request.user,
+                            meta={
+                                "reason": "pick_adjust",
+                                "order_item_id": allocation.order_item.id,
+                                "allocated": str(allocation.qty_allocated),
+                                "picked": str(qty_picked),
+                            },
+                        ))
+                    
+                    pick_results.append({
+                        "allocation": allocation,
+                        "qty_picked": qty_picked,
+                        "qty_allocated": allocation.qty_allocated,
+                        "item_sku": allocation.order_item.item.sku,
+                    })
+                
+                if logs:
+                    TransactionLog.objects.bulk_create(logs, batch_size=500)
                 
                 # Update order status to PICKED
-                order.status = Order.STATUS_PICKED
-                order.save()
+                Order.objects.filter(pk=order_id).update(status=Order.STATUS_PICKED)
                 
                 # Add success message
-                from django.contrib import messages
                 messages.success(
                     request, 
-                    f"Successfully picked order {order.order_no}. Ready for packing."
+                    f"Successfully picked order {order_no}. Ready for packing."
                 )
                 
                 # Redirect to order detail or pack view
-                from django.shortcuts import redirect
                 return redirect('inventory:order-detail', pk=order_id)
                 
         except Exception as e:
@@ -645,28 +789,27 @@ class PackView(UserPassesTestMixin, View):
     
     def test_func(self):
         return self.request.user.is_authenticated
+
+    @staticmethod
+    def _with_total_allocated(order_items):
+        """Annotate order items with total_allocated, the sum of their allocations (0 if none)."""
+        return order_items.annotate(
+            total_allocated=Coalesce(Sum("allocations__qty_allocated"), Value(Decimal("0")))
+        )
     
     def get(self, request, *args, **kwargs):
         """Display pack confirmation form."""
         order_id = kwargs.get("order_id")
-        order = get_object_or_404(
-            Order.objects.prefetch_related(
-                "items__allocations__batch",
-                "items__item"
-            ),
-            pk=order_id
-        )
+        order = get_object_or_404(Order, pk=order_id)
         
-        # Calculate total picked/allocated per order item
-        pack_items = []
-        for order_item in order.items.all():
-            total_allocated = sum(
-                a.qty_allocated for a in order_item.allocations.all()
-            )
-            pack_items.append({
+        # Total allocated per order item, summed in the database
+        pack_items = [
+            {
                 "order_item": order_item,
-                "total_allocated": total_allocated,
-            })
+                "total_allocated": order_item.total_allocated,
+            }
+            for order_item in self._with_total_allocated(order.items.select_related("item"))
+        ]
         
         context = {
             "order": order,
@@ -677,66 +820,76 @@ class PackView(UserPassesTestMixin, View):
     def post(self, request, *args, **kwargs):
         """Process packed quantities."""
         order_id = kwargs.get("order_id")
-        order = get_object_or_404(Order, pk=order_id)
+        order_no = _order_no_or_404(order_id)
         
         try:
             with transaction.atomic():
                 pack_results = []
+                logs = []
+                
+                # Packed quantity per order item id, then lock all those order items at once.
+                # PostgreSQL refuses FOR UPDATE alongside GROUP BY, so the allocation totals
+                # come from a separate aggregate query over the same ids.
+                posted = {
+                    int(key.split("_")[-1]): Decimal(value)
+                    for key, value in request.POST.items()
+                    if key.startswith("qty_packed_")
+                }
+                order_items = OrderItem.objects.select_for_update(of=("self",)).select_related(
+                    "item", "order"
+                ).in_bulk(list(posted))
+                allocated_totals = dict(
+                    self._with_total_allocated(OrderItem.objects.filter(pk__in=list(posted)))
+                    .values_list("pk", "total_allocated")
+                )
                 
                 # Process each order item's packed quantity
-                for key, value in request.POST.items():
-                    if key.startswith("qty_packed_"):
-                        order_item_id = int(key.split("_")[-1])
-                        qty_packed = Decimal(value)
-                        
-                        order_item = OrderItem.objects.select_for_update().get(pk=order_item_id)
-                        total_allocated = sum(
-                            a.qty_allocated for a in order_item.allocations.all()
-                        )
-                        
-                        # Update order item with packed quantity
-                        order_item.qty_picked = qty_packed
-                        order_item.save()
-                        
-                        if qty_packed != total_allocated:
-                            # Log packing adjustment
-                            notes_key = f"notes_{order_item_id}"
-                            notes = request.POST.get(notes_key, "Packing adjustment")
-                            
-                            TransactionLog.objects.create(
-                                item=order_item.item,
-                                order=order_item.order,
-                                qty=-qty_packed,
-                                type=TransactionLog.TYPE_ADJUST,
-                                user=request.user,
-                                meta={
-                                    "reason": "pack_adjust",
-                                    "order_item_id": order_item_id,
-                                    "allocated": str(total_allocated),
-                                    "packed": str(qty_packed),
-                                    "notes": notes,
-                                },
-                            )
+                for order_item_id, qty_packed in posted.items():
+                    order_item = order_items.get(order_item_id)
+                    if order_item is None:
+                        raise OrderItem.DoesNotExist(f"Order item {order_item_id} not found")
+                    total_allocated = allocated_totals.get(order_item_id, Decimal("0"))
+                    
+                    # OrderItem has no packed-quantity column; a mismatch is recorded in the log
+                    if qty_packed != total_allocated:
+                        # Log packing adjustment
+                        notes_key = f"notes_{order_item_id}"
+                        notes = request.POST.get(notes_key, "Packing adjustment")
                         
-                        pack_results.append({
-                            "order_item": order_item,
-                            "qty_packed": qty_packed,
-                            "total_allocated": total_allocated,
-                        })
+                        logs.append(TransactionLog(
+                            item=order_item.item,
+                            order=order_item.order,
+                            qty=-qty_packed,
+                            type=TransactionLog.TYPE_ADJUST,
+                            user=request.user,
+                            meta={
+                                "reason": "pack_adjust",
+                                "order_item_id": order_item_id,
+                                "allocated": str(total_allocated),
+                                "packed": str(qty_packed),
+                                "notes": notes,
+                            },
+                        ))
+                    
+                    pack_results.append({
+                        "order_item": order_item,
+                        "qty_packed": qty_packed,
+                        "total_allocated": total_allocated,
+                    })
+
+                if logs:
+                    TransactionLog.objects.bulk_create(logs, batch_size=500)
 
                 # Update order status to PACKED after packing
-                order.status = Order.STATUS_PACKED
-                order.save(update_fields=["status"])
+                Order.objects.filter(pk=order_id).update(status=Order.STATUS_PACKED)
                 
                 # Add success message
-                from django.contrib import messages
                 messages.success(
                     request, 
-                    f"Successfully packed order {order.order_no}. Ready for shipment."
+                    f"Successfully packed order {order_no}. Ready for shipment."
                 )
                 
                 # Redirect to order detail to show ship button
-                from django.shortcuts import redirect
                 return redirect('inventory:order-detail', pk=order_id)
                 
         except Exception as e:
@@ -751,12 +904,9 @@ class PackView(UserPassesTestMixin, View):
 # Ship View
 # =============================
 
-class ShipView(UserPassesTestMixin, View):
+class ShipView(StaffRequiredMixin, View):
     """View for creating shipment and finalizing order."""
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-    
     def get(self, request, *args, **kwargs):
         """Display shipment form."""
         order_id = kwargs.get("order_id")
@@ -770,9 +920,7 @@ class ShipView(UserPassesTestMixin, View):
         
         # Check if order is ready to ship (must be allocated, picked, or packed)
         if order.status not in [Order.STATUS_ALLOCATED, Order.STATUS_PICKED, Order.STATUS_PACKED]:
-            from django.contrib import messages
             messages.warning(request, f"Order must be allocated, picked, or packed before shipping. Current status: {order.get_status_display()}")
-            from django.shortcuts import redirect
             return redirect('inventory:order-detail', pk=order_id)
         
         context = {
@@ -783,7 +931,13 @@ class ShipView(UserPassesTestMixin, View):
     def post(self, request, *args, **kwargs):
         """Create shipment and finalize order."""
         order_id = kwargs.get("order_id")
-        order = get_object_or_404(Order, pk=order_id)
+        order = get_object_or_404(
+            Order.objects.prefetch_related(
+                Prefetch("items", queryset=OrderItem.objects.select_related("item")),
+                Prefetch("items__allocations", queryset=Allocation.objects.select_related("batch")),
+            ),
+            pk=order_id
+        )
         
         try:
             with transaction.atomic():
@@ -810,33 +964,60 @@ class ShipView(UserPassesTestMixin, View):
                 # Finalize consumption: Log shipment transactions and clean up allocations
                 # Note: Batch quantities were already reduced during allocation,
                 # so we don't reduce them again here. We just log the shipment and delete allocations.
+                ship_meta = {
+                    "carrier": carrier or "unknown",
+                    "tracking_no": str(tracking_no),
+                    "notes": notes,
+                }
+                logs = []
+                watched_items = {}
                 for order_item in order.items.all():
+                    item = order_item.item
                     for allocation in order_item.allocations.all():
                         # Log consumption transaction (quantity already deducted during allocation)
-                        TransactionLog.objects.create(
+                        logs.append(TransactionLog(
                             batch=allocation.batch,
-                            item=order_item.item,
+                            item=item,
                             order=order,
                             shipment=shipment,
                             qty=-allocation.qty_allocated,
                             type=TransactionLog.TYPE_SHIP,
                             user=request.user,
-                            meta={
-                                "order_item_id": order_item.id,
-                                "carrier": carrier or "unknown",
-                                "tracking_no": str(tracking_no),
-                                "notes": notes,
-                            },
+                            meta={"order_item_id": order_item.id, **ship_meta},
+                        ))
+                        if item.reorder_threshold:
+                            watched_items[item.pk] = item
+                
+                if logs:
+                    TransactionLog.objects.bulk_create(logs, batch_size=500)
+                
+                # Check for low stock: one aggregate over the shipped items that have a
+                # reorder threshold, counting non-expired batches like Item.total_quantity().
+                # The alerts are emails, so they are queued once the transaction has committed.
+                today = timezone.now().date()
+                stock_totals = {}
+                if watched_items:
+                    stock_totals = dict(
+                        Batch.objects.filter(item_id__in=list(watched_items))
+                        .filter(Q(expiry_date__isnull=True) | Q(expiry_date__gt=today))
+                        .order_by()
+                        .values("item_id")
+                        .annotate(total=Sum("available_qty"))
+                        .values_list("item_id", "total")
+                    )
+                for item_id, item in watched_items.items():
+                    total_qty = stock_totals.get(item_id) or Decimal("0")
+                    if total_qty <= item.reorder_threshold:
+                        transaction.on_commit(
+                            partial(async_task, "inventory.tasks.low_stock_alert", item_id, total_qty)
                         )
-                        
-                        # Check for low stock
-                        item = order_item.item
-                        total_qty = item.total_quantity()
-                        if item.reorder_threshold and total_qty <= item.reorder_threshold:
-                            send_low_stock_alert(item, total_qty)
                 
-                # Delete allocations after shipping (stock already deducted during allocation)
-                Allocation.objects.filter(order_item__order=order).delete()
+                # Delete allocations after shipping (stock already deducted during allocation).
+                # Nothing references Allocation and no delete signals are connected, so this
+                # is a single DELETE keyed on the prefetched order item ids; no rows are loaded.
+                Allocation.objects.filter(
+                    order_item_id__in=[order_item.pk for order_item in order.items.all()]
+                ).delete()
                 
                 # Update order status to SHIPPED
                 order.status = Order.STATUS_SHIPPED
@@ -849,31 +1030,29 @@ class ShipView(UserPassesTestMixin, View):
                     level=Notification.LEVEL_INFO,
                 )
                 
-                # Send email notification
-                send_shipment_notification(shipment)
-                
-                # Trigger webhook
-                webhook_shipment_created(shipment)
+                # Email and webhooks run in the task cluster after commit, so a slow
+                # SMTP server or webhook target doesn't hold this transaction open
+                transaction.on_commit(
+                    partial(async_task, "inventory.tasks.notify_shipment_created", shipment.pk)
+                )
                 
                 # If all items fulfilled, trigger order fulfilled webhook
                 if order.status == Order.STATUS_SHIPPED:
-                    webhook_order_fulfilled(order)
+                    transaction.on_commit(
+                        partial(async_task, "inventory.tasks.notify_order_fulfilled", order.pk)
+                    )
                 
                 # Add success message
-                from django.contrib import messages
                 messages.success(
                     request, 
                     f"Order {order.order_no} successfully shipped! Tracking: {tracking_no}"
                 )
                 
                 # Redirect to order detail
-                from django.shortcuts import redirect
                 return redirect('inventory:order-detail', pk=order_id)
                 
         except Exception as e:
-            from django.contrib import messages
             messages.error(request, f"Shipping failed: {str(e)}")
-            from django.shortcuts import redirect
             return redirect('inventory:order-ship', order_id=order_id)
 
 
@@ -881,12 +1060,9 @@ class ShipView(UserPassesTestMixin, View):
 # Deliver View
 # =============================
 
-class DeliverView(UserPassesTestMixin, View):
+class DeliverView(StaffRequiredMixin, View):
     """View for marking an order as delivered."""
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-    
     def get(self, request, *args, **kwargs):
         """Display delivery confirmation form."""
         order_id = kwargs.get("order_id")
@@ -894,13 +1070,13 @@ class DeliverView(UserPassesTestMixin, View):
         
         # Check if order is shipped
         if order.status != Order.STATUS_SHIPPED:
-            from django.contrib import messages
             messages.warning(request, "Order must be shipped before marking as delivered.")
-            from django.shortcuts import redirect
             return redirect('inventory:order-detail', pk=order_id)
         
         # Get shipment details
-        shipment = order.shipments.first()
+        shipment = order.shipments.only(
+            "id", "order_id", "tracking_no", "carrier", "shipping_address", "shipped_at"
+        ).first()
         
         context = {
             "order": order,
@@ -911,20 +1087,18 @@ class DeliverView(UserPassesTestMixin, View):
     def post(self, request, *args, **kwargs):
         """Mark order as delivered."""
         order_id = kwargs.get("order_id")
-        order = get_object_or_404(Order, pk=order_id)
+        order = get_object_or_404(Order.objects.only("id", "order_no", "customer_name"), pk=order_id)
         
         try:
             with transaction.atomic():
                 # Update order status to DELIVERED
-                order.status = Order.STATUS_DELIVERED
-                order.save()
+                Order.objects.filter(pk=order.pk).update(status=Order.STATUS_DELIVERED)
                 
-                # Update shipment status if exists
-                shipment = order.shipments.first()
-                if shipment:
-                    shipment.status = Shipment.STATUS_DELIVERED
-                    shipment.delivered_at = timezone.now()
-                    shipment.save()
+                # Update the latest shipment, if any, without loading it
+                Shipment.objects.filter(pk__in=order.shipments.values("pk")[:1]).update(
+                    status=Shipment.STATUS_DELIVERED,
+                    delivered_at=timezone.now(),
+                )
                 
                 # Create notification
                 Notification.objects.create(
@@ -934,20 +1108,16 @@ class DeliverView(UserPassesTestMixin, View):
                 )
                 
                 # Add success message
-                from django.contrib import messages
                 messages.success(
                     request, 
                     f"Order {order.order_no} marked as delivered!"
                 )
                 
                 # Redirect to order detail
-                from django.shortcuts import redirect
                 return redirect('inventory:order-detail', pk=order_id)
                 
         except Exception as e:
-            from django.contrib import messages
             messages.error(request, f"Failed to mark as delivered: {str(e)}")
-            from django.shortcuts import redirect
             return redirect('inventory:order-deliver', order_id=order_id)
 
 
@@ -965,7 +1135,7 @@ class CreateReturnView(LoginRequiredMixin, CreateView):
     
     def form_valid(self, form):
         # Generate unique return number
-        return_no = f"RMA-{uuid.uuid4().hex[:8].upper()}"
+        return_no = f"RMA-{_short_code()}"
         form.instance.return_no = return_no
         return super().form_valid(form)
 
@@ -979,7 +1149,11 @@ class ReturnListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        qs = super().get_queryset().select_related("order_item__item", "order_item__order")
+        # Only the columns the list renders; notes stay on the detail page
+        qs = super().get_queryset().select_related("order_item__item", "order_item__order").only(
+            "return_no", "qty_returned", "reason", "status", "created_at",
+            "order_item__item__sku", "order_item__item__unit", "order_item__order__order_no",
+        )
         status = self.request.GET.get("status", "")
         if status:
             qs = qs.filter(status=status)
@@ -1000,11 +1174,93 @@ class ReturnDetailView(LoginRequiredMixin, DetailView):
         )
 
 
-class ProcessReturnView(UserPassesTestMixin, View):
+class ProcessReturnView(StaffRequiredMixin, View):
     """View for processing a return with disposition options."""
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
+    @staticmethod
+    def _return_log(return_obj, reason, notes, **fields):
+        """Unsaved TransactionLog for a return disposition."""
+        order_item = return_obj.order_item
+        return TransactionLog(
+            item=order_item.item,
+            order=order_item.order,
+            meta={
+                "reason": reason,
+                "return_no": return_obj.return_no,
+                "order_item_id": order_item.id,
+                "notes": notes,
+            },
+            **fields,
+        )
+    
+    def _restock_original(self, return_obj, qty_accepted, notes, user):
+        """Put the accepted quantity back on the first batch the line was allocated from."""
+        allocation = return_obj.order_item.allocations.first()
+        if allocation is None:
+            raise ValueError("No original allocations found for restock.")
+        
+        # A single UPDATE ... SET available_qty = available_qty + n locks just this row
+        # for the rest of the transaction; no SELECT ... FOR UPDATE or read-back needed
+        restocked = Batch.objects.filter(pk=allocation.batch_id).update(
+            available_qty=F("available_qty") + qty_accepted
+        )
+        if not restocked:
+            raise Batch.DoesNotExist("Batch matching query does not exist.")
+        
+        log = self._return_log(
+            return_obj, "return_restock", notes,
+            batch_id=allocation.batch_id, qty=qty_accepted, type=TransactionLog.TYPE_ADJUST, user=user,
+        )
+        return Return.STATUS_RESTOCKED, log
+    
+    def _restock_new(self, return_obj, qty_accepted, notes, user):
+        """Create new return batch with special lot number."""
+        batch = Batch.objects.create(
+            item=return_obj.order_item.item,
+            lot_no=f"RETURN-{_short_code()}",
+            received_qty=qty_accepted,
+            available_qty=qty_accepted,
+            status=Batch.STATUS_AVAILABLE,
+        )
+        
+        log = self._return_log(
+            return_obj, "return_new_batch", notes,
+            batch=batch, qty=qty_accepted, type=TransactionLog.TYPE_RECEIPT, user=user,
+        )
+        return Return.STATUS_RESTOCKED, log
+    
+    def _quarantine(self, return_obj, qty_accepted, notes, user):
+        """Create quarantine batch."""
+        batch = Batch.objects.create(
+            item=return_obj.order_item.item,
+            lot_no=f"QUARANTINE-{_short_code()}",
+            received_qty=qty_accepted,
+            available_qty=Decimal("0"),  # Not available for allocation
+            status=Batch.STATUS_HOLD,  # Batch has no quarantine status; hold keeps it out of allocation
+        )
+        
+        log = self._return_log(
+            return_obj, "return_quarantine", notes,
+            batch=batch, qty=qty_accepted, type=TransactionLog.TYPE_RECEIPT, user=user,
+        )
+        return Return.STATUS_QUARANTINED, log
+    
+    def _scrap(self, return_obj, qty_accepted, notes, user):
+        """Just mark as scrapped, no inventory adjustment."""
+        log = self._return_log(
+            return_obj, "return_scrap", notes,
+            qty=-qty_accepted, type=TransactionLog.TYPE_ADJUST, user=user,
+        )
+        return Return.STATUS_SCRAPPED, log
+    
+    # Disposition -> handler(self, return_obj, qty_accepted, notes, user) returning
+    # the new return status and the unsaved log entry
+    disposition_handlers = {
+        ReturnProcessForm.DISPOSITION_RESTOCK_ORIGINAL: _restock_original,
+        ReturnProcessForm.DISPOSITION_RESTOCK_NEW: _restock_new,
+        ReturnProcessForm.DISPOSITION_QUARANTINE: _quarantine,
+        ReturnProcessForm.DISPOSITION_SCRAP: _scrap,
+    }
     
     def get(self, request, *args, **kwargs):
         """Display return processing form."""
@@ -1028,7 +1284,10 @@ class ProcessReturnView(UserPassesTestMixin, View):
     def post(self, request, *args, **kwargs):
         """Process return based on disposition."""
         return_id = kwargs.get("return_id")
-        return_obj = get_object_or_404(Return, pk=return_id)
+        return_obj = get_object_or_404(
+            Return.objects.select_related("order_item__item", "order_item__order"),
+            pk=return_id
+        )
         
         form = ReturnProcessForm(request.POST)
         
@@ -1043,126 +1302,26 @@ class ProcessReturnView(UserPassesTestMixin, View):
         qty_accepted = form.cleaned_data["qty_accepted"]
         notes = form.cleaned_data.get("notes", "")
         
+        handler = self.disposition_handlers[disposition]
+        
         try:
             with transaction.atomic():
-                order_item = return_obj.order_item
-                item = order_item.item
-                
-                # Find original allocations to determine source batches
-                original_allocations = order_item.allocations.all()
-                
-                if disposition == ReturnProcessForm.DISPOSITION_RESTOCK_ORIGINAL:
-                    # Restock to original batch(es)
-                    if original_allocations.exists():
-                        # Restock proportionally to original allocations
-                        allocation = original_allocations.first()
-                        batch = Batch.objects.select_for_update().get(pk=allocation.batch.pk)
-                        batch.available_qty += qty_accepted
-                        batch.save()
-                        
-                        # Log transaction
-                        TransactionLog.objects.create(
-                            batch=batch,
-                            item=item,
-                            order=order_item.order,
-                            qty=qty_accepted,
-                            type=TransactionLog.TYPE_ADJUST,
-                            user=request.user,
-                            meta={
-                                "reason": "return_restock",
-                                "return_no": return_obj.return_no,
-                                "order_item_id": order_item.id,
-                                "notes": notes,
-                            },
-                        )
-                        
-                        return_obj.status = Return.STATUS_RESTOCKED
-                    else:
-                        raise ValueError("No original allocations found for restock.")
-                
-                elif disposition == ReturnProcessForm.DISPOSITION_RESTOCK_NEW:
-                    # Create new return batch with special lot number
-                    return_lot_no = f"RETURN-{uuid.uuid4().hex[:8].upper()}"
-                    
-                    batch = Batch.objects.create(
-                        item=item,
-                        lot_no=return_lot_no,
-                        received_qty=qty_accepted,
-                        available_qty=qty_accepted,
-                        status=Batch.STATUS_AVAILABLE,
-                    )
-                    
-                    # Log transaction
-                    TransactionLog.objects.create(
-                        batch=batch,
-                        item=item,
-                        order=order_item.order,
-                        qty=qty_accepted,
-                        type=TransactionLog.TYPE_RECEIPT,
-                        user=request.user,
-                        meta={
-                            "reason": "return_new_batch",
-                            "return_no": return_obj.return_no,
-                            "order_item_id": order_item.id,
-                            "notes": notes,
-                        },
-                    )
-                    
-                    return_obj.status = Return.STATUS_RESTOCKED
-                
-                elif disposition == ReturnProcessForm.DISPOSITION_QUARANTINE:
-                    # Create quarantine batch
-                    quarantine_lot_no = f"QUARANTINE-{uuid.uuid4().hex[:8].upper()}"
-                    
-                    batch = Batch.objects.create(
-                        item=item,
-                        lot_no=quarantine_lot_no,
-                        received_qty=qty_accepted,
-                        available_qty=Decimal("0"),  # Not available for allocation
-                        status=Batch.STATUS_QUARANTINE,
-                    )
-                    
-                    # Log transaction
-                    TransactionLog.objects.create(
-                        batch=batch,
-                        item=item,
-                        order=order_item.order,
-                        qty=qty_accepted,
-                        type=TransactionLog.TYPE_RECEIPT,
-                        user=request.user,
-                        meta={
-                            "reason": "return_quarantine",
-                            "return_no": return_obj.return_no,
-                            "order_item_id": order_item.id,
-                            "notes": notes,
-                        },
-                    )
-                    
-                    return_obj.status = Return.STATUS_QUARANTINED
-                
-                elif disposition == ReturnProcessForm.DISPOSITION_SCRAP:
-                    # Just mark as scrapped, no inventory adjustment
-                    TransactionLog.objects.create(
-                        item=item,
-                        order=order_item.order,
-                        qty=-qty_accepted,
-                        type=TransactionLog.TYPE_ADJUST,
-                        user=request.user,
-                        meta={
-                            "reason": "return_scrap",
-                            "return_no": return_obj.return_no,
-                            "order_item_id": order_item.id,
-                            "notes": notes,
-                        },
-                        notes=f"Return {return_obj.return_no} scrapped. {notes}",
-                    )
-                    
-                    return_obj.status = Return.STATUS_SCRAPPED
+                return_obj.status, log = handler(self, return_obj, qty_accepted, notes, request.user)
+                log.save()
                 
-                # Update return record
+                # Update return record; the processing note is appended in the database,
+                # so the existing notes text is not read back and rewritten
                 return_obj.processed_at = timezone.now()
-                return_obj.notes += f"\n[Processed] {notes}" if return_obj.notes else f"[Processed] {notes}"
-                return_obj.save()
+                processed_note = f"[Processed] {notes}"
+                Return.objects.filter(pk=return_obj.pk).update(
+                    status=return_obj.status,
+                    processed_at=return_obj.processed_at,
+                    notes=Case(
+                        When(notes="", then=Value(processed_note)),
+                        default=Concat(F("notes"), Value(f"\n{processed_note}"), output_field=TextField()),
+                        output_field=TextField(),
+                    ),
+                )
                 
                 context = {
                     "return_obj": return_obj,
@@ -1184,12 +1343,9 @@ class ProcessReturnView(UserPassesTestMixin, View):
 # Undo/Redo Views
 # =============================
 
-class UndoView(UserPassesTestMixin, View):
+class UndoView(StaffRequiredMixin, View):
     """View to undo last N operations (manager-only)."""
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-    
     def post(self, request, *args, **kwargs):
         """Perform undo operation."""
         count = int(request.POST.get("count", 1))
@@ -1212,12 +1368,9 @@ class UndoView(UserPassesTestMixin, View):
             return render(request, "inventory/partials/undo_result.html", context)
 
 
-class RedoView(UserPassesTestMixin, View):
+class RedoView(StaffRequiredMixin, View):
     """View to redo last N operations (manager-only)."""
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-    
     def post(self, request, *args, **kwargs):
         """Perform redo operation."""
         count = int(request.POST.get("count", 1))
@@ -1240,22 +1393,17 @@ class RedoView(UserPassesTestMixin, View):
             return render(request, "inventory/partials/redo_result.html", context)
 
 
-class UndoRedoHistoryView(UserPassesTestMixin, TemplateView):
+class UndoRedoHistoryView(StaffRequiredMixin, TemplateView):
     """View to display undo/redo stack history (manager-only)."""
     
     template_name = "inventory/undo_redo_history.html"
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        from .models import UndoStack, RedoStack
-        
         # Get recent undo/redo operations
-        context["undo_stack"] = UndoStack.objects.all()[:10]
-        context["redo_stack"] = RedoStack.objects.all()[:10]
+        context["undo_stack"] = UndoStack.objects.values("id", "op_name", "created_at")[:10]
+        context["redo_stack"] = RedoStack.objects.values("id", "op_name", "created_at")[:10]
         
         return context
 
@@ -1269,12 +1417,11 @@ class UnreadNotificationsView(LoginRequiredMixin, View):
     
     def get(self, request, *args, **kwargs):
         """Return unread count and notification list."""
-        unread_count = get_unread_count(request.user)
-        recent_notifications = get_recent_notifications(request.user, limit=5)
+        summary = get_notification_summary(request.user, limit=5)
         
         context = {
-            "unread_count": unread_count,
-            "notifications": recent_notifications,
+            "unread_count": summary["unread_count"],
+            "notifications": summary["notifications"],
         }
         
         return render(request, "inventory/partials/notifications_dropdown.html", context)
@@ -1309,15 +1456,26 @@ class MarkAllNotificationsReadView(LoginRequiredMixin, View):
 class WebhookReceiverView(View):
     """Endpoint for receiving external webhook events."""
     
+    # Webhook events are small JSON documents; anything larger is refused unread
+    max_body_bytes = 1024 * 1024
+    
     def post(self, request, *args, **kwargs):
         """Process incoming webhook."""
+        # Check the declared size before the signature check reads the body
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return JsonResponse({"error": "Invalid Content-Length"}, status=400)
+        if content_length > self.max_body_bytes:
+            return JsonResponse({"error": "Payload too large"}, status=413)
+        
         # Validate signature
         if not validate_webhook_signature(request):
             logger.warning("Invalid webhook signature received")
             return JsonResponse({"error": "Invalid signature"}, status=401)
         
         try:
-            # Parse payload
+            # Parse payload (json accepts the raw bytes, no decode step needed)
             payload = json.loads(request.body)
             event_type = payload.get("event_type")
             data = payload.get("data", {})
@@ -1340,23 +1498,26 @@ class WebhookReceiverView(View):
             logger.error(f"Webhook processing error: {e}")
             return JsonResponse({"error": str(e)}, status=500)
     
+    @staticmethod
+    def _recipients(users):
+        """Users to notify, with just the columns notify_multiple() reads."""
+        return users.only("id", "username", "email", "first_name", "last_name")
+    
     def _handle_external_order(self, data):
         """Handle external order creation webhook."""
         order_no = data.get("order_no")
         customer = data.get("customer")
         
         # Create notification for managers
-        from django.contrib.auth import get_user_model
         User = get_user_model()
         
-        managers = User.objects.filter(is_staff=True)
-        for manager in managers:
-            notify(
-                user=manager,
-                message=f"External order received: {order_no} from {customer}",
-                level="info",
-                notification_type="order"
-            )
+        managers = self._recipients(User.objects.filter(is_staff=True))
+        notify_multiple(
+            managers,
+            message=f"External order received: {order_no} from {customer}",
+            level="info",
+            notification_type="order"
+        )
         
         logger.info(f"External order webhook processed: {order_no}")
     
@@ -1366,17 +1527,15 @@ class WebhookReceiverView(View):
         qty_delta = data.get("qty_delta")
         
         # Create notification for inventory managers
-        from django.contrib.auth import get_user_model
         User = get_user_model()
         
-        managers = User.objects.filter(is_staff=True)
-        for manager in managers:
-            notify(
-                user=manager,
-                message=f"Inventory sync: {item_sku} adjusted by {qty_delta}",
-                level="info",
-                notification_type="inventory"
-            )
+        managers = self._recipients(User.objects.filter(is_staff=True))
+        notify_multiple(
+            managers,
+            message=f"Inventory sync: {item_sku} adjusted by {qty_delta}",
+            level="info",
+            notification_type="inventory"
+        )
         
         logger.info(f"Inventory sync webhook processed: {item_sku}")
     
@@ -1386,21 +1545,20 @@ class WebhookReceiverView(View):
         level = data.get("level", "info")
         target_users = data.get("target_users", [])
         
-        from django.contrib.auth import get_user_model
         User = get_user_model()
         
         if target_users:
             users = User.objects.filter(username__in=target_users)
         else:
             users = User.objects.filter(is_staff=True)
+        users = self._recipients(users)
         
-        for user in users:
-            notify(
-                user=user,
-                message=message,
-                level=level,
-                notification_type="webhook"
-            )
+        notify_multiple(
+            users,
+            message=message,
+            level=level,
+            notification_type="webhook"
+        )
         
         logger.info(f"Notification webhook processed: {message[:50]}...")
 
@@ -1409,12 +1567,28 @@ class WebhookReceiverView(View):
 # Bulk Import Views
 # =============================
 
-class BulkImportView(UserPassesTestMixin, View):
+def _import_preview_path(token):
+    """Server-side file holding the parsed upload of one import preview."""
+    return os.path.join(import_preview_dir(), f"{token}.pkl")
+
+
+def _discard_import_preview(preview_data):
+    """Remove the parsed upload a session's import preview points at, if it is still there."""
+    if preview_data and preview_data.get("token"):
+        try:
+            os.remove(_import_preview_path(preview_data["token"]))
+        except FileNotFoundError:
+            pass
+
+
+def _clear_import_preview(session):
+    """Forget the session's import preview and remove its parsed upload."""
+    _discard_import_preview(session.pop('import_preview', None))
+
+
+class BulkImportView(StaffRequiredMixin, View):
     """View for bulk import of Items, Batches, or Orders."""
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-    
     def get(self, request, *args, **kwargs):
         """Display upload form."""
         form = BulkImportForm()
@@ -1444,19 +1618,20 @@ class BulkImportView(UserPassesTestMixin, View):
     
     def _queue_import(self, file, model_type, user):
         """Queue import for background processing."""
-        import os
-        from django.conf import settings
-        from django_q.tasks import async_task
-        
         # Save file temporarily
         upload_dir = os.path.join(settings.MEDIA_ROOT, "imports")
         os.makedirs(upload_dir, exist_ok=True)
         
         file_path = os.path.join(upload_dir, f"{user.id}_{model_type}_{file.name}")
         
-        with open(file_path, "wb+") as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
+        if hasattr(file, "temporary_file_path"):
+            # Large uploads are already spooled to disk; move the file (a rename on
+            # the same filesystem) instead of copying it, as FileSystemStorage does
+            file_move_safe(file.temporary_file_path(), file_path, allow_overwrite=True)
+        else:
+            with open(file_path, "wb+") as destination:
+                for chunk in file.chunks():
+                    destination.write(chunk)
         
         # Queue task
         task_id = async_task(
@@ -1496,21 +1671,25 @@ class BulkImportView(UserPassesTestMixin, View):
             # Validate data based on model type
             validation_results = self._validate_import_data(df, model_type)
             
-            # Store data in session for commit
-            preview_data = {
+            # Keep the parsed frame on disk for commit; the session only carries its token
+            token = uuid.uuid4().hex
+            path = _import_preview_path(token)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df.to_pickle(path)
+            purge_import_previews()
+            
+            request = self.request
+            _discard_import_preview(request.session.get('import_preview'))
+            request.session['import_preview'] = {
                 "model_type": model_type,
-                "data": df.to_dict('records'),
+                "token": token,
                 "validation": validation_results,
             }
             
-            # Store in session (simplified - in production use cache or temp storage)
-            request = self.request
-            request.session['import_preview'] = preview_data
-            
             context = {
                 "preview": True,
                 "model_type": model_type,
-                "rows": df.to_dict('records')[:100],  # Limit preview to 100 rows
+                "rows": df.head(100).to_dict('records'),  # Limit preview to 100 rows
                 "total_rows": len(df),
                 "validation_results": validation_results,
             }
@@ -1525,8 +1704,59 @@ class BulkImportView(UserPassesTestMixin, View):
             }
             return render(request, "inventory/partials/import_error.html", context)
     
+    @staticmethod
+    def _text_column(df, name):
+        """Column `name` as stripped strings, "" where the cell or the whole column is missing."""
+        import pandas as pd
+        
+        if name not in df:
+            return pd.Series("", index=df.index, dtype=object)
+        return df[name].fillna("").astype(str).str.strip()
+    
+    @staticmethod
+    def _quantity_masks(df, name):
+        """(invalid, bad_format) masks for a column that must hold a positive number."""
+        import pandas as pd
+        
+        raw = df[name] if name in df else pd.Series(0, index=df.index)
+        qty = pd.to_numeric(raw, errors="coerce")
+        return raw.isna() | (qty <= 0), qty.isna() & raw.notna()
+    
+    @staticmethod
+    def _unknown_items(item_sku):
+        """Mask of rows whose non-blank item_sku matches no Item (SKUs are stored upper-case)."""
+        skus = item_sku.str.upper()
+        present = item_sku.ne("")
+        known = set(
+            Item.objects.filter(sku__in=skus[present].unique().tolist()).values_list("sku", flat=True)
+        )
+        return present & ~skus.isin(known)
+    
+    @staticmethod
+    def _row_errors(checks):
+        """
+        Collect row-level errors from (mask, message) checks.
+        
+        A message is either a string or a Series of per-row strings aligned with the masks.
+        Only failing rows are visited, and their messages keep the order of the checks.
+        """
+        import pandas as pd
+        
+        failing = pd.concat([mask for mask, _ in checks], axis=1).any(axis=1)
+        return [
+            {
+                "row": int(idx) + 2,  # +2 for header and 0-index
+                "errors": [
+                    message if isinstance(message, str) else message[idx]
+                    for mask, message in checks
+                    if mask[idx]
+                ],
+            }
+            for idx in failing.index[failing]
+        ]
+    
     def _validate_import_data(self, df, model_type):
-        """Validate import data and return row-level errors."""
+        """Validate import data column-wise and return row-level errors."""
         import pandas as pd
         from datetime import datetime
         
@@ -1535,101 +1765,47 @@ class BulkImportView(UserPassesTestMixin, View):
         
         if model_type == "item":
             # Validate Items
-            for idx, row in df.iterrows():
-                row_errors = []
-                
-                sku = str(row.get("sku", "")).strip()
-                name = str(row.get("name", "")).strip()
-                
-                if not sku:
-                    row_errors.append("Missing SKU")
-                if not name:
-                    row_errors.append("Missing name")
-                
-                if row_errors:
-                    errors.append({
-                        "row": idx + 2,  # +2 for header and 0-index
-                        "errors": row_errors,
-                    })
+            errors = self._row_errors([
+                (self._text_column(df, "sku").eq(""), "Missing SKU"),
+                (self._text_column(df, "name").eq(""), "Missing name"),
+            ])
         
         elif model_type == "batch":
             # Validate Batches
-            for idx, row in df.iterrows():
-                row_errors = []
-                
-                item_sku = str(row.get("item_sku", "")).strip()
-                lot_no = str(row.get("lot_no", "")).strip()
-                
-                if not item_sku:
-                    row_errors.append("Missing item_sku")
-                if not lot_no:
-                    row_errors.append("Missing lot_no")
-                
-                # Validate received_qty
-                try:
-                    qty = float(row.get("received_qty", 0))
-                    if qty <= 0:
-                        row_errors.append("Invalid received_qty")
-                except (ValueError, TypeError):
-                    row_errors.append("Invalid received_qty format")
-                
-                # Validate expiry_date if present
-                if pd.notna(row.get("expiry_date")):
-                    try:
-                        expiry = pd.to_datetime(row.get("expiry_date"))
-                        if expiry.date() < datetime.now().date():
-                            warnings.append({
-                                "row": idx + 2,
-                                "warning": "Expiry date in the past",
-                            })
-                    except Exception:
-                        row_errors.append("Invalid expiry_date format")
-                
-                # Check if item exists
-                if item_sku:
-                    if not Item.objects.filter(sku=item_sku.upper()).exists():
-                        row_errors.append(f"Item {item_sku} not found")
-                
-                if row_errors:
-                    errors.append({
-                        "row": idx + 2,
-                        "errors": row_errors,
-                    })
+            item_sku = self._text_column(df, "item_sku")
+            bad_qty, bad_qty_format = self._quantity_masks(df, "received_qty")
+            
+            # Expiry is optional; unparseable dates are errors, past ones only warnings
+            raw_expiry = df["expiry_date"] if "expiry_date" in df else pd.Series(None, index=df.index, dtype=object)
+            expiry = pd.to_datetime(raw_expiry, errors="coerce", format="mixed")
+            expired = expiry.dt.normalize() < pd.Timestamp(datetime.now().date())
+            warnings = [
+                {"row": int(idx) + 2, "warning": "Expiry date in the past"}
+                for idx in df.index[expired]
+            ]
+            
+            errors = self._row_errors([
+                (item_sku.eq(""), "Missing item_sku"),
+                (self._text_column(df, "lot_no").eq(""), "Missing lot_no"),
+                (bad_qty, "Invalid received_qty"),
+                (bad_qty_format, "Invalid received_qty format"),
+                (expiry.isna() & raw_expiry.notna(), "Invalid expiry_date format"),
+                (self._unknown_items(item_sku), "Item " + item_sku + " not found"),
+            ])
         
         elif model_type == "order":
             # Validate Orders
-            for idx, row in df.iterrows():
-                row_errors = []
-                
-                order_no = str(row.get("order_no", "")).strip()
-                customer_name = str(row.get("customer_name", "")).strip()
-                item_sku = str(row.get("item_sku", "")).strip()
-                
-                if not order_no:
-                    row_errors.append("Missing order_no")
-                if not customer_name:
-                    row_errors.append("Missing customer_name")
-                if not item_sku:
-                    row_errors.append("Missing item_sku")
-                
-                # Validate qty_requested
-                try:
-                    qty = float(row.get("qty_requested", 0))
-                    if qty <= 0:
-                        row_errors.append("Invalid qty_requested")
-                except (ValueError, TypeError):
-                    row_errors.append("Invalid qty_requested format")
-                
-                # Check if item exists
-                if item_sku:
-                    if not Item.objects.filter(sku=item_sku.upper()).exists():
-                        row_errors.append(f"Item {item_sku} not found")
-                
-                if row_errors:
-                    errors.append({
-                        "row": idx + 2,
-                        "errors": row_errors,
-                    })
+            item_sku = self._text_column(df, "item_sku")
+            bad_qty, bad_qty_format = self._quantity_masks(df, "qty_requested")
+            
+            errors = self._row_errors([
+                (self._text_column(df, "order_no").eq(""), "Missing order_no"),
+                (self._text_column(df, "customer_name").eq(""), "Missing customer_name"),
+                (item_sku.eq(""), "Missing item_sku"),
+                (bad_qty, "Invalid qty_requested"),
+                (bad_qty_format, "Invalid qty_requested format"),
+                (self._unknown_items(item_sku), "Item " + item_sku + " not found"),
+            ])
         
         return {
             "errors": errors,
@@ -1639,26 +1815,23 @@ class BulkImportView(UserPassesTestMixin, View):
         }
 
 
-class BulkImportCommitView(UserPassesTestMixin, View):
+class BulkImportCommitView(StaffRequiredMixin, View):
     """View to commit bulk import after preview."""
     
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-    
     def post(self, request, *args, **kwargs):
         """Commit import data."""
         import pandas as pd
         
-        # Retrieve preview data from session
-        preview_data = request.session.get('import_preview')
+        # Retrieve preview data from session; the parsed upload itself is on disk
+        preview_data = request.session.get('import_preview') or {}
         
-        if not preview_data:
+        try:
+            df = pd.read_pickle(_import_preview_path(preview_data["token"]))
+        except (KeyError, FileNotFoundError):
             context = {"error": "No import data found. Please upload again."}
             return render(request, "inventory/partials/import_error.html", context)
         
         model_type = preview_data["model_type"]
-        data = preview_data["data"]
-        df = pd.DataFrame(data)
         
         try:
             with transaction.atomic():
@@ -1671,8 +1844,8 @@ class BulkImportCommitView(UserPassesTestMixin, View):
                 else:
                     raise ValueError(f"Unknown model type: {model_type}")
                 
-                # Clear session data
-                del request.session['import_preview']
+                # Clear session data once the import has committed, so a rollback keeps the preview
+                transaction.on_commit(partial(_clear_import_preview, request.session))
                 
                 notify(
                     user=request.user,
@@ -1694,95 +1867,153 @@ class BulkImportCommitView(UserPassesTestMixin, View):
             context = {"error": str(e)}
             return render(request, "inventory/partials/import_error.html", context)
     
+    @staticmethod
+    def _items_by_sku(df):
+        """Items named in the item_sku column, keyed by SKU, fetched up front."""
+        if "item_sku" not in df:
+            return {}
+        skus = df["item_sku"].dropna().astype(str).str.strip().str.upper().unique().tolist()
+        return Item.objects.in_bulk(skus, field_name="sku")
+    
+    @staticmethod
+    def _lookup_item(items_by_sku, sku):
+        """Item for sku from _items_by_sku(); raises Item.DoesNotExist like a get() would."""
+        try:
+            return items_by_sku[sku]
+        except KeyError:
+            raise Item.DoesNotExist(f"Item {sku} not found") from None
+    
+    @staticmethod
+    def _text_columns(df, *columns):
+        """df with `columns` as stripped strings, blank cells as "" (see BulkImportView._text_column)."""
+        return df.assign(**{column: BulkImportView._text_column(df, column) for column in columns})
+    
+    @staticmethod
+    def _decimal_cell(value, field):
+        """Decimal for an import cell that fits `field`; None if blank, unparseable, not finite or too large."""
+        return to_decimal(value, decimal_field_limit(field))
+    
     def _commit_items(self, df):
-        """Commit Item import."""
+        """Commit Item import as one upsert keyed on SKU."""
+        import pandas as pd
+        
         success_count = 0
+        items = {}
+        threshold_field = Item._meta.get_field("reorder_threshold")
         
-        for _, row in df.iterrows():
-            sku = str(row.get("sku", "")).strip().upper()
-            name = str(row.get("name", "")).strip()
+        for row in self._text_columns(df, "sku", "name", "description", "unit").itertuples(index=False):
+            sku = row.sku.upper()
+            threshold = getattr(row, "reorder_threshold", None)
+            # A blank threshold takes the model default, like a missing column
+            threshold = Decimal("0") if pd.isna(threshold) else self._decimal_cell(threshold, threshold_field)
             
-            if not sku or not name:
+            if not sku or not row.name or threshold is None or threshold < 0:
                 continue
             
-            Item.objects.update_or_create(
+            # A repeated SKU keeps its last row, as successive update_or_create calls would
+            items[sku] = Item(
                 sku=sku,
-                defaults={
-                    "name": name,
-                    "description": str(row.get("description", "")),
-                    "unit": str(row.get("unit", "pcs")),
-                    "reorder_threshold": Decimal(str(row.get("reorder_threshold", 0))),
-                }
+                name=row.name,
+                description=row.description,
+                unit=row.unit or "pcs",
+                reorder_threshold=threshold,
             )
             success_count += 1
         
+        Item.objects.bulk_create(
+            items.values(),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["sku"],
+            update_fields=["name", "description", "unit", "reorder_threshold"],
+        )
+        
         return {"success": success_count, "failed": len(df) - success_count}
     
     def _commit_batches(self, df):
-        """Commit Batch import."""
+        """Commit Batch import, skipping rows that would clash with an existing or earlier lot."""
         import pandas as pd
         
-        success_count = 0
+        items_by_sku = self._items_by_sku(df)
+        df = self._text_columns(df, "item_sku", "lot_no")
+        qty_field = Batch._meta.get_field("received_qty")
         
-        for _, row in df.iterrows():
-            item_sku = str(row.get("item_sku", "")).strip().upper()
-            lot_no = str(row.get("lot_no", "")).strip()
-            
-            if not item_sku or not lot_no:
+        # Lots stay reserved after a soft delete, so look through all_objects, as ReceiveView does
+        taken = set(
+            Batch.all_objects.filter(
+                item__in=list(items_by_sku.values()), lot_no__in=df["lot_no"].unique().tolist()
+            ).values_list("item_id", "lot_no")
+        )
+        batches = []
+        
+        for row in df.itertuples(index=False):
+            item = items_by_sku.get(row.item_sku.upper())
+            if not row.lot_no or item is None or (item.pk, row.lot_no) in taken:
                 continue
             
-            try:
-                item = Item.objects.get(sku=item_sku)
-                received_qty = Decimal(str(row.get("received_qty", 0)))
-                
-                Batch.objects.create(
-                    item=item,
-                    lot_no=lot_no,
-                    received_qty=received_qty,
-                    available_qty=received_qty,
-                    expiry_date=pd.to_datetime(row.get("expiry_date")).date() if pd.notna(row.get("expiry_date")) else None,
-                    status=Batch.STATUS_AVAILABLE,
-                )
-                success_count += 1
-            except Item.DoesNotExist:
+            received_qty = self._decimal_cell(getattr(row, "received_qty", None), qty_field)
+            expiry = getattr(row, "expiry_date", None)
+            expiry = pd.to_datetime(expiry, errors="coerce", format="mixed") if pd.notna(expiry) else None
+            if received_qty is None or received_qty <= 0 or expiry is pd.NaT:
                 continue
+            
+            batches.append(Batch(
+                item=item,
+                lot_no=row.lot_no,
+                received_qty=received_qty,
+                available_qty=received_qty,
+                expiry_date=expiry.date() if expiry is not None else None,
+                status=Batch.STATUS_AVAILABLE,
+            ))
+            taken.add((item.pk, row.lot_no))
         
-        return {"success": success_count, "failed": len(df) - success_count}
+        Batch.objects.bulk_create(batches, batch_size=500)
+        
+        return {"success": len(batches), "failed": len(df) - len(batches)}
     
     def _commit_orders(self, df):
-        """Commit Order import."""
-        success_count = 0
+        """Commit Order import: one INSERT for the orders, then one for all of their lines."""
+        items_by_sku = self._items_by_sku(df)
+        df = self._text_columns(df, "order_no", "customer_name", "item_sku")
+        qty_field = OrderItem._meta.get_field("qty_requested")
+        taken = set(
+            Order.objects.filter(order_no__in=df["order_no"].unique().tolist()).values_list("order_no", flat=True)
+        )
+        orders = []
+        order_items = []
         
-        # Group by order_no
-        for order_no in df['order_no'].unique():
-            order_rows = df[df['order_no'] == order_no]
-            first_row = order_rows.iloc[0]
+        # Group by order_no; rows without one cannot form an order
+        for order_no, order_rows in df.groupby("order_no", sort=False):
+            customer_name = order_rows["customer_name"].iloc[0]
+            if not order_no or not customer_name or order_no in taken:
+                continue
             
-            try:
-                # Create order
-                order = Order.objects.create(
-                    order_no=str(first_row.get("order_no", "")).strip(),
-                    customer_name=str(first_row.get("customer_name", "")).strip(),
-                    status=Order.STATUS_PENDING,
-                )
-                
-                # Create order items
-                for _, row in order_rows.iterrows():
-                    item_sku = str(row.get("item_sku", "")).strip().upper()
-                    item = Item.objects.get(sku=item_sku)
-                    
-                    OrderItem.objects.create(
-                        order=order,
-                        item=item,
-                        qty_requested=Decimal(str(row.get("qty_requested", 0))),
-                        status=OrderItem.STATUS_PENDING,
-                    )
-                
-                success_count += 1
-            except (Item.DoesNotExist, Exception):
+            lines = {}
+            for row in order_rows.itertuples(index=False):
+                item = items_by_sku.get(row.item_sku.upper())
+                qty_requested = self._decimal_cell(getattr(row, "qty_requested", None), qty_field)
+                if item is None or qty_requested is None or qty_requested <= 0:
+                    # Skip the whole order rather than create it with only some lines
+                    lines = None
+                    break
+                # An order holds one line per item; a repeated item keeps its first line
+                lines.setdefault(item.pk, (item, qty_requested))
+            if lines is None:
                 continue
+            
+            order = Order(order_no=order_no, customer_name=customer_name)
+            orders.append(order)
+            order_items.extend(
+                OrderItem(order=order, item=item, qty_requested=qty_requested)
+                for item, qty_requested in lines.values()
+            )
+            taken.add(order_no)
+        
+        # bulk_create sets the order pks, which the lines pick up when they are inserted
+        Order.objects.bulk_create(orders, batch_size=500)
+        OrderItem.objects.bulk_create(order_items, batch_size=500)
         
-        return {"success": success_count, "failed": len(df['order_no'].unique()) - success_count}
+        return {"success": len(orders), "failed": df["order_no"].nunique() - len(orders)}
 
 
 # =============================
@@ -2501,7 +2732,7 @@ class SandboxQueueView(LoginRequiredMixin, TemplateView):
         return ctx
 
 
-class ApplySandboxOperationsView(UserPassesTestMixin, View):
+class ApplySandboxOperationsView(StaffRequiredMixin, View):
     """Manager-only endpoint to apply sandbox operations to production.
 
     Expected JSON body:
@@ -2512,9 +2743,6 @@ class ApplySandboxOperationsView(UserPassesTestMixin, View):
       }
     """
 
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
-
     def post(self, request, *args, **kwargs):
         try:
             payload = json.loads(request.body.decode("utf-8"))
@@ -2688,7 +2916,6 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
                     level="info",
                 )
             
-            from django.contrib import messages
             messages.success(self.request, f"Order {self.object.order_no} created successfully!")
             return super(CreateView, self).form_valid(form)
         else:
@@ -2725,7 +2952,6 @@ class OrderUpdateView(LoginRequiredMixin, UpdateView):
                 orderitem_formset.instance = self.object
                 orderitem_formset.save()
             
-            from django.contrib import messages
             messages.success(self.request, f"Order {self.object.order_no} updated successfully!")
             return super(UpdateView, self).form_valid(form)
         else:
@@ -2978,7 +3204,6 @@ class ExpiryTrackingView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        from datetime import timedelta
         today = timezone.now().date()
         
         # Get batches with expiry dates
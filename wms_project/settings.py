@@ -106,6 +106,12 @@ def database_config_from_url(url: str):
         "PASSWORD": p.password or "",
         "HOST": p.hostname or "localhost",
         "PORT": str(p.port or ""),
+        # Set DB_CONN_MAX_AGE (seconds) to keep connections open between requests;
+        # the default of 0 reconnects per request, as before
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
+        # Stable name so `manage.py test --keepdb` finds the same test database
+        "TEST": {"NAME": os.getenv("TEST_DB_NAME", f"test_{name}")},
     }
     # Optional SSL and options
     options = {}
@@ -129,6 +135,18 @@ else:
     }
 
 
+# ----- Cache -----
+# Per-process memory by default; set REDIS_CACHE_URL so every worker shares one cache
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        }
+    }
+
+
 # ----- Password validation -----
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},